@@ -0,0 +1,234 @@
+# filename: animation.py
+"""
+动画输出，编码为 GIF、APNG 或动画 WebP：
+1. 打字机效果（文字像游戏对话框一样逐字出现）
+   - 排版与 draw_text_auto 完全相同（同一个 layout_text 结果与文字段坐标），只是按字拆开
+   - 底图、置顶图层与角色名只合成并缩放一次，之后每帧只在上一帧上补画新出现的字
+   - GIF 所有帧共用一套调色板（由最后一帧生成），每帧只对新画的字所在区域做调色板映射
+   帧率与最长时长可配置：字数多时每帧出现多个字，总时长不超过 max_duration（不含末帧停留的 hold）。
+2. 动图内容（例如剪贴板中的 GIF）
+   - 相邻的相同帧合并，帧数超过上限时均匀抽帧，总时长不变；解码时只保留用到的帧
+   - 静态部分只合成一次，每帧只重新合成文本框中图片所在的矩形，内容相同的帧共用同一块
+三种格式的编码器都只写入与上一帧不同的矩形区域。
+"""
+import hashlib
+import math
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image, ImageDraw
+
+from text_fit_draw import IMAGE_SETTINGS, _load_font
+
+TYPEWRITER_FPS = 12  # 默认帧率
+TYPEWRITER_MAX_DURATION = 6.0  # 逐字出现部分的最长时长（秒）
+TYPEWRITER_HOLD = 2.0  # 全部文字出现后末帧停留的时长（秒）
+
+# 格式 -> (PIL 格式名, 输出扩展名)
+ANIMATION_FORMATS = {
+    "gif": ("GIF", "gif"),
+    "apng": ("PNG", "png"),
+    "webp": ("WEBP", "webp"),
+}
+
+MAX_SOURCE_FRAMES = 60  # 动图内容最多保留的帧数
+MIN_FRAME_DURATION = 20  # 小于该时长（毫秒）的帧按 100ms 播放，与浏览器的处理一致
+
+SHADOW_OFFSET = 4  # 与 draw_lines_tile 的文字阴影相同（原尺寸下的像素）
+
+
+def split_glyphs(
+    ops: list[tuple[Tuple[int, int], str, Tuple[int, int, int]]],
+    font_path: str | None,
+    font_size: int,
+    scale: Tuple[float, float] = (1.0, 1.0),
+) -> tuple[list[tuple[Tuple[int, int], str, Tuple[int, int, int]]], object]:
+    """
+    把 segment_ops 的文字段按字拆开并换算到输出尺寸，返回 ([(坐标, 字, 颜色)], 输出尺寸的字体)。
+    段的起点与 draw_lines_tile 相同，段内各字的位置由前缀宽度得到；空白不算作一个字。
+    """
+    sx, sy = scale
+    font = _load_font(font_path, max(1, round(font_size * min(sx, sy))))
+    glyphs = []
+    for (x, y), seg_text, seg_color in ops:
+        for k, ch in enumerate(seg_text):
+            if ch.isspace():
+                continue
+            gx = x * sx + font.getlength(seg_text[:k])
+            glyphs.append(((round(gx), round(y * sy)), ch, seg_color))
+    return glyphs, font
+
+
+def typewriter_frames(
+    static: Image.Image,
+    glyphs: list[tuple[Tuple[int, int], str, Tuple[int, int, int]]],
+    font,
+    shadow_offset: int = SHADOW_OFFSET,
+    fps: float = TYPEWRITER_FPS,
+    max_duration: float = TYPEWRITER_MAX_DURATION,
+    hold: float = TYPEWRITER_HOLD,
+    palette: bool = False,
+) -> tuple[list[Image.Image], list[int]]:
+    """
+    在 static（已缩放到输出尺寸的 RGB 静态层）上逐步补画 glyphs，返回 (各帧, 各帧时长毫秒)。
+    第一帧没有文字，最后一帧为全部文字并停留 hold 秒。
+    palette=True 时输出共用同一调色板的 P 模式帧（GIF 用），每帧只映射新画的区域。
+    """
+    if fps <= 0 or max_duration <= 0:
+        raise ValueError("fps 与 max_duration 必须大于 0")
+    max_steps = max(1, int(fps * max_duration))
+    per_step = max(1, math.ceil(len(glyphs) / max_steps))
+    tick = max(MIN_FRAME_DURATION, round(1000 / fps))
+
+    def draw_glyphs(draw: ImageDraw.ImageDraw, chunk) -> tuple[int, int, int, int] | None:
+        box = None
+        for (x, y), ch, color in chunk:
+            shadow_xy = (x + shadow_offset, y + shadow_offset)
+            draw.text(shadow_xy, ch, font=font, fill=(0, 0, 0))
+            draw.text((x, y), ch, font=font, fill=tuple(color))
+            for l, t, r, b in (draw.textbbox((x, y), ch, font=font), draw.textbbox(shadow_xy, ch, font=font)):
+                box = (l, t, r, b) if box is None else (min(box[0], l), min(box[1], t),
+                                                        max(box[2], r), max(box[3], b))
+        return box
+
+    canvas = static.convert("RGB")
+    draw = ImageDraw.Draw(canvas)
+    palette_image = indexed = None
+    if palette:
+        final = canvas.copy()
+        draw_glyphs(ImageDraw.Draw(final), glyphs)
+        palette_image = final.quantize(colors=256, dither=Image.Dither.NONE)
+        indexed = canvas.quantize(palette=palette_image, dither=Image.Dither.NONE)
+
+    frames = [indexed.copy() if palette else canvas.copy()]
+    durations = [tick]
+    for start in range(0, len(glyphs), per_step):
+        box = draw_glyphs(draw, glyphs[start:start + per_step])
+        if palette and box is not None:
+            box = (max(0, box[0]), max(0, box[1]), min(canvas.width, box[2]), min(canvas.height, box[3]))
+            if box[2] > box[0] and box[3] > box[1]:
+                region = canvas.crop(box).quantize(palette=palette_image, dither=Image.Dither.NONE)
+                indexed.paste(region, box[:2])
+        frames.append(indexed.copy() if palette else canvas.copy())
+        durations.append(tick)
+    durations[-1] = max(tick, round(hold * 1000))
+    return frames, durations
+
+
+def is_animated(image: Image.Image) -> bool:
+    """是否为可以逐帧读取的多帧图像（GIF、APNG、动画 WebP 等；文件已关闭时为 False）"""
+    try:
+        if not (getattr(image, "is_animated", False) and image.n_frames > 1):
+            return False
+        position = image.tell()
+        image.seek(1)
+        image.seek(position)
+    except (ValueError, EOFError, OSError, AttributeError):
+        return False
+    return True
+
+
+def source_frames(image: Image.Image, max_frames: int = MAX_SOURCE_FRAMES) -> list[tuple[Image.Image, int, bytes]]:
+    """
+    动图的各帧 [(RGBA 帧, 时长毫秒, 内容摘要)]。
+    相邻的相同帧合并（时长相加）；超过 max_frames 时均匀分组，每组取第一帧，时长为整组之和。
+    第一遍只计算摘要与时长，第二遍只解码保留的帧，内存占用与源动图的帧数无关。
+    源图像的文件已关闭、无法切换帧时只返回当前帧。
+    """
+    if max_frames < 1:
+        raise ValueError("max_frames 必须大于 0")
+    if not is_animated(image):
+        return [(image.convert("RGBA"), 0, b"")]
+
+    # 1. 摘要与时长，合并相邻的相同帧：[起始帧号, 时长, 摘要]
+    groups: list[list] = []
+    try:
+        for index in range(image.n_frames):
+            image.seek(index)
+            duration = image.info.get("duration") or 0
+            if duration < MIN_FRAME_DURATION:
+                duration = 100
+            digest = hashlib.blake2b(image.convert("RGBA").tobytes(), digest_size=16).digest()
+            if groups and groups[-1][2] == digest:
+                groups[-1][1] += duration
+            else:
+                groups.append([index, duration, digest])
+    except (ValueError, EOFError, OSError):
+        # 文件已关闭时只用当前帧；文件截断时保留已读到的帧
+        if not groups:
+            return [(image.convert("RGBA"), 0, b"")]
+
+    # 2. 帧数上限
+    if len(groups) > max_frames:
+        capped = []
+        for k in range(max_frames):
+            chunk = groups[k * len(groups) // max_frames:(k + 1) * len(groups) // max_frames]
+            capped.append([chunk[0][0], sum(g[1] for g in chunk), chunk[0][2]])
+        groups = capped
+
+    # 3. 只解码保留的帧（按帧号递增，GIF 不必反复从头解码）
+    frames = []
+    for index, duration, digest in groups:
+        image.seek(index)
+        frames.append((image.convert("RGBA"), duration, digest))
+    image.seek(0)
+    return frames
+
+
+def shared_palette(images: list[Image.Image], sample: int = 256) -> Image.Image:
+    """由多张图像（各自缩小后拼在一起）生成一套 256 色调色板，供所有帧共用"""
+    thumbs = []
+    for im in images:
+        thumb = im.convert("RGB")
+        thumb.thumbnail((sample, sample))
+        thumbs.append(thumb)
+    mosaic = Image.new("RGB", (sum(t.width for t in thumbs), max(t.height for t in thumbs)))
+    x = 0
+    for thumb in thumbs:
+        mosaic.paste(thumb, (x, 0))
+        x += thumb.width
+    return mosaic.quantize(colors=256)
+
+
+def patched_frames(static: Image.Image, box: Tuple[int, int, int, int], patches: list[Image.Image],
+                   palette: bool = False) -> list[Image.Image]:
+    """
+    各帧 = static 上 box 区域换成对应的 patch（RGB，与 box 同尺寸）。
+    同一个 patch 对象只处理一次；palette=True 时输出共用同一调色板的 P 模式帧（GIF 用），
+    静态部分只映射一次，每帧只映射 patch。
+    """
+    static = static.convert("RGB")
+    if not palette:
+        frames = []
+        for patch in patches:
+            frame = static.copy()
+            frame.paste(patch, box[:2])
+            frames.append(frame)
+        return frames
+    unique = list({id(patch): patch for patch in patches}.values())
+    palette_image = shared_palette([static] + unique)
+    indexed_static = static.quantize(palette=palette_image)
+    indexed = {id(patch): patch.quantize(palette=palette_image) for patch in unique}
+    frames = []
+    for patch in patches:
+        frame = indexed_static.copy()
+        frame.paste(indexed[id(patch)], box[:2])
+        frames.append(frame)
+    return frames
+
+
+def encode_animation(frames: list[Image.Image], durations: list[int], fmt: str = "gif",
+                     quality: int | None = None) -> tuple[bytes, str]:
+    """编码动画，fmt 为 gif / apng / webp，返回 (字节, 扩展名)"""
+    fmt = fmt.lower()
+    if fmt not in ANIMATION_FORMATS:
+        raise ValueError(f"不支持的动画格式: {fmt}（可选 {', '.join(ANIMATION_FORMATS)}）")
+    pil_format, ext = ANIMATION_FORMATS[fmt]
+    options = dict(save_all=True, append_images=frames[1:], duration=durations, loop=0)
+    if fmt == "gif":
+        options.update(disposal=1, optimize=False)  # 帧间保留上一帧，只写入变化的区域
+    elif fmt == "webp":
+        options.update(quality=quality or IMAGE_SETTINGS["quality"], method=4)
+    buf = BytesIO()
+    frames[0].save(buf, format=pil_format, **options)
+    return buf.getvalue(), ext
@@ -0,0 +1,163 @@
+# filename: base_cache_index.py
+"""
+底图磁盘缓存的索引：assets/cache 下每张预先合成的底图在 SQLite 中记录角色、编号、大小、
+源素材签名与最近使用时间，用于按角色统计占用、检查底图是否过期，以及超出磁盘预算时按最近使用时间淘汰。
+TUI、main.py、manage_cache.py 与批量渲染的工作进程共用同一个数据库文件（WAL 模式），
+各进程写入的条目以文件名为主键，重复登记不会出错。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+BASE_SUFFIX = ".jpg"
+
+
+def parse_base_file(filename: str) -> tuple[str, int] | None:
+    """"{角色} (编号).jpg" -> (角色, 编号)，不是底图文件时返回 None"""
+    if not filename.endswith(")" + BASE_SUFFIX) or " (" not in filename:
+        return None
+    character, _, rest = filename[:-len(BASE_SUFFIX)].rpartition(" (")
+    try:
+        return character, int(rest[:-1])
+    except ValueError:
+        return None
+
+
+def source_signature(paths: list[str]) -> str:
+    """源素材（背景与立绘）的 mtime/大小签名，素材变化后缓存的底图即为过期"""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("missing")
+    return "|".join(parts)
+
+
+class BaseCacheIndex:
+    """
+    预先合成底图（cache_path 下的 "{角色} (编号).jpg"）的索引。
+    使用 SQLite 记录每个文件的角色、编号、大小、源素材签名与最近使用时间，
+    超出磁盘预算时按最近使用时间逐个淘汰底图文件，而不是整体清空。
+    索引之外的文件（旧版本生成或手动放入）在 sync() 时以文件修改时间登记。
+    """
+
+    def __init__(self, cache_path: str, db_name: str = "bases.sqlite3"):
+        self.cache_path = cache_path
+        self.db_path = os.path.join(cache_path, db_name)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bases ("
+            " name TEXT PRIMARY KEY,"
+            " character TEXT NOT NULL,"
+            " value INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " source TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bases_last_used ON bases(last_used)")
+        self._conn.commit()
+
+    def file_path(self, name: str) -> str:
+        return os.path.join(self.cache_path, name + BASE_SUFFIX)
+
+    def record(self, name: str, source: str) -> None:
+        """登记刚写入的底图文件"""
+        character, value = parse_base_file(name + BASE_SUFFIX)
+        size = os.path.getsize(self.file_path(name))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bases (name, character, value, size, source, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (name, character, value, size, source, time.time()),
+            )
+            self._conn.commit()
+
+    def touch(self, names: list[str]) -> None:
+        """刷新最近使用时间（未登记的文件会在下次 sync 时登记）"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE bases SET last_used = ? WHERE name = ?", [(now, n) for n in names])
+            self._conn.commit()
+
+    def forget(self, names: list[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM bases WHERE name = ?", [(n,) for n in names])
+            self._conn.commit()
+
+    def entries(self) -> list[tuple[str, str, int, int, str, float]]:
+        """全部条目 (name, character, value, size, source, last_used)，按最近使用时间从旧到新"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, character, value, size, source, last_used FROM bases ORDER BY last_used"
+            ).fetchall()
+
+    def sync(self) -> tuple[int, int]:
+        """让索引与磁盘一致：登记索引之外的底图文件，删除文件已不存在的条目。返回 (登记数, 删除数)"""
+        on_disk = {}
+        with os.scandir(self.cache_path) as it:
+            for entry in it:
+                parsed = parse_base_file(entry.name)
+                if parsed and entry.is_file():
+                    on_disk[entry.name[:-len(BASE_SUFFIX)]] = (parsed, entry)
+        with self._lock:
+            indexed = {name for (name,) in self._conn.execute("SELECT name FROM bases")}
+            added = []
+            for name in on_disk.keys() - indexed:
+                (character, value), entry = on_disk[name]
+                st = entry.stat()
+                added.append((name, character, value, st.st_size, "", st.st_mtime))
+            # 其他进程可能在查询之后刚好 record() 了同一个文件，此时保留对方登记的条目
+            self._conn.executemany("INSERT OR IGNORE INTO bases VALUES (?, ?, ?, ?, ?, ?)", added)
+            removed = [(name,) for name in indexed - on_disk.keys()]
+            self._conn.executemany("DELETE FROM bases WHERE name = ?", removed)
+            self._conn.commit()
+        return len(added), len(removed)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM bases").fetchone()
+        return total
+
+    def usage_by_character(self) -> dict[str, tuple[int, int]]:
+        """{角色: (文件数, 字节数)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT character, COUNT(*), SUM(size) FROM bases GROUP BY character ORDER BY character"
+            ).fetchall()
+        return {character: (count, size) for character, count, size in rows}
+
+    def prune(self, budget: int, protect: set[str] | frozenset = frozenset()) -> list[str]:
+        """
+        按最近使用时间删除底图文件，直到总大小不超过 budget 字节。
+        protect 中的角色（例如刚切换到的角色）不会被淘汰。返回被删除的底图名。
+        """
+        self.sync()
+        total = self.total_bytes()
+        removed = []
+        if total <= budget:
+            return removed
+        for name, character, _, size, _, _ in self.entries():
+            if total <= budget:
+                break
+            if character in protect:
+                continue
+            try:
+                os.remove(self.file_path(name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # 文件被占用（例如 Windows 上正在读取），下次再删
+            removed.append(name)
+            total -= size
+        self.forget(removed)
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
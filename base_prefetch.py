@@ -0,0 +1,72 @@
+# filename: base_prefetch.py
+import threading
+from typing import Callable
+
+from PIL import Image
+
+
+class BasePrefetcher:
+    """
+    在后台线程中预先解码（必要时现场合成）下一张底图。
+    同一时间只保留一张预取结果；新的 submit 会使旧结果作废。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._name: str | None = None
+        self._image: Image.Image | None = None
+        self._ready = threading.Event()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, name: str, loader: Callable[[], Image.Image]) -> None:
+        """开始在后台加载 name 对应的底图，loader 返回解码好的图像"""
+        with self._lock:
+            if name == self._name:
+                return
+            self._name = name
+            self._image = None
+            ready = self._ready = threading.Event()
+        threading.Thread(target=self._run, args=(name, loader, ready), daemon=True).start()
+
+    def _run(self, name: str, loader: Callable[[], Image.Image], ready: threading.Event) -> None:
+        try:
+            image = loader()
+            image.load()
+        except Exception as e:
+            print(f"预取底图失败: {e}")
+            image = None
+        with self._lock:
+            if self._name == name:
+                self._image = image
+        ready.set()
+
+    def take(self, name: str, timeout: float = 2.0) -> Image.Image | None:
+        """
+        取出预取好的底图；name 不匹配或加载失败时返回 None。
+        若仍在加载中，最多等待 timeout 秒（已经开始的解码比重新读取更快）。
+        """
+        with self._lock:
+            if self._name != name:
+                self.misses += 1
+                return None
+            ready = self._ready
+        ready.wait(timeout)
+        with self._lock:
+            if self._name != name:
+                self.misses += 1
+                return None
+            image = self._image
+            self._name = None
+            self._image = None
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return image
+
+    def cancel(self) -> None:
+        """丢弃当前的预取结果"""
+        with self._lock:
+            self._name = None
+            self._image = None
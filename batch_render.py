@@ -0,0 +1,180 @@
+""" 无界面批量渲染（多进程）
+
+输入为 JSON Lines（文件或标准输入），每行一个任务，例如：
+    {"character": "sherri", "emotion": 2, "background": 5, "text": "你好【世界】"}
+    {"character": "ema", "image": "pics/cat.png", "name": "cat.png"}
+    {"character": "hiro", "text": "很长的消息……", "max_bytes": 500000}
+emotion / background 省略时随机选取；name 省略时按行号命名（name 只能是文件名，不能包含路径）；
+max_bytes 为输出字节预算，此时格式可能是 webp 或 jpeg（省略 name 时扩展名随之变化）。
+profiles 为输出尺寸列表（如 ["full", "thumb", "2x"]，见 render_pipeline.PROFILES），
+排版与合成只做一次，每种尺寸一个文件，文件名为 "<name 去掉扩展名>-<尺寸>.<格式>"。
+typewriter 输出文字逐字出现的动画，值为格式（"gif" / "apng" / "webp"），
+可用 fps / max_duration / hold（秒）调整节奏，例如：
+    {"character": "sherri", "text": "你好【世界】", "typewriter": "gif", "fps": 15, "max_duration": 4}
+image 为动图（GIF 等）时输出动画，格式由 animation 指定（默认 "gif"，null 时只用第一帧），
+max_frames 为最多保留的帧数。
+turns 为多条消息的对话长图（所有消息使用同一背景，profile 为每条的尺寸，默认 "full"）：
+    {"turns": [{"character": "sherri", "text": "早"}, {"character": "ema", "emotion": 3, "text": "早上好"}],
+     "profile": "thumb"}
+
+用法：
+    python batch_render.py jobs.jsonl -o out_dir
+    cat jobs.jsonl | python batch_render.py --tar out.tar -j 8
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from animation import MAX_SOURCE_FRAMES, is_animated
+from headless_render import HeadlessRenderer, release_shared_memory
+
+_renderer: HeadlessRenderer | None = None  # 每个工作进程各自持有一份
+
+
+def _init_worker(base_path: str | None) -> None:
+    """工作进程初始化：只加载一次配置、字体与角色名图层"""
+    global _renderer
+    _renderer = HeadlessRenderer(base_path)
+    _renderer.warm_up()
+
+
+def check_name(name) -> str:
+    """任务名只能是单个文件名：不能包含路径分隔符，也不能是 "." 或 ".."（避免写到输出目录之外）"""
+    if not isinstance(name, str) or name in ("", ".", "..") or "\0" in name:
+        raise ValueError(f"无效的任务名: {name!r}")
+    if any(sep in name for sep in ("/", "\\", os.sep, os.altsep) if sep) or os.path.splitdrive(name)[0]:
+        raise ValueError(f"任务名不能包含路径: {name!r}")
+    return name
+
+
+def _render_job(item: tuple[int, dict, int | None]) -> tuple[int, str, list[tuple[str, bytes]] | None, str | None]:
+    """渲染单个任务，返回 (行号, 任务名, [(文件名, 图片字节)], 错误信息)"""
+    index, job, seed = item
+    name = job.get("name") or f"{index:06d}.png"
+    try:
+        check_name(name)
+        rng = random.Random(None if seed is None else seed + index)
+        if job.get("turns"):
+            turns = [(turn["character"], turn.get("emotion"), turn.get("text")) for turn in job["turns"]]
+            result = _renderer.render_conversation(turns, job.get("background"), job.get("profile", "full"), rng)
+            if not job.get("name"):
+                name = f"{index:06d}.{result.fmt}"
+            return index, name, [(name, result.data)], None
+        character, emotion, background = _renderer.resolve(
+            job["character"], job.get("emotion"), job.get("background"), rng)
+        image = None
+        if job.get("image"):
+            with Image.open(job["image"]) as src:
+                fmt = job.get("animation", "gif")
+                if fmt and is_animated(src):
+                    result = _renderer.render_animated_image(character, emotion, background, src, fmt=fmt,
+                                                             max_frames=job.get("max_frames", MAX_SOURCE_FRAMES))
+                    if not job.get("name"):
+                        name = f"{index:06d}.{result.fmt}"
+                    return index, name, [(name, result.data)], None
+                image = src.copy()
+        if job.get("typewriter"):
+            timing = {k: job[k] for k in ("fps", "max_duration", "hold") if k in job}
+            result = _renderer.render_typewriter(character, emotion, background, job.get("text"),
+                                                 fmt=job["typewriter"], **timing)
+            if not job.get("name"):
+                name = f"{index:06d}.{result.fmt}"
+            return index, name, [(name, result.data)], None
+        if job.get("profiles"):
+            results = _renderer.render_profiles(character, emotion, background, job["profiles"],
+                                                text=job.get("text"), image=image)
+            stem = os.path.splitext(name)[0]
+            return index, name, [(f"{stem}-{p}.{r.fmt}", r.data) for p, r in results.items()], None
+        result = _renderer.render(character, emotion, background, text=job.get("text"), image=image,
+                                  max_bytes=job.get("max_bytes"))
+        if not job.get("name"):
+            name = f"{index:06d}.{result.fmt}"
+        return index, name, [(name, result.data)], None
+    except Exception as e:
+        return index, name, None, f"{type(e).__name__}: {e}"
+
+
+def read_jobs(fp) -> list[dict]:
+    """读取 JSON Lines，忽略空行与 # 开头的注释行"""
+    jobs = []
+    for line_no, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            jobs.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise SystemExit(f"第 {line_no} 行不是合法的 JSON: {e}")
+    return jobs
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框批量渲染")
+    parser.add_argument("input", nargs="?", default="-", help="JSON Lines 任务文件，默认读取标准输入")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-o", "--out-dir", help="输出目录")
+    output.add_argument("--tar", help="输出 tar 文件")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子（固定随机选取的表情与背景）")
+    parser.add_argument("--base-path", default=None, help="项目根目录（含 config/ 与 assets/）")
+    args = parser.parse_args(argv)
+
+    if args.input == "-":
+        jobs = read_jobs(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as fp:
+            jobs = read_jobs(fp)
+    if not jobs:
+        print("没有任务", file=sys.stderr)
+        return 0
+
+    tar = None
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    else:
+        tar = tarfile.open(args.tar, "w")
+
+    ok = failed = 0
+    started = time.perf_counter()
+    workers = max(1, min(args.jobs, len(jobs)))
+    items = [(index, job, args.seed) for index, job in enumerate(jobs, 1)]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(args.base_path,)) as pool:
+            chunksize = max(1, len(items) // (workers * 4))
+            for index, name, files, error in pool.map(_render_job, items, chunksize=chunksize):
+                if error is not None:
+                    failed += 1
+                    print(f"[{index}] {name} 渲染失败: {error}", file=sys.stderr)
+                    continue
+                for filename, data in files:
+                    if tar is not None:
+                        info = tarfile.TarInfo(filename)
+                        info.size = len(data)
+                        info.mtime = int(time.time())
+                        tar.addfile(info, io.BytesIO(data))
+                    else:
+                        with open(os.path.join(args.out_dir, filename), "wb") as fp:
+                            fp.write(data)
+                ok += 1
+    finally:
+        if tar is not None:
+            tar.close()
+        release_shared_memory(args.base_path)
+
+    elapsed = time.perf_counter() - started
+    print(f"完成 {ok} 张，失败 {failed} 张，用时 {elapsed:.2f}s，"
+          f"吞吐 {ok / elapsed if elapsed > 0 else 0:.2f} 张/秒（{workers} 个进程）", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# filename: character_registry.py
+"""
+角色注册表：扫描 assets/chara 得到角色列表，表情数量由立绘文件 "{角色} (n).png" 推导，
+不再需要在 chara_meta.yml 中手动维护 emotion_count。
+
+- 角色顺序：chara_meta.yml 中的角色在前（保持原有编号），之后是只有立绘目录的角色（按名称排序）
+- 没有 "{角色} (1).png" 立绘的目录不算作角色（打印提示后忽略）
+- 角色名、字体等元数据在第一次访问该角色时才与默认值合并
+- 各角色目录的 (修改时间, 表情数量) 保存在 config/__pycache__ 下，目录未变化时不再列出文件
+启动时列出 assets/chara 这一层目录并读取各角色目录的修改时间，只有变化过的目录才重新统计立绘。
+"""
+import marshal
+import os
+import threading
+from collections.abc import Mapping
+
+SPRITE_SUFFIX = ".png"
+
+
+def count_emotions(filenames, character: str) -> int:
+    """从 1 开始连续编号的立绘数量（"{角色} (1).png"、"{角色} (2).png"……）"""
+    prefix = f"{character} ("
+    numbers = set()
+    for name in filenames:
+        if name.startswith(prefix) and name.endswith(")" + SPRITE_SUFFIX):
+            try:
+                numbers.add(int(name[len(prefix):-len(SPRITE_SUFFIX) - 1]))
+            except ValueError:
+                pass
+    count = 0
+    while count + 1 in numbers:
+        count += 1
+    return count
+
+
+class CharacterRegistry(Mapping):
+    """
+    角色 id -> 元数据字典（full_name / font / emotion_count 等）的只读映射，按 id 查找与取编号均为 O(1)。
+    ids 是按编号排列的角色列表，重新扫描时原地更新，持有该列表的前端无需重新获取。
+    """
+
+    def __init__(self, chara_path: str, meta: dict, defaults: dict | None = None, index_file: str | None = None):
+        self.chara_path = chara_path
+        self.index_file = index_file
+        self.ids: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._meta = dict(meta or {})
+        self._defaults = dict(defaults or {})
+        self._entries: dict[str, dict] = {}
+        self._counts: dict[str, int] = {}  # 角色 -> 表情数量（扫描时统计）
+        self._index: dict[str, tuple[int, int]] = self._read_index()  # 角色 -> (目录 mtime_ns, 表情数量)
+        self._index_dirty = False
+        self._lock = threading.Lock()
+        self.rescan()
+
+    # --- Mapping ---
+    def __getitem__(self, character: str) -> dict:
+        entry = self._entries.get(character)
+        if entry is not None:
+            return entry
+        if character not in self._positions:
+            raise KeyError(character)
+        with self._lock:
+            entry = self._entries.get(character)
+            if entry is None:
+                if character not in self._counts:  # 等待锁期间被重新扫描移除
+                    raise KeyError(character)
+                entry = {"full_name": character, **self._defaults, **self._meta.get(character, {}),
+                         "emotion_count": self._counts[character]}
+                self._entries[character] = entry
+        return entry
+
+    def __contains__(self, character) -> bool:
+        return character in self._positions
+
+    def __iter__(self):
+        return iter(list(self.ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, character: str) -> int:
+        """角色在 ids 中的位置（从 0 开始），未知角色抛出 KeyError"""
+        return self._positions[character]
+
+    # --- 扫描 ---
+    def rescan(self) -> None:
+        """重新列出 assets/chara 下的角色目录并统计表情数量（目录未变化时使用索引）"""
+        try:
+            with os.scandir(self.chara_path) as it:
+                found = {entry.name for entry in it if entry.is_dir() and not entry.name.startswith((".", "_"))}
+        except FileNotFoundError:
+            found = set()
+        for character in self._meta:
+            if character not in found:
+                print(f"角色 {character} 没有立绘目录 {os.path.join(self.chara_path, character)}，已忽略")
+        with self._lock:
+            counts = {}
+            for character in sorted(found):
+                counts[character] = self._emotion_count(character)
+                if not counts[character]:
+                    print(f"角色目录 {os.path.join(self.chara_path, character)} 中没有立绘 "
+                          f"\"{character} (1){SPRITE_SUFFIX}\"，已忽略")
+            self._flush_index()
+            found = {c for c in found if counts[c]}
+            ids = [c for c in self._meta if c in found] + sorted(found - set(self._meta))
+            self._counts = {c: counts[c] for c in ids}
+            self.ids[:] = ids
+            self._positions = {character: i for i, character in enumerate(ids)}
+            for character in list(self._entries):
+                if character not in self._positions:
+                    del self._entries[character]
+
+    def update_meta(self, meta: dict, defaults: dict | None = None) -> dict[str, set[str]]:
+        """
+        替换 chara_meta.yml 的内容并重新扫描，返回 {变化类型: 角色集合}。
+        added / removed 按角色目录与配置判断；emotion_count / font / full_name 只比较已经加载过的角色，
+        未加载的角色在第一次访问时才读取新配置，本来就没有依赖旧值的缓存。
+        """
+        old_ids = set(self.ids)
+        with self._lock:
+            loaded = self._entries
+            self._entries = {}
+            self._meta = dict(meta or {})
+            self._defaults = dict(defaults or {})
+        self.rescan()
+        changes = {"added": set(self.ids) - old_ids, "removed": old_ids - set(self.ids)}
+        for field in ("emotion_count", "font", "full_name"):
+            changes[field] = {c for c, entry in loaded.items()
+                              if c in self._positions and entry.get(field) != self[c].get(field)}
+        return changes
+
+    def _emotion_count(self, character: str) -> int:
+        """目录未变化时使用索引中的表情数量，否则列出目录重新统计（调用方持有锁，之后调用 _flush_index）"""
+        directory = os.path.join(self.chara_path, character)
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return 0
+        cached = self._index.get(character)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        count = count_emotions(os.listdir(directory), character)
+        self._index[character] = (mtime_ns, count)
+        self._index_dirty = True
+        return count
+
+    def _read_index(self) -> dict:
+        if not self.index_file:
+            return {}
+        try:
+            with open(self.index_file, "rb") as fp:
+                index = marshal.load(fp)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError, EOFError, TypeError):
+            return {}
+
+    def _flush_index(self) -> None:
+        if not self._index_dirty or not self.index_file:
+            return
+        self._index_dirty = False
+        tmp = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            with open(tmp, "wb") as fp:
+                marshal.dump(self._index, fp)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
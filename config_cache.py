@@ -0,0 +1,62 @@
+# filename: config_cache.py
+"""
+YAML 配置的解析结果缓存。
+
+解析后的对象用 marshal 保存到配置文件同目录的 __pycache__ 下，文件头记录源文件的 mtime 与大小；
+两者都未变化时直接读取缓存，不需要导入 yaml，也不需要重新解析（text_configs.yml 解析约 40ms）。
+缓存目录不可写或内容无法用 marshal 保存时，退化为每次解析。
+"""
+import marshal
+import os
+import struct
+
+MAGIC = b"MYC1"
+_HEADER = struct.Struct("<4sqq")  # 魔数, 源文件 mtime_ns, 源文件大小
+
+
+def cache_file(path: str) -> str:
+    """path 对应的缓存文件路径"""
+    return os.path.join(os.path.dirname(path), "__pycache__", os.path.basename(path) + ".marshal")
+
+
+def _read_cached(cached: str, st: os.stat_result):
+    with open(cached, "rb") as fp:
+        blob = fp.read()
+    magic, mtime_ns, size = _HEADER.unpack_from(blob)
+    if magic != MAGIC or mtime_ns != st.st_mtime_ns or size != st.st_size:
+        raise ValueError("stale")
+    return marshal.loads(blob[_HEADER.size:])
+
+
+def _write_cached(cached: str, st: os.stat_result, data) -> None:
+    try:
+        payload = marshal.dumps(data)
+    except ValueError:
+        return  # 含有 marshal 不支持的类型（例如 yaml 的日期）
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        with open(tmp, "wb") as fp:
+            fp.write(_HEADER.pack(MAGIC, st.st_mtime_ns, st.st_size) + payload)
+        os.replace(tmp, cached)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_yaml(path: str):
+    """读取 YAML 配置，源文件未修改时直接返回缓存的解析结果"""
+    st = os.stat(path)
+    cached = cache_file(path)
+    try:
+        return _read_cached(cached, st)
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        pass
+
+    import yaml  # 只有缓存失效时才需要
+    with open(path, "r", encoding="utf-8") as fp:
+        data = yaml.safe_load(fp)
+    _write_cached(cached, st, data)
+    return data
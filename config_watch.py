@@ -0,0 +1,135 @@
+# filename: config_watch.py
+"""
+配置文件监视：Linux 上用 inotify（通过 ctypes 调用 libc），其他平台或 inotify 不可用时轮询修改时间。
+监视的是配置目录而不是单个文件，编辑器“写临时文件再改名”的保存方式也能捕获。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len（其后是 len 字节的文件名）
+
+
+def _inotify_fd(directory: str) -> int | None:
+    """创建监视 directory 的 inotify 描述符，不支持时返回 None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class ConfigWatcher:
+    """
+    监视 directory 下的 filenames，文件内容变化后在后台线程中调用 callback(filename)。
+    debounce 秒内的连续事件合并为一次；是否变化以 (mtime_ns, 大小) 判断，
+    因此两种实现的行为一致，重复的事件也不会触发多次回调。
+    """
+
+    def __init__(self, directory: str, filenames: list[str], callback: Callable[[str], None],
+                 interval: float = 1.0, debounce: float = 0.2):
+        self.directory = directory
+        self.filenames = list(filenames)
+        self.callback = callback
+        self.interval = interval  # 轮询间隔（inotify 模式下为检查停止标志的间隔）
+        self.debounce = debounce
+        self.backend: str | None = None  # "inotify" 或 "poll"
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._signatures = self._snapshot()
+
+    def _snapshot(self) -> dict[str, tuple[int, int] | None]:
+        signatures = {}
+        for name in self.filenames:
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+                signatures[name] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                signatures[name] = None
+        return signatures
+
+    def _check(self) -> None:
+        """对比文件签名，对变化的文件调用回调"""
+        current = self._snapshot()
+        changed = [name for name in self.filenames if current[name] != self._signatures.get(name)]
+        self._signatures = current
+        for name in changed:
+            if current[name] is None:
+                continue  # 文件被删除（或正在改名替换）时保留旧配置
+            try:
+                self.callback(name)
+            except Exception as e:
+                print(f"重新加载配置 {name} 失败: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        fd = _inotify_fd(self.directory)
+        self.backend = "inotify" if fd is not None else "poll"
+        target = self._run_inotify if fd is not None else self._run_poll
+        args = (fd,) if fd is not None else ()
+        self._thread = threading.Thread(target=target, args=args, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run_poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._check()
+
+    def _run_inotify(self, fd: int) -> None:
+        watched = set(self.filenames)
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self.interval)
+                if not ready:
+                    continue
+                if not watched & self._read_names(fd):
+                    continue
+                # 保存往往是多个事件（截断、写入、改名），稍等片刻再一起处理
+                if self._stop.wait(self.debounce):
+                    break
+                self._read_names(fd)
+                self._check()
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read_names(fd: int) -> set[str]:
+        """读出全部待处理事件，返回涉及的文件名"""
+        names = set()
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                raw = data[offset + _EVENT.size:offset + _EVENT.size + length]
+                names.add(os.fsdecode(raw.rstrip(b"\0")))
+                offset += _EVENT.size + length
@@ -0,0 +1,330 @@
+# filename: headless_render.py
+import os
+import random
+
+from PIL import Image
+
+from animation import MAX_SOURCE_FRAMES
+from character_registry import CharacterRegistry
+from config_cache import load_yaml
+from image_fit_paste import fit_image_tile
+from render_pipeline import LRUCache, OutputProfile, RenderPipeline, RenderResult
+from shared_image_cache import SharedImageCache, default_root, file_signature, release
+from text_fit_draw import ContentTile
+
+BOX_RECT = ((728, 355), (2339, 800))  # 文本框区域坐标
+BACKGROUND_COUNT = 16  # 背景图数量
+CHARA_OFFSET = (0, 134)  # 角色立绘粘贴位置
+
+
+def release_shared_memory(base_path: str | None = None) -> bool:
+    """
+    工作进程全部退出后由父进程调用：清理被强制结束的进程留下的登记，没有进程在使用时删除共享目录。
+    返回共享目录是否已不存在。
+    """
+    root = default_root(base_path or os.path.dirname(os.path.abspath(__file__)))
+    return not os.path.isdir(root) or release(root)
+
+
+class HeadlessRenderer:
+    """
+    不依赖键盘与剪贴板的渲染器：按 (角色, 表情, 背景) 直接在内存中合成底图并绘制内容。
+    背景、立绘与合成好的底图按 LRU 缓存，字体与角色名图层由流水线缓存，
+    适合批量渲染或作为常驻服务的工作进程。
+    不保存任何选择状态，各缓存各自加锁，可在多个线程中同时调用 render。
+    shared_memory_mb 大于 0 时（未指定时读取 config/cache.yml），解码与合成的结果放入跨进程共享的
+    内存映射文件，同时运行的多个进程只保留一份像素数据。
+    """
+
+    def __init__(self, base_path: str | None = None, layer_cache_size: int = 32,
+                 base_cache_size: int = 8, layout_cache=None, shared_memory_mb: int | None = None):
+        self.BASE_PATH = base_path or os.path.dirname(os.path.abspath(__file__))
+        self.CONFIG_PATH = os.path.join(self.BASE_PATH, "config")
+        self.ASSETS_PATH = os.path.join(self.BASE_PATH, "assets")
+
+        self.mahoshojo: CharacterRegistry | None = None  # 角色注册表（角色 -> 元数据）
+        self.text_configs_dict = {}  # 文本配置字典
+        self.character_list = []  # 角色列表（即 mahoshojo.ids）
+        self.load_configs()
+
+        if shared_memory_mb is None:
+            shared_memory_mb = self.cache_settings().get("shared_memory_mb", 0)
+        self.shared_cache = (SharedImageCache(default_root(self.BASE_PATH), int(shared_memory_mb * 2**20))
+                             if shared_memory_mb else None)
+        self.pipeline = RenderPipeline(layout_cache=layout_cache, shared_cache=self.shared_cache)
+        self.layer_cache = LRUCache(layer_cache_size)  # 背景与立绘
+        self.base_cache = LRUCache(base_cache_size)  # 合成好的底图
+
+    def load_configs(self) -> None:
+        """
+        从yaml加载角色元数据与文字配置（解析结果按文件修改时间缓存），
+        角色列表与表情数量由 assets/chara 下的立绘推导
+        """
+        meta = load_yaml(os.path.join(self.CONFIG_PATH, "chara_meta.yml"))
+        self.mahoshojo = CharacterRegistry(
+            os.path.join(self.ASSETS_PATH, "chara"), meta["mahoshojo"], meta.get("defaults"),
+            index_file=os.path.join(self.CONFIG_PATH, "__pycache__", "chara_index.marshal"),
+        )
+        self.character_list = self.mahoshojo.ids
+        self.text_configs_dict = load_yaml(os.path.join(self.CONFIG_PATH, "text_configs.yml"))["text_configs"]
+
+    def cache_settings(self) -> dict:
+        """config/cache.yml 的内容，文件不存在时为空"""
+        path = os.path.join(self.CONFIG_PATH, "cache.yml")
+        return (load_yaml(path) or {}) if os.path.exists(path) else {}
+
+    def reload_config(self, filename: str) -> dict[str, set[str]]:
+        """
+        重新解析 chara_meta.yml 或 text_configs.yml，与旧配置逐个角色对比，只让受影响的缓存失效：
+        - emotion_count 变化（立绘增删）或角色被删除: 丢弃该角色合成好的底图
+        - 角色名配置（text_configs）变化: 丢弃该角色的角色名图层
+        背景与立绘图层、字体、排版与文字图层不受影响。
+        重新加载 chara_meta.yml 时同时重新扫描 assets/chara。
+        mahoshojo / text_configs_dict / character_list 原地更新，持有引用的前端无需重新获取。
+        返回 {变化类型: 角色集合}，变化类型为 added / removed / emotion_count / font / full_name / label。
+        """
+        changes: dict[str, set[str]] = {}
+        if filename == "chara_meta.yml":
+            meta = load_yaml(os.path.join(self.CONFIG_PATH, filename))
+            changes = self.mahoshojo.update_meta(meta["mahoshojo"], meta.get("defaults"))
+            stale = changes["emotion_count"] | changes["removed"]
+            self.base_cache.discard(lambda key: key[0] in stale)
+            self.pipeline.label_cache.discard(lambda key: key[0] in changes["removed"])
+        elif filename == "text_configs.yml":
+            new = load_yaml(os.path.join(self.CONFIG_PATH, filename))["text_configs"]
+            old = self.text_configs_dict
+            changes["label"] = {c for c in set(old) | set(new) if old.get(c) != new.get(c)}
+            self.text_configs_dict.clear()
+            self.text_configs_dict.update(new)
+            self.pipeline.label_cache.discard(lambda key: key[0] in changes["label"])
+        else:
+            raise ValueError(f"不支持重新加载的配置文件: {filename}")
+        return {kind: characters for kind, characters in changes.items() if characters}
+
+    def font_path(self, character: str) -> str:
+        """角色字体文件绝对路径"""
+        return os.path.join(self.ASSETS_PATH, 'fonts', self.mahoshojo[character]["font"])
+
+    def bracket_color(self, character: str) -> tuple[int, int, int] | None:
+        """
+        中括号文字的颜色（角色名首字的颜色）。只有立绘目录、text_configs.yml 中没有配置的角色返回 None，
+        与 RenderPipeline.render_text 一样使用正文颜色
+        """
+        configs = self.text_configs_dict.get(character)
+        return tuple(configs[0]["font_color"]) if configs else None
+
+    def shared(self, key, factory):
+        """启用共享内存时先在进程间共享的图像中查找，否则直接生成"""
+        if self.shared_cache is None:
+            return factory()
+        return self.shared_cache.get_or_create(key, factory)
+
+    def load_layer(self, path: str) -> Image.Image:
+        """解码背景或立绘（RGBA），结果缓存"""
+        def factory():
+            with Image.open(path) as src:
+                return src.convert("RGBA")
+        return self.layer_cache.get_or_create(
+            path, lambda: self.shared(("layer", path, file_signature(path)), factory))
+
+    def layer_paths(self, character: str, emotion: int, background: int) -> tuple[str, str]:
+        """底图的源素材：(背景, 立绘) 文件路径"""
+        return (os.path.join(self.ASSETS_PATH, "background", f"c{background}.png"),
+                os.path.join(self.ASSETS_PATH, "chara", character, f"{character} ({emotion}).png"))
+
+    def compose_base(self, character: str, emotion: int, background: int) -> Image.Image:
+        """将角色第 emotion 个表情合成到第 background 张背景上（结果缓存，调用方不得修改）"""
+        def factory():
+            bg_path, overlay_path = self.layer_paths(character, emotion, background)
+            bg = self.load_layer(bg_path)
+            overlay = self.load_layer(overlay_path)
+            result = bg.copy()
+            result.paste(overlay, CHARA_OFFSET, overlay)
+            return result
+        def shared_factory():
+            sources = self.layer_paths(character, emotion, background)
+            key = ("base", character, emotion, background, *map(file_signature, sources))
+            return self.shared(key, factory)
+        return self.base_cache.get_or_create((character, emotion, background), shared_factory)
+
+    def resolve(self, character: str, emotion: int | None = None, background: int | None = None,
+                rng: random.Random | None = None) -> tuple[str, int, int]:
+        """校验参数，未指定的表情/背景随机选取"""
+        if character not in self.mahoshojo:
+            raise ValueError(f"未知角色: {character}")
+        rng = rng or random
+        emotion_cnt = self.mahoshojo[character]["emotion_count"]
+        if emotion is None:
+            emotion = rng.randint(1, emotion_cnt)
+        if background is None:
+            background = rng.randint(1, BACKGROUND_COUNT)
+        if not 1 <= int(emotion) <= emotion_cnt:
+            raise ValueError(f"表情编号超出范围: {emotion} (1-{emotion_cnt})")
+        if not 1 <= int(background) <= BACKGROUND_COUNT:
+            raise ValueError(f"背景编号超出范围: {background} (1-{BACKGROUND_COUNT})")
+        return character, int(emotion), int(background)
+
+    def render(self, character: str, emotion: int, background: int,
+               text: str | None = None, image: Image.Image | None = None, fmt: str = "png",
+               max_bytes: int | None = None) -> RenderResult:
+        """
+        在指定底图上绘制文本或粘贴图片（参数与 ManosabaTextBox 一致），fmt 为 png 或 webp。
+        指定 max_bytes 时输出不超过该字节数（尽量），格式、质量与缩放按角色与背景缓存，见 RenderResult.fmt
+        """
+        base = self.compose_base(character, emotion, background)
+        budget = dict(max_bytes=max_bytes, budget_key=(character, background))
+        if image is not None:
+            return self.pipeline.render_image(
+                base, BOX_RECT[0], BOX_RECT[1], image,
+                align="center",
+                valign="middle",
+                padding=12,
+                allow_upscale=True,
+                keep_alpha=True,
+                role_name=character,
+                text_configs_dict=self.text_configs_dict,
+                fmt=fmt,
+                **budget,
+            )
+        if text:
+            return self.pipeline.render_text(
+                base, BOX_RECT[0], BOX_RECT[1], text,
+                align="left",
+                valign="top",
+                color=(255, 255, 255),
+                max_font_height=145,
+                font_path=self.font_path(character),
+                role_name=character,
+                text_configs_dict=self.text_configs_dict,
+                fmt=fmt,
+                **budget,
+            )
+        raise ValueError("没有文本或图像")
+
+    def content_tile(self, character: str, text: str | None, image: Image.Image | None) -> ContentTile | None:
+        """排版文字或缩放图片，返回内容图块（两者皆无时返回 None）"""
+        if image is not None:
+            return fit_image_tile(
+                BOX_RECT[0], BOX_RECT[1], image,
+                align="center",
+                valign="middle",
+                padding=12,
+                allow_upscale=True,
+                keep_alpha=True,
+            )
+        if text:
+            return self.pipeline.text_tile(
+                text, BOX_RECT[0], BOX_RECT[1],
+                align="left",
+                valign="top",
+                color=(255, 255, 255),
+                max_font_height=145,
+                font_path=self.font_path(character),
+                bracket_color=self.bracket_color(character),
+            )
+        return None
+
+    def render_profiles(self, character: str, emotion: int, background: int, profiles: list[OutputProfile | str],
+                        text: str | None = None, image: Image.Image | None = None) -> dict[str, RenderResult]:
+        """
+        同一条消息输出多种尺寸（例如发送用的 full、预览用的 thumb 与 2x），
+        排版与合成各只做一次，返回 {规格名: 结果}。profiles 见 render_pipeline.PROFILES
+        """
+        tile = self.content_tile(character, text, image)
+        if tile is None:
+            raise ValueError("没有文本或图像")
+        return self.pipeline.compose_profiles(
+            self.compose_base(character, emotion, background), tile, profiles,
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            budget_key=(character, background),
+        )
+
+    def render_pages(self, character: str, emotion: int, background: int, text: str, min_font_size: int,
+                     fmt: str = "png") -> list[RenderResult]:
+        """文字需要小于 min_font_size 的字号才能放下时分页，各页绘制在同一张底图上"""
+        if not text:
+            raise ValueError("没有文本")
+        return self.pipeline.render_text_pages(
+            self.compose_base(character, emotion, background), BOX_RECT[0], BOX_RECT[1], text, min_font_size,
+            align="left",
+            valign="top",
+            color=(255, 255, 255),
+            max_font_height=145,
+            font_path=self.font_path(character),
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            fmt=fmt,
+        )
+
+    def render_typewriter(self, character: str, emotion: int, background: int, text: str, fmt: str = "gif",
+                          profile: OutputProfile | str = "full", **timing) -> RenderResult:
+        """
+        文字逐字出现的动画（gif / apng / webp），排版与 render 的文字模式相同。
+        timing 可指定 fps / max_duration / hold，见 RenderPipeline.render_typewriter
+        """
+        if not text:
+            raise ValueError("没有文本")
+        return self.pipeline.render_typewriter(
+            self.compose_base(character, emotion, background), BOX_RECT[0], BOX_RECT[1], text,
+            align="left",
+            valign="top",
+            color=(255, 255, 255),
+            max_font_height=145,
+            font_path=self.font_path(character),
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            profile=profile,
+            fmt=fmt,
+            **timing,
+        )
+
+    def render_conversation(self, turns: list[tuple[str, int | None, str]], background: int | None = None,
+                            profile: OutputProfile | str = "full", rng: random.Random | None = None) -> RenderResult:
+        """
+        多条消息的对话长图：turns 为 [(角色, 表情, 文本)]，每条一个文本框，从上到下排列在同一张图上。
+        表情为 None 时随机选取；所有消息使用同一张背景（未指定时随机）。
+        各条的排版一次性并行完成，底图、角色名图层与字体在消息之间共用缓存；
+        profile 作用于每一条，例如 "thumb" 输出缩小的长图，见 render_pipeline.PROFILES
+        """
+        if not turns:
+            raise ValueError("没有消息")
+        rng = rng or random
+        if background is None:
+            background = rng.randint(1, BACKGROUND_COUNT)
+        resolved = [self.resolve(character, emotion, background, rng) for character, emotion, _ in turns]
+        texts = [text for _, _, text in turns]
+        if not all(texts):
+            raise ValueError("每条消息都需要文本")
+        tiles = list(self.pipeline.pool.map(
+            lambda item: self.content_tile(item[0][0], item[1], None), zip(resolved, texts)))
+        panels = [(self.compose_base(*turn), tile, turn[0]) for turn, tile in zip(resolved, tiles)]
+        return self.pipeline.compose_strip(
+            panels, profile,
+            text_configs_dict=self.text_configs_dict,
+            budget_key=("conversation", tuple(turn[0] for turn in resolved), background),
+        )
+
+    def render_animated_image(self, character: str, emotion: int, background: int, image: Image.Image,
+                              fmt: str = "gif", max_frames: int = MAX_SOURCE_FRAMES) -> RenderResult:
+        """动图（GIF 等）逐帧放入文本框，输出 gif / apng / webp，见 RenderPipeline.render_animated_image"""
+        return self.pipeline.render_animated_image(
+            self.compose_base(character, emotion, background), BOX_RECT[0], BOX_RECT[1], image,
+            align="center",
+            valign="middle",
+            padding=12,
+            allow_upscale=True,
+            keep_alpha=True,
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            fmt=fmt,
+            max_frames=max_frames,
+        )
+
+    def warm_up(self, characters: list[str] | None = None, backgrounds: bool = False) -> None:
+        """预先绘制角色名图层（同时加载字体），backgrounds=True 时一并解码全部背景"""
+        for character in characters or self.character_list:
+            self.pipeline.label_tile(character, self.text_configs_dict)
+        if backgrounds:
+            for i in range(BACKGROUND_COUNT):
+                self.load_layer(os.path.join(self.ASSETS_PATH, "background", f"c{i + 1}.png"))
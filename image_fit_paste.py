@@ -1,14 +1,15 @@
 # filename: image_fit_paste.py
-from io import BytesIO
 from typing import Tuple, Literal, Union
-from PIL import Image, ImageDraw, ImageFont
-import os
+from PIL import Image
+
+from animation import MAX_SOURCE_FRAMES, is_animated
+from text_fit_draw import ContentTile
+from render_trace import span
 
 Align = Literal["left", "center", "right"]
 VAlign = Literal["top", "middle", "bottom"]
 
-def paste_image_auto(
-    image_source: Union[str, Image.Image],
+def fit_image_tile(
     top_left: Tuple[int, int],
     bottom_right: Tuple[int, int],
     content_image: Image.Image,
@@ -17,38 +18,15 @@ def paste_image_auto(
     padding: int = 0,
     allow_upscale: bool = False,
     keep_alpha: bool = True,
-    image_overlay: Union[str, Image.Image,None]=None,
-    max_image_size: Tuple[int, int] = (None, None),  # 添加最大图片尺寸限制 (width, height)
-    role_name: str = "unknown",  # 添加角色名称参数
-    text_configs_dict: dict = None,  # 添加文字配置字典参数
-) -> bytes:
+    max_image_size: Tuple[int, int] = (None, None),
+) -> ContentTile:
     """
-    在指定矩形内放置一张图片（content_image），按比例缩放至“最大但不超过”该矩形。
-    - base_image: 底图（会被复制，原图不改）
-    - top_left / bottom_right: 指定矩形区域（左上/右下坐标）
-    - content_image: 待放入的图片（PIL.Image.Image）
-    - align / valign: 水平/垂直对齐方式
-    - padding: 矩形内边距（像素），四边统一
-    - allow_upscale: 是否允许放大（默认只缩小不放大）
-    - keep_alpha: True 时保留透明通道并用其作为粘贴蒙版
-
-    返回：最终 PNG 的 bytes。
+    按比例缩放 content_image 至“最大但不超过”指定矩形，并计算粘贴坐标。
+    返回与底图无关的内容图块，可反复合成到不同底图上。
     """
     if not isinstance(content_image, Image.Image):
         raise TypeError("content_image 必须为 PIL.Image.Image")
 
-    if isinstance(image_source, Image.Image):
-        img = image_source.copy()
-    else:
-        img = Image.open(image_source).convert("RGBA")
-    # 压缩底图
-    draw = ImageDraw.Draw(img)
-    if image_overlay is not None:
-        if isinstance(image_overlay, Image.Image):
-            img_overlay = image_overlay.copy()
-        else:
-            img_overlay = Image.open(image_overlay).convert("RGBA") if os.path.isfile(image_overlay) else None
-
     x1, y1 = top_left
     x2, y2 = bottom_right
     if not (x2 > x1 and y2 > y1):
@@ -84,7 +62,8 @@ def paste_image_auto(
     new_h = max(1, int(round(ch * scale)))
 
     # 选择高质量插值
-    resized = content_image.resize((new_w, new_h), Image.LANCZOS)
+    with span("image_resize", src=content_image.size, dst=(new_w, new_h)):
+        resized = content_image.resize((new_w, new_h), Image.LANCZOS)
 
     # 计算粘贴坐标（考虑对齐与 padding）
     if align == "left":
@@ -102,43 +81,69 @@ def paste_image_auto(
         py = y2 - padding - new_h
 
     # 处理透明度：若 keep_alpha=True 且有 alpha，则用 alpha 作为 mask 粘贴
-    if keep_alpha and ("A" in resized.getbands()):
-        img.paste(resized, (px, py), resized)
-    else:
-        # 没有 alpha 就直接粘贴（会覆盖底图该区域）
-        img.paste(resized, (px, py))
-
-    # 覆盖置顶图层（如果有）
-    if image_overlay is not None and img_overlay is not None:
-        img.paste(img_overlay, (0, 0), img_overlay)
-    elif image_overlay is not None and img_overlay is None:
-        print("Warning: overlay image is not exist.")
-    # 自动在图片上写角色专属文字
-    # 如果提供了文字配置字典且角色名称存在，则使用对应的文字配置
-    if text_configs_dict and role_name in text_configs_dict:
-        shadow_offset = (2, 2)  # 阴影偏移量
-        shadow_color = (0, 0, 0)  # 黑色阴影
-        
-        for config in text_configs_dict[role_name]:
-            text = config["text"]
-            position = tuple(config["position"])
-            font_color = tuple(config["font_color"])
-            font_size = config["font_size"]
-        
-            # 使用绝对路径加载字体文件
-            font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'fonts', "font3.ttf")
-            font = ImageFont.truetype(font_path, font_size)
-            
-            # 计算阴影位置
-            shadow_position = (position[0] + shadow_offset[0], position[1] + shadow_offset[1])
-            
-            # 先绘制阴影文字
-            draw.text(shadow_position, text, fill=shadow_color, font=font)
-            
-            # 再绘制主文字（覆盖在阴影上方）
-            draw.text(position, text, fill=font_color, font=font)
-
-    # 输出 PNG bytes
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
+    # 没有 alpha 就直接粘贴（会覆盖底图该区域）
+    use_mask = keep_alpha and ("A" in resized.getbands())
+    return ContentTile(resized, (px, py), "image", use_mask)
+
+def paste_image_auto(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    content_image: Image.Image,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    padding: int = 0,
+    allow_upscale: bool = False,
+    keep_alpha: bool = True,
+    image_overlay: Union[str, Image.Image,None]=None,
+    max_image_size: Tuple[int, int] = (None, None),  # 添加最大图片尺寸限制 (width, height)
+    role_name: str = "unknown",  # 添加角色名称参数
+    text_configs_dict: dict = None,  # 添加文字配置字典参数
+    animation_fmt: str | None = "gif",  # 动图的输出格式（gif / apng / webp），None 时只用第一帧
+    max_frames: int = MAX_SOURCE_FRAMES,  # 动图最多保留的帧数
+) -> bytes:
+    """
+    在指定矩形内放置一张图片（content_image），按比例缩放至“最大但不超过”该矩形。
+    - base_image: 底图（会被复制，原图不改）
+    - top_left / bottom_right: 指定矩形区域（左上/右下坐标）
+    - content_image: 待放入的图片（PIL.Image.Image）
+    - align / valign: 水平/垂直对齐方式
+    - padding: 矩形内边距（像素），四边统一
+    - allow_upscale: 是否允许放大（默认只缩小不放大）
+    - keep_alpha: True 时保留透明通道并用其作为粘贴蒙版
+
+    - animation_fmt / max_frames: content_image 为动图（GIF 等）时逐帧放入文本框，输出动画
+
+    返回：最终 PNG 的 bytes（动图时为 animation_fmt 格式的动画，尺寸与文字模式相同）。
+    （RenderPipeline 的薄封装，底图、角色名图层等缓存与文字模式共享）
+    """
+    from render_pipeline import get_default_pipeline
+
+    if animation_fmt and is_animated(content_image):
+        return get_default_pipeline().render_animated_image(
+            image_source, top_left, bottom_right, content_image,
+            align=align,
+            valign=valign,
+            padding=padding,
+            allow_upscale=allow_upscale,
+            keep_alpha=keep_alpha,
+            image_overlay=image_overlay,
+            max_image_size=max_image_size,
+            role_name=role_name,
+            text_configs_dict=text_configs_dict,
+            fmt=animation_fmt,
+            max_frames=max_frames,
+        ).data
+
+    return get_default_pipeline().render_image(
+        image_source, top_left, bottom_right, content_image,
+        align=align,
+        valign=valign,
+        padding=padding,
+        allow_upscale=allow_upscale,
+        keep_alpha=keep_alpha,
+        image_overlay=image_overlay,
+        max_image_size=max_image_size,
+        role_name=role_name,
+        text_configs_dict=text_configs_dict,
+    ).data
@@ -0,0 +1,105 @@
+# filename: layout_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LayoutCache:
+    """
+    文本排版结果（字号、分行、行高、块高）的持久化缓存。
+    使用 SQLite 存储，按最近使用时间淘汰，最多保留 max_entries 条，
+    重启后常用消息仍可跳过字号搜索；绘制本身每次都在新选的底图上进行。
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 5000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._font_hashes: dict[str, tuple[float, int, str]] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS layouts ("
+            " key TEXT PRIMARY KEY,"
+            " font_size INTEGER NOT NULL,"
+            " lines TEXT NOT NULL,"
+            " line_h INTEGER NOT NULL,"
+            " block_h INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_layouts_last_used ON layouts(last_used)")
+        self._conn.commit()
+
+    def font_hash(self, font_path: str | None) -> str:
+        """字体文件内容哈希（按 mtime/大小记忆，文件变化后自动重算）"""
+        if not font_path or not os.path.exists(font_path):
+            return "<default>"
+        st = os.stat(font_path)
+        cached = self._font_hashes.get(font_path)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            return cached[2]
+        h = hashlib.sha1()
+        with open(font_path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._font_hashes[font_path] = (st.st_mtime, st.st_size, digest)
+        return digest
+
+    def make_key(self, text: str, font_path: str | None, box_size: tuple[int, int],
+                 max_font_height: int | None, line_spacing: float) -> str:
+        """排版结果只取决于这些输入"""
+        raw = json.dumps(
+            [text, self.font_hash(font_path), list(box_size), max_font_height, line_spacing],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> tuple[int, list[str], int, int] | None:
+        """查询排版结果，命中时刷新最近使用时间"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT font_size, lines, line_h, block_h FROM layouts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE layouts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        font_size, lines, line_h, block_h = row
+        return font_size, json.loads(lines), line_h, block_h
+
+    def put(self, key: str, layout: tuple[int, list[str], int, int]) -> None:
+        """写入排版结果，超出上限时淘汰最久未使用的条目"""
+        font_size, lines, line_h, block_h = layout
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO layouts (key, font_size, lines, line_h, block_h, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, font_size, json.dumps(lines, ensure_ascii=False), line_h, block_h, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM layouts").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM layouts WHERE key IN"
+                    " (SELECT key FROM layouts ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """清空全部排版缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM layouts")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -33,8 +33,6 @@ Ctrl+Tab: 清除图片
 # 11为黑部奈叶香，12为宝生玛格，13为紫藤亚里沙，14为泽渡可可
 current_character_index = 3  # 初始角色为橘雪莉（索引从0开始）
 
-mahoshojo_postion = [728,355] #文本范围起始位置
-mahoshojo_over = [2339,800]   #文本范围右下角位置
 
 
 
@@ -45,139 +43,23 @@ mahoshojo_over = [2339,800]   #文本范围右下角位置
 
 
 
-import random
 import time
 import keyboard
 import pyperclip
 import io
-from PIL import Image,ImageDraw,ImageFont
+from PIL import Image
 import win32clipboard
-import os
-import shutil
 
-from text_fit_draw import draw_text_auto
-from image_fit_paste import paste_image_auto
+from render_engine import RenderEngine
+from render_core import SelectionSession
 
 i = -1
-value_1 = -1 #额 保存上张表情用的  刚开始的想法是随机表情 但和上张表情不重复
-expression = None
-
-# 角色配置字典
-mahoshojo = {
-    "ema": {"emotion_count": 8, "font": "font3.ttf"},     # 樱羽艾玛
-    "hiro": {"emotion_count": 6, "font": "font3.ttf"},    # 二阶堂希罗
-    "sherri": {"emotion_count": 7, "font": "font3.ttf"},  # 橘雪莉
-    "hanna": {"emotion_count": 5, "font": "font3.ttf"},   # 远野汉娜
-    "anan": {"emotion_count": 9, "font": "font3.ttf"},    # 夏目安安
-    "yuki" : {"emotion_count": 18, "font": "font3.ttf"},
-    "meruru": {"emotion_count": 6, "font": "font3.ttf"},   # 冰上梅露露
-    "noa": {"emotion_count": 6, "font": "font3.ttf"},     # 城崎诺亚
-    "reia": {"emotion_count": 7, "font": "font3.ttf"},    # 莲见蕾雅
-    "miria": {"emotion_count": 4, "font": "font3.ttf"},   # 佐伯米莉亚
-    "nanoka": {"emotion_count": 5, "font": "font3.ttf"},  # 黑部奈叶香
-    "mago": {"emotion_count": 5, "font": "font3.ttf"},   # 宝生玛格
-    "alisa": {"emotion_count": 6, "font": "font3.ttf"},   # 紫藤亚里沙
-    "coco": {"emotion_count": 5, "font": "font3.ttf"}
-}
-# 角色文字配置字典 - 每个角色对应4个文字配置
-text_configs_dict = {
-    "nanoka": [  # 黑部奈叶香
-        {"text":"黑","position":(759,63),"font_color":(131,143,147),"font_size":196},
-        {"text":"部","position":(955,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"奈","position":(1053,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"叶香","position":(1197,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "hiro": [  # 二阶堂希罗
-        {"text":"二","position":(759,63),"font_color":(239,79,84),"font_size":196},
-        {"text":"阶堂","position":(955,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"希","position":(1143,110),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"罗","position":(1283,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "ema": [  # 樱羽艾玛
-        {"text":"樱","position":(759,73),"font_color":(253,145,175),"font_size":186},
-        {"text":"羽","position":(949,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"艾","position":(1039,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"玛","position":(1183,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "sherri": [  # 橘雪莉
-        {"text":"橘","position":(759,73),"font_color":(137,177,251),"font_size":186},
-        {"text":"雪","position":(943,110),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"莉","position":(1093,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"","position":(0,0),"font_color":(255, 255, 255),"font_size":1}  # 占位符
-    ],
-    "anan": [  # 夏目安安
-        {"text":"夏","position":(759,73),"font_color":(159,145,251),"font_size":186},
-        {"text":"目","position":(949,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"安","position":(1039,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"安","position":(1183,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "noa": [  # 城崎诺亚
-        {"text":"城","position":(759,73),"font_color":(104,223,231),"font_size":186},
-        {"text":"崎","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"诺","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"亚","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "coco": [  # 泽渡可可
-        {"text":"泽","position":(759,73),"font_color":(251,114,78),"font_size":186},
-        {"text":"渡","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"可","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"可","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "alisa": [  # 紫藤亚里沙
-        {"text":"紫","position":(759,73),"font_color":(235,75,60),"font_size":186},
-        {"text":"藤","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"亚","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"里沙","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "reia": [  # 莲见蕾雅
-        {"text":"莲","position":(759,73),"font_color":(253,177,88),"font_size":186},
-        {"text":"见","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"蕾","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"雅","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "mago": [  # 宝生玛格
-        {"text":"宝","position":(759,73),"font_color":(185,124,235),"font_size":186},
-        {"text":"生","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"玛","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"格","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "hanna": [  # 远野汉娜
-        {"text":"远","position":(759,73),"font_color":(169,199,30),"font_size":186},
-        {"text":"野","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"汉","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"娜","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "meruru": [  # 冰上梅露露
-        {"text":"冰","position":(759,73),"font_color":(227,185,175),"font_size":186},
-        {"text":"上","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"梅","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"露露","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}
-    ],
-    "miria": [  # 佐伯米莉亚
-        {"text":"佐","position":(759,73),"font_color":(235,207,139),"font_size":186},
-        {"text":"伯","position":(945,175),"font_color":(255, 255, 255),"font_size":92},
-        {"text":"米","position":(1042,117),"font_color":(255, 255, 255),"font_size":147},
-        {"text":"莉亚","position":(1186,175),"font_color":(255, 255, 255),"font_size":92}   
-    ],
-    "yuki": [  #月代雪
-    {"text":"月","position":(759,63),"font_color":(177,175,195),"font_size":196},
-    {"text":"代","position":(948,175),"font_color":(255, 255, 255),"font_size":92},
-    {"text":"雪","position":(1053,117),"font_color":(255, 255, 255),"font_size":147} ,   
-    {"text":"","position":(0,0),"font_color":(255, 255, 255),"font_size":1}
-    ]
-}
-import getpass
-
-# 获取当前用户名
-username = getpass.getuser()
-
-# 构建当前文件夹路径，并在其中创建"魔裁"文件夹
-current_dir = os.path.dirname(os.path.abspath(__file__))
-magic_cut_folder = os.path.join(current_dir, "魔裁")
-
-# 确保魔裁文件夹存在
-if not os.path.exists(magic_cut_folder):
-    os.makedirs(magic_cut_folder)
+session = SelectionSession()  # 上一张编号与指定表情，随机但和上张表情不重复
+
+# 渲染引擎：从 config/ 读取角色与文字配置，底图与字体缓存与其他前端共用
+engine = RenderEngine()
+mahoshojo = engine.mahoshojo
+magic_cut_folder = engine.CACHE_PATH
 
 # 判断用户电脑系统
 import platform
@@ -185,61 +67,26 @@ user_os = platform.system()
 os_version = platform.version()
 os_architecture = platform.architecture()[0]
 
-# 角色列表（按顺序对应1-13的角色）
-character_list = list(mahoshojo.keys())
+# 角色列表（按顺序对应1-14的角色）
+character_list = engine.character_list
 
 # 获取当前角色信息
 def get_current_character():
     return character_list[current_character_index-1]
 
-def get_current_font():
-    # 返回完整的字体文件绝对路径
-    return os.path.join(current_dir,"assets","fonts",mahoshojo[get_current_character()]["font"])
-
 def get_current_emotion_count():
-    return mahoshojo[get_current_character()]["emotion_count"]
+    return engine.emotion_count(get_current_character())
 
 def delate(folder_path=None, quality=85):
-    # 如果没有提供folder_path，则默认使用magic_cut_folder
-    if folder_path is None:
-        folder_path = magic_cut_folder
-    
-    # 确保文件夹存在
-    if not os.path.exists(folder_path):
-        print(f"文件夹不存在: {folder_path}")
-        return
-        
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.jpg'):
-            os.remove(os.path.join(folder_path, filename))
+    engine.delete_cache()
          
 
 def generate_and_save_images(character_name):
-    now_file = os.path.dirname(os.path.abspath(__file__))
-    
-    # 获取当前角色的表情数量
-    emotion_count = mahoshojo[character_name]["emotion_count"]
-
-    for filename in os.listdir(magic_cut_folder):
-        if filename.startswith(character_name):
-            return
+    if not engine.missing_bases(character_name):
+        engine.generate_and_save_images(character_name)  # 只刷新使用时间与磁盘预算
+        return
     print("正在加载")
-    for i in range(16):     
-        for j in range(emotion_count):
-                # 使用绝对路径加载背景图片和角色图片
-            background_path = os.path.join(now_file, "assets", "background", f"c{i+1}.png")
-            overlay_path = os.path.join(now_file,"assets", "chara", character_name, f"{character_name} ({j+1}).png")
-                
-            background = Image.open(background_path).convert("RGBA")
-            overlay = Image.open(overlay_path).convert("RGBA")
-                
-            img_num = j * 16 + i + 1
-            result = background.copy()
-            result.paste(overlay, (0, 134), overlay)
-                
-                # 使用绝对路径保存生成的图片
-            save_path = os.path.join(magic_cut_folder, f"{character_name} ({img_num}).jpg")
-            result.convert("RGB").save(save_path)
+    engine.generate_and_save_images(character_name)
     print("加载完成")
 
 
@@ -252,6 +99,7 @@ def switch_character(new_index):
         
         # 生成并保存图片
         generate_and_save_images(character_name)
+        engine.prefetch_next_base(session, character_name)
         
         return True
     return False
@@ -266,55 +114,14 @@ show_current_character()
 
 # 测试：生成当前角色的图片
 generate_and_save_images(get_current_character())
+engine.prefetch_next_base(session, get_current_character())
 
 def get_expression(i):
-    global expression
     character_name = get_current_character()
     if i <= mahoshojo[character_name]["emotion_count"]:
         print(f"已切换至第{i}个表情")
-        expression = i
-
-
-# 随机获取表情图片名称
-# 优化版本：使用循环替代递归，避免栈溢出风险
-# 维护上一次选择的表情类型，确保不连续选择相同表情
-def get_random_value():
-    global value_1,expression
-    character_name = get_current_character()
-    emotion_count = get_current_emotion_count()
-    total_images = 16 * emotion_count
-    
-    if expression:
-        i = random.randint((expression-1)*16+1,expression*16)
-        value_1 = i
-        expression = None
-        return f"{character_name} ({i})"
-    
-    
-    # 循环直到找到与上次不同表情的图片
-    max_attempts = 100  # 防止无限循环的安全机制
-    attempts = 0
-    
-    while attempts < max_attempts:
-        i = random.randint(1, total_images)
-        current_emotion = (i-1) // 16
-        
-        # 处理第一次调用的情况
-        if value_1 == -1:
-            value_1 = i
-            return f"{character_name} ({i})"
-        
-        # 检查是否与上次表情不同
-        if current_emotion != (value_1-1) //16:
-            value_1 = i
-            return f"{character_name} ({i})"
-        
-        attempts += 1
-    
-    # 如果尝试多次仍未找到（理论上概率极低），则返回当前随机数
-    # 这是一个安全机制，防止程序卡住
-    value_1 = i
-    return f"{character_name} ({i})"
+        session.set_emotion(i)
+        engine.prefetch_next_base(session, character_name)
 
 
 HOTKEY= "enter"
@@ -358,9 +165,8 @@ AUTO_SEND_IMAGE= True
 
 def copy_png_bytes_to_clipboard(png_bytes: bytes):
     # 打开 PNG 字节为 Image
-    image = Image.open(io.BytesIO(png_bytes))
     # 转换成 BMP 字节流（去掉 BMP 文件头的前 14 个字节）
-    with io.BytesIO() as output:
+    with Image.open(io.BytesIO(png_bytes)) as image, io.BytesIO() as output:
         image.convert("RGB").save(output, "BMP")
         bmp_data = output.getvalue()[14:]
     # 打开剪贴板并写入 DIB 格式
@@ -406,7 +212,8 @@ def try_get_image() -> Image.Image | None:
                 # DIB 格式缺少 BMP 文件头，需要手动加上
                 # BMP 文件头是 14 字节，包含 "BM" 标识和文件大小信息
                 header = b'BM' + (len(bmp_data) + 14).to_bytes(4, 'little') + b'\x00\x00\x00\x00\x36\x00\x00\x00'
-                image = Image.open(io.BytesIO(header + bmp_data))
+                with Image.open(io.BytesIO(header + bmp_data)) as image:
+                    image.load()
                 return image
     except Exception as e:
         print("无法从剪贴板获取图像：", e)
@@ -421,75 +228,31 @@ def Start():
     print("Start generate...")
     
     character_name = get_current_character()
-    address = os.path.join(magic_cut_folder, get_random_value()+".jpg")
-    BASEIMAGE_FILE = address
-    print(character_name,str(1+(value_1//16)),"背景",str(value_1%16))
-
-
-
-# 文本框左上角坐标 (x, y), 同时适用于图片框
-# 此值为一个二元组, 例如 (100, 150), 单位像素, 图片的左上角记为 (0, 0)
-    TEXT_BOX_TOPLEFT= (mahoshojo_postion[0], mahoshojo_postion[1])
-# 文本框右下角坐标 (x, y), 同时适用于图片框
-# 此值为一个二元组, 例如 (100, 150), 单位像素, 图片的左上角记为 (0, 0)
-    IMAGE_BOX_BOTTOMRIGHT= (mahoshojo_over[0], mahoshojo_over[1])
     text=cut_all_and_get_text()
     image=try_get_image()
 
     if text == "" and image is None:
         print("no text or image")
         return
-    
-    png_bytes=None
 
     if image is not None:
-        try:
-            print("Get image")
-            png_bytes = paste_image_auto(
-                image_source=BASEIMAGE_FILE,
-                image_overlay=None,
-                top_left=TEXT_BOX_TOPLEFT,
-                bottom_right=IMAGE_BOX_BOTTOMRIGHT,
-                content_image=image,
-                align="center",
-                valign="middle",
-                padding=12,
-                allow_upscale=True, 
-                keep_alpha=True,      # 使用内容图 alpha 作为蒙版 
-                role_name=character_name,  # 传递角色名称
-                text_configs_dict=text_configs_dict,  # 传递文字配置字典
-                )
-        except Exception as e:
-            print("Generate image failed:", e)
-            return
-    
-    elif text != "":
+        print("Get image")
+    else:
         print("Get text: "+text)
 
-        try:
-            png_bytes = draw_text_auto(
-                image_source=BASEIMAGE_FILE,
-                image_overlay=None,
-                top_left=TEXT_BOX_TOPLEFT,
-                bottom_right=IMAGE_BOX_BOTTOMRIGHT,
-                text=text,
-                align="left",
-                valign='top' ,
-                color=(255, 255, 255), 
-                max_font_height=145,        # 例如限制最大字号高度为 145 像素
-                font_path=get_current_font(),
-                role_name=character_name,  # 传递角色名称
-                text_configs_dict=text_configs_dict,  # 传递文字配置字典
-                )
-
-        except Exception as e:
-            print("Generate image failed:", e)
-            return
-        
-    if png_bytes is None:
+    # 底图随机选取（不与上张表情重复），文本框位置、字号等参数见 render_engine
+    try:
+        result = engine.generate(session, character_name, text, image)
+    except Exception as e:
+        print("Generate image failed:", e)
+        return
+
+    if result is None:
         print("Generate image failed!")
         return
-    
+    print(character_name,str(1+(session.last_value-1)//16),"背景",str(1+(session.last_value-1)%16))
+    png_bytes = result.data
+
     copy_png_bytes_to_clipboard(png_bytes)
     
     if AUTO_PASTE_IMAGE:
@@ -1,6 +1,5 @@
 """适用于 macOS 的版本"""
 
-import random
 import time
 from pynput import keyboard
 from pynput.keyboard import Key, Controller, GlobalHotKeys
@@ -12,11 +11,11 @@ from sys import platform
 from rich import print, inspect
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
 import os
-import yaml
 import tempfile
 import subprocess
-from text_fit_draw import draw_text_auto
-from image_fit_paste import paste_image_auto
+from config_cache import load_yaml
+from render_engine import RenderEngine
+from render_core import SelectionSession, split_value
 
 print("""角色说明:
 1为樱羽艾玛，2为二阶堂希罗，3为橘雪莉，4为远野汉娜
@@ -46,7 +45,6 @@ Ctrl+Tab: 清除图片
 class ManosabaTextBox:
     def __init__(self):
         # 常量定义
-        self.BOX_RECT = ((728, 355), (2339, 800))
         self.KEY_DELAY = 0.1  # 组合键延迟
         self.AUTO_PASTE_IMAGE = True  # 自动粘贴
         self.AUTO_SEND_IMAGE = True  # 自动发送
@@ -54,54 +52,30 @@ class ManosabaTextBox:
         self.PLATFORM = platform.lower()
         self.kbd_controller = Controller()
 
-        self.BASE_PATH = ""  # 基础路径
-        self.CONFIG_PATH = ""  # 配置路径
-        self.ASSETS_PATH = ""  # 资源路径
-        self.CACHE_PATH = ""  # 缓存路径
-        self.setup_paths()
-
-        self.mahoshojo = {}  # 角色元数据
-        self.text_configs_dict = {}  # 文字配置数据
-        self.character_list = []  # 角色列表
+        # 渲染引擎：配置、底图与字体缓存、排版缓存（与其他前端共用）
+        self.engine = RenderEngine()
+        self.CONFIG_PATH = self.engine.CONFIG_PATH
+        self.CACHE_PATH = self.engine.CACHE_PATH
+        self.mahoshojo = self.engine.mahoshojo  # 角色元数据
+        self.character_list = self.engine.character_list  # 角色列表
         self.hotkey_bindings = []  # 热键配置
         self.load_configs()
 
-        self.emote = None
-        self.value_1 = -1
-        self.i = -1
+        self.session = SelectionSession()  # 上一张编号与指定表情
         self.current_character_index = 3
 
-    def setup_paths(self):
-        """设置文件路径"""
-        self.BASE_PATH = os.path.dirname(os.path.abspath(__file__))
-        self.CONFIG_PATH = os.path.join(self.BASE_PATH, "config")
-        self.ASSETS_PATH = os.path.join(self.BASE_PATH, "assets")
-        self.CACHE_PATH = os.path.join(self.ASSETS_PATH, "cache")
-        os.makedirs(self.CACHE_PATH, exist_ok=True)
-
     def load_configs(self):
-        """加载配置文件"""
-        # 读取角色元数据
-        with open(os.path.join(self.CONFIG_PATH, "chara_meta.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.mahoshojo = config["mahoshojo"]
-
-        # 读取文字配置
-        with open(os.path.join(self.CONFIG_PATH, "text_configs.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.text_configs_dict = config["text_configs"]
-        self.character_list = list(self.mahoshojo.keys())
+        """加载热键配置"""
         inspect(self.mahoshojo)
 
         # 读取热键配置
-        with open(os.path.join(self.CONFIG_PATH, "hotkeys_macos.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
+        config = load_yaml(os.path.join(self.CONFIG_PATH, "hotkeys_macos.yml"))
         ACTION_MAP = {
             "switch_character": self.switch_character,
             "show_current_character": self.show_current_character,
             "get_expression": self.get_expression,
             "start_generate": self.start,
-            "delete_images": lambda: self.delete(self.CACHE_PATH)
+            "delete_images": self.engine.delete_cache
         }
 
         bindings = {}
@@ -132,34 +106,23 @@ class ManosabaTextBox:
             character_name = self.get_current_character()
             print(f"已切换到角色: {character_name}")
             self.generate_and_save_images(character_name)
+            self.engine.prefetch_next_base(self.session, character_name)
             return True
         return False
 
-    def get_current_font(self) -> str:
-        """返回当前角色的字体文件绝对路径"""
-        return os.path.join(self.BASE_PATH, 'assets', 'fonts',
-                            self.mahoshojo[self.get_current_character()]["font"])
-
     def get_current_emotion_count(self) -> int:
         """获取当前角色的表情数量"""
-        return self.mahoshojo[self.get_current_character()]["emotion_count"]
-
-    def delete(self, folder_path: str) -> None:
-        """删除指定文件夹中的所有jpg文件"""
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith('.jpg'):
-                os.remove(os.path.join(folder_path, filename))
+        return self.engine.emotion_count(self.get_current_character())
 
     def generate_and_save_images(self, character_name: str) -> None:
         """生成并保存指定角色的所有表情图片"""
-        emotion_cnt = self.mahoshojo[character_name]["emotion_count"]
-
-        # 检查是否已经生成过
-        for filename in os.listdir(self.CACHE_PATH):
-            if filename.startswith(character_name):
-                return
+        # 检查是否已经生成过（被淘汰的底图需要补上）
+        missing = self.engine.missing_bases(character_name)
+        if not missing:
+            self.engine.generate_and_save_images(character_name)  # 只刷新使用时间与磁盘预算
+            return
 
-        total_images = 16 * emotion_cnt
+        total_images = len(missing)
 
         with Progress(
                 SpinnerColumn(),
@@ -172,30 +135,8 @@ class ManosabaTextBox:
 
             task = progress.add_task(f"正在为角色 {character_name} 生成 {total_images} 张图片...",
                                      total=total_images)
-
-            for j in range(emotion_cnt):
-                for i in range(16):
-                    background_path = os.path.join(
-                        self.BASE_PATH, 'assets', "background", f"c{i + 1}.png"
-                    )
-                    overlay_path = os.path.join(
-                        self.BASE_PATH, 'assets', 'chara', character_name,
-                        f"{character_name} ({j + 1}).png"
-                    )
-
-                    background = Image.open(background_path).convert("RGBA")
-                    overlay = Image.open(overlay_path).convert("RGBA")
-
-                    img_num = j * 16 + i + 1
-                    result = background.copy()
-                    result.paste(overlay, (0, 134), overlay)
-
-                    save_path = os.path.join(
-                        self.CACHE_PATH, f"{character_name} ({img_num}).jpg"
-                    )
-                    result.convert("RGB").save(save_path)
-
-                    progress.update(task, advance=1)
+            self.engine.generate_and_save_images(
+                character_name, lambda current, total: progress.update(task, completed=current))
 
         print(f"[green]✓[/green] 角色 {character_name} 加载完成！")
 
@@ -207,41 +148,10 @@ class ManosabaTextBox:
     def get_expression(self, i: int) -> None:
         """设置表情索引"""
         character_name = self.get_current_character()
-        if i <= self.mahoshojo[character_name]["emotion_count"]:
+        if i <= self.engine.emotion_count(character_name):
             print(f"已切换至第{i}个表情")
-            self.emote = i
-
-    def get_random_value(self) -> str:
-        """随机获取表情图片名称"""
-        character_name = self.get_current_character()
-        emotion_cnt = self.get_current_emotion_count()
-        total_images = 16 * emotion_cnt
-
-        if self.emote:
-            i = random.randint((self.emote - 1) * 16 + 1, self.emote * 16)
-            self.value_1 = i
-            self.emote = None
-            return f"{character_name} ({i})"
-
-        max_attempts = 100
-        attempts = 0
-
-        while attempts < max_attempts:
-            i = random.randint(1, total_images)
-            current_emotion = (i - 1) // 16
-
-            if self.value_1 == -1:
-                self.value_1 = i
-                return f"{character_name} ({i})"
-
-            if current_emotion != (self.value_1 - 1) // 16:
-                self.value_1 = i
-                return f"{character_name} ({i})"
-
-            attempts += 1
-
-        self.value_1 = i
-        return f"{character_name} ({i})"
+            self.session.set_emotion(i)
+            self.engine.prefetch_next_base(self.session, character_name)
 
     def copy_png_bytes_to_clipboard(self, png_bytes: bytes) -> None:
         """将PNG字节数据复制到剪贴板（跨平台）"""
@@ -289,8 +199,8 @@ class ManosabaTextBox:
                     pass
 
                 try:
-                    image = Image.open(io.BytesIO(data))
-                    image.load()
+                    with Image.open(io.BytesIO(data)) as image:
+                        image.load()
                     return image
                 except Exception:
                     return None
@@ -304,12 +214,6 @@ class ManosabaTextBox:
         print("Start generate...")
 
         character_name = self.get_current_character()
-        address = os.path.join(self.CACHE_PATH, self.get_random_value() + ".jpg")
-        baseimage_file = address
-        print(character_name, str(1 + (self.value_1 // 16)), "背景", str(self.value_1 % 16))
-
-        text_box_topleft = (self.BOX_RECT[0][0], self.BOX_RECT[0][1])
-        image_box_bottomright = (self.BOX_RECT[1][0], self.BOX_RECT[1][1])
         text = self.cut_all_and_get_text()
         image = self.try_get_image()
 
@@ -317,55 +221,23 @@ class ManosabaTextBox:
             print("no text or image")
             return
 
-        png_bytes = None
-
         if image is not None:
-            try:
-                print("Get image")
-                png_bytes = paste_image_auto(
-                    image_source=baseimage_file,
-                    image_overlay=None,
-                    top_left=text_box_topleft,
-                    bottom_right=image_box_bottomright,
-                    content_image=image,
-                    align="center",
-                    valign="middle",
-                    padding=12,
-                    allow_upscale=True,
-                    keep_alpha=True,
-                    role_name=character_name,
-                    text_configs_dict=self.text_configs_dict,
-                )
-            except Exception as e:
-                print("Generate image failed:", e)
-                return
-
-        elif text is not None and text != "":
+            print("Get image")
+        else:
             print(f"Get text: {text}")
 
-            try:
-                png_bytes = draw_text_auto(
-                    image_source=baseimage_file,
-                    image_overlay=None,
-                    top_left=text_box_topleft,
-                    bottom_right=image_box_bottomright,
-                    text=text,
-                    align="left",
-                    valign='top',
-                    color=(255, 255, 255),
-                    max_font_height=145,
-                    font_path=self.get_current_font(),
-                    role_name=character_name,
-                    text_configs_dict=self.text_configs_dict,
-                )
-
-            except Exception as e:
-                print("Generate image failed:", e)
-                return
-
-        if png_bytes is None:
+        try:
+            result = self.engine.generate(self.session, character_name, text, image)
+        except Exception as e:
+            print("Generate image failed:", e)
+            return
+
+        if result is None:
             print("Generate image failed!")
             return
+        emotion, background = split_value(self.session.last_value)
+        print(character_name, emotion, "背景", background)
+        png_bytes = result.data
 
         self.copy_png_bytes_to_clipboard(png_bytes)
 
@@ -386,6 +258,7 @@ class ManosabaTextBox:
 
         self.show_current_character()
         self.generate_and_save_images(self.get_current_character())
+        self.engine.prefetch_next_base(self.session, self.get_current_character())
 
         listener = GlobalHotKeys(self.hotkey_bindings)
         listener.start()
@@ -1,15 +1,9 @@
 """ Textual UI 版本"""
-import random
 import time
-import psutil
-from pynput.keyboard import Key, Controller, GlobalHotKeys
-import pyperclip
 import io
 from PIL import Image
-import pyclip
 from sys import platform
 import os
-import yaml
 import tempfile
 import subprocess
 import threading
@@ -17,12 +11,18 @@ import threading
 from rich import print
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical, ScrollableContainer
-from textual.widgets import Header, Footer, RadioSet, RadioButton, Label, ProgressBar, Switch
+from textual.widgets import Header, Footer, RadioSet, RadioButton, Label, ProgressBar, Switch, Static
 from textual.binding import Binding
 from textual.reactive import reactive
 
-from text_fit_draw import draw_text_auto
-from image_fit_paste import paste_image_auto
+from config_cache import load_yaml
+from config_watch import ConfigWatcher
+from text_fit_draw import ContentTile
+from render_engine import RenderEngine
+from render_core import SelectionSession, split_value
+from render_stats import format_bytes
+import render_trace
+from render_trace import span, traced
 
 PLATFORM = platform.lower()
 
@@ -42,59 +42,61 @@ class ManosabaTextBox:
 
     def __init__(self):
         # 常量定义
-        self.BOX_RECT = ((728, 355), (2339, 800))  # 文本框区域坐标
         self.KEY_DELAY = 0.1  # 按键延迟
         self.AUTO_PASTE_IMAGE = True  # 自动粘贴图片
         self.AUTO_SEND_IMAGE = True  # 自动发送图片
+        self.PAGE_MIN_FONT_SIZE = 0  # 文字放不下时分页的最小字号，0 表示不分页（缩小字号放下全部文字）
 
-        self.kbd_controller = Controller()  # 键盘控制器
+        self._kbd_controller = None  # 键盘控制器（首次使用时创建）
 
-        # 初始化路径
-        self.BASE_PATH = ""  # 基础路径
-        self.CONFIG_PATH = ""  # 配置路径
-        self.ASSETS_PATH = ""  # 资源路径
-        self.CACHE_PATH = ""  # 缓存路径
-        self.setup_paths()
+        # 渲染引擎：配置、底图与字体缓存、排版缓存（与其他前端共用）
+        self.engine = RenderEngine()
+        self.CONFIG_PATH = self.engine.CONFIG_PATH
+        self.CACHE_PATH = self.engine.CACHE_PATH
+        self.mahoshojo = self.engine.mahoshojo  # 角色元数据
+        self.character_list = self.engine.character_list  # 角色列表
 
-        # 加载配置
-        self.mahoshojo = {}  # 角色元数据
-        self.text_configs_dict = {}  # 文本配置字典
-        self.character_list = []  # 角色列表
+        # 前端配置
         self.keymap = {}  # 快捷键映射
         self.process_whitelist = []  # 进程白名单
         self.load_configs()
 
         # 状态变量
-        self.emote = None  # 表情索引
-        self.value_1 = -1  # 我也不知道这是啥我也不敢动
+        self.session = SelectionSession()  # 底图选择状态（上一张编号、指定表情），渲染本身不依赖它
         self.current_character_index = 3  # 当前角色索引，默认第三个角色（sherri）
-
-    def setup_paths(self):
-        """设置文件路径"""
-        self.BASE_PATH = os.path.dirname(os.path.abspath(__file__))
-        self.CONFIG_PATH = os.path.join(self.BASE_PATH, "config")
-        self.ASSETS_PATH = os.path.join(self.BASE_PATH, "assets")
-        self.CACHE_PATH = os.path.join(self.ASSETS_PATH, "cache")
-        os.makedirs(self.CACHE_PATH, exist_ok=True)
+        self.last_tiles: list[ContentTile] = []  # 上一条消息排版好的内容图块（分页时每页一块），供换底图重绘
 
     def load_configs(self):
-        """从yaml加载配置文件"""
-        with open(os.path.join(self.CONFIG_PATH, "chara_meta.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.mahoshojo = config["mahoshojo"]
-            self.character_list = list(self.mahoshojo.keys())
-
-        with open(os.path.join(self.CONFIG_PATH, "text_configs.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.text_configs_dict = config["text_configs"]
+        """从yaml加载快捷键与白名单配置（解析结果按文件修改时间缓存）"""
+        self.keymap = load_yaml(os.path.join(self.CONFIG_PATH, "keymap.yml")).get(PLATFORM, {})
+        self.process_whitelist = load_yaml(os.path.join(self.CONFIG_PATH, "process_whitelist.yml")).get(PLATFORM, [])
 
-        with open(os.path.join(self.CONFIG_PATH, "keymap.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.keymap = config.get(PLATFORM, {})
-
-        with open(os.path.join(self.CONFIG_PATH, "process_whitelist.yml"), 'r', encoding="utf-8") as fp:
-            config = yaml.safe_load(fp)
-            self.process_whitelist = config.get(PLATFORM, [])
+    def reload_config(self, filename: str) -> dict[str, set[str]]:
+        """
+        重新加载变化的配置文件。角色配置交给引擎做定向失效，并按角色名修正当前角色索引；
+        返回引擎报告的变化（快捷键与白名单配置返回空字典）
+        """
+        if filename in ("keymap.yml", "process_whitelist.yml"):
+            self.load_configs()
+            return {}
+        character = self.get_character()
+        changes = self.engine.reload_config(filename)
+        if character in self.mahoshojo:
+            self.current_character_index = self.mahoshojo.position(character) + 1
+        else:
+            self.current_character_index = 1
+        if (self.session.emote or 0) > self.get_current_emotion_count():
+            self.session.set_emotion(None)
+        self.prefetch_next_base()
+        return changes
+
+    @property
+    def kbd_controller(self):
+        """键盘控制器；pynput 在 macOS 上会加载 Quartz，推迟到第一次模拟按键时再导入"""
+        if self._kbd_controller is None:
+            from pynput.keyboard import Controller
+            self._kbd_controller = Controller()
+        return self._kbd_controller
 
     def get_character(self, index: str | None = None, full_name: bool = False) -> str:
         """
@@ -105,102 +107,37 @@ class ManosabaTextBox:
         Returns:
             角色名称 (str)
         """
-        if index is not None:
-            return self.mahoshojo[index]['full_name'] if full_name else index
-        else:
-            chara = self.character_list[self.current_character_index - 1]
-            return self.mahoshojo[chara]['full_name'] if full_name else chara
+        chara = index if index is not None else self.character_list[self.current_character_index - 1]
+        return self.engine.full_name(chara) if full_name else chara
 
     def switch_character(self, index: int) -> bool:
         """切换到指定索引的角色"""
         if 0 < index <= len(self.character_list):
             self.current_character_index = index
+            self.prefetch_next_base()
             return True
         return False
 
-    def get_current_font(self) -> str:
-        """返回当前角色的字体文件绝对路径"""
-        return os.path.join(self.BASE_PATH, 'assets', 'fonts',
-                            self.mahoshojo[self.get_character()]["font"])
+    def set_emotion(self, emotion: int | None) -> None:
+        """指定下一张图片使用的表情（仅生效一次）"""
+        self.session.set_emotion(emotion)
+        self.prefetch_next_base()
 
     def get_current_emotion_count(self) -> int:
         """获取当前角色的表情数量"""
-        return self.mahoshojo[self.get_character()]["emotion_count"]
+        return self.engine.emotion_count(self.get_character())
 
-    def delete(self, folder_path: str) -> None:
-        """删除指定文件夹中的所有jpg文件"""
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith('.jpg'):
-                os.remove(os.path.join(folder_path, filename))
+    def delete(self) -> None:
+        """删除预先合成的底图"""
+        self.engine.delete_cache()
 
     def generate_and_save_images(self, character_name: str, progress_callback=None) -> None:
         """生成并保存指定角色的所有表情图片"""
-        emotion_cnt = self.mahoshojo[character_name]["emotion_count"]
-
-        # 检查是否已经生成过
-        for filename in os.listdir(self.CACHE_PATH):
-            if filename.startswith(character_name):
-                return
-
-        total_images = 16 * emotion_cnt
-
-        for j in range(emotion_cnt):
-            for i in range(16):
-                background_path = os.path.join(
-                    self.BASE_PATH, 'assets', "background", f"c{i + 1}.png"
-                )
-                overlay_path = os.path.join(
-                    self.BASE_PATH, 'assets', 'chara', character_name,
-                    f"{character_name} ({j + 1}).png"
-                )
-
-                background = Image.open(background_path).convert("RGBA")
-                overlay = Image.open(overlay_path).convert("RGBA")
-
-                img_num = j * 16 + i + 1
-                result = background.copy()
-                result.paste(overlay, (0, 134), overlay)
-
-                save_path = os.path.join(
-                    self.CACHE_PATH, f"{character_name} ({img_num}).jpg"
-                )
-                result.convert("RGB").save(save_path)
-
-                if progress_callback:
-                    progress_callback(j * 16 + i + 1, total_images)
-
-    def get_random_value(self) -> str:
-        """随机获取表情图片名称"""
-        character_name = self.get_character()
-        emotion_cnt = self.get_current_emotion_count()
-        total_images = 16 * emotion_cnt
-
-        if self.emote:
-            i = random.randint((self.emote - 1) * 16 + 1, self.emote * 16)
-            self.value_1 = i
-            self.emote = None
-            return f"{character_name} ({i})"
-
-        max_attempts = 100
-        attempts = 0
-        i = random.randint(1, total_images)
-
-        while attempts < max_attempts:
-            i = random.randint(1, total_images)
-            current_emotion = (i - 1) // 16
-
-            if self.value_1 == -1:
-                self.value_1 = i
-                return f"{character_name} ({i})"
-
-            if current_emotion != (self.value_1 - 1) // 16:
-                self.value_1 = i
-                return f"{character_name} ({i})"
-
-            attempts += 1
+        self.engine.generate_and_save_images(character_name, progress_callback)
 
-        self.value_1 = i
-        return f"{character_name} ({i})"
+    def prefetch_next_base(self) -> None:
+        """预先抽取下一张底图并在后台解码"""
+        self.engine.prefetch_next_base(self.session, self.get_character())
 
     def copy_png_bytes_to_clipboard(self, png_bytes: bytes) -> None:
         """将PNG字节数据复制到剪贴板"""
@@ -219,9 +156,8 @@ class ManosabaTextBox:
                     print(f"复制图片到剪贴板失败: {result.stderr.decode()}")
             elif PLATFORM.startswith('win'):
                 # 打开 PNG 字节为 Image
-                image = Image.open(io.BytesIO(png_bytes))
                 # 转换成 BMP 字节流（去掉 BMP 文件头的前 14 个字节）
-                with io.BytesIO() as output:
+                with Image.open(io.BytesIO(png_bytes)) as image, io.BytesIO() as output:
                     image.convert("RGB").save(output, "BMP")
                     bmp_data = output.getvalue()[14:]
                 # 打开剪贴板并写入 DIB 格式
@@ -237,8 +173,11 @@ class ManosabaTextBox:
 
     def cut_all_and_get_text(self) -> str:
         """模拟全选和剪切操作，返回剪切得到的文本内容"""
+        import pyperclip
+
         pyperclip.copy("")
         if PLATFORM == 'darwin':
+            from pynput.keyboard import Key
             self.kbd_controller.press(Key.cmd)
             self.kbd_controller.press('a')
             self.kbd_controller.release('a')
@@ -258,6 +197,8 @@ class ManosabaTextBox:
         """尝试从剪贴板获取图像"""
         if PLATFORM == 'darwin':
             try:
+                import pyclip
+
                 data = pyclip.paste()
 
                 if isinstance(data, bytes) and len(data) > 0:
@@ -269,8 +210,8 @@ class ManosabaTextBox:
                         pass
 
                     try:
-                        image = Image.open(io.BytesIO(data))
-                        image.load()
+                        with Image.open(io.BytesIO(data)) as image:
+                            image.load()
                         return image
                     except Exception:
                         return None
@@ -289,7 +230,8 @@ class ManosabaTextBox:
                         # BMP 文件头是 14 字节，包含 "BM" 标识和文件大小信息
                         header = b'BM' + (len(bmp_data) + 14).to_bytes(4,
                                                                        'little') + b'\x00\x00\x00\x00\x36\x00\x00\x00'
-                        image = Image.open(io.BytesIO(header + bmp_data))
+                        with Image.open(io.BytesIO(header + bmp_data)) as image:
+                            image.load()
                         return image
             except Exception as e:
                 print("无法从剪贴板获取图像：", e)
@@ -311,6 +253,8 @@ class ManosabaTextBox:
         wl = {name.lower() for name in self.process_whitelist}
 
         if PLATFORM.startswith('win'):
+            import psutil
+
             try:
                 hwnd = win32gui.GetForegroundWindow()
                 if not hwnd:
@@ -339,69 +283,13 @@ class ManosabaTextBox:
             # todo: Linux 支持
             return True
 
-    def start(self) -> str:
-        """生成并发送图片，返回状态消息"""
-        if not self._active_process_allowed():
-            return "前台应用不在白名单内"
-        character_name = self.get_character()
-        address = os.path.join(self.CACHE_PATH, self.get_random_value() + ".jpg")
-        baseimage_file = address
-
-        text_box_topleft = (self.BOX_RECT[0][0], self.BOX_RECT[0][1])
-        image_box_bottomright = (self.BOX_RECT[1][0], self.BOX_RECT[1][1])
-        text = self.cut_all_and_get_text()
-        image = self.try_get_image()
-
-        if text == "" and image is None:
-            return "错误: 没有文本或图像"
-
-        png_bytes = None
-
-        if image is not None:
-            try:
-                png_bytes = paste_image_auto(
-                    image_source=baseimage_file,
-                    image_overlay=None,
-                    top_left=text_box_topleft,
-                    bottom_right=image_box_bottomright,
-                    content_image=image,
-                    align="center",
-                    valign="middle",
-                    padding=12,
-                    allow_upscale=True,
-                    keep_alpha=True,
-                    role_name=character_name,
-                    text_configs_dict=self.text_configs_dict,
-                )
-            except Exception as e:
-                return f"生成图像失败: {e}"
-
-        elif text is not None and text != "":
-            try:
-                png_bytes = draw_text_auto(
-                    image_source=baseimage_file,
-                    image_overlay=None,
-                    top_left=text_box_topleft,
-                    bottom_right=image_box_bottomright,
-                    text=text,
-                    align="left",
-                    valign='top',
-                    color=(255, 255, 255),
-                    max_font_height=145,
-                    font_path=self.get_current_font(),
-                    role_name=character_name,
-                    text_configs_dict=self.text_configs_dict,
-                )
-
-            except Exception as e:
-                return f"生成图像失败: {e}"
-
-        if png_bytes is None:
-            return "生成图像失败！"
-
+    def send_png(self, png_bytes: bytes) -> None:
+        """写入剪贴板，并按设置自动粘贴、发送"""
         self.copy_png_bytes_to_clipboard(png_bytes)
 
         if self.AUTO_PASTE_IMAGE:
+            from pynput.keyboard import Key
+
             self.kbd_controller.press(Key.ctrl if PLATFORM != 'darwin' else Key.cmd)
             self.kbd_controller.press('v')
             self.kbd_controller.release('v')
@@ -413,19 +301,78 @@ class ManosabaTextBox:
                 self.kbd_controller.press(Key.enter)
                 self.kbd_controller.release(Key.enter)
 
-        return f"成功生成图片！角色: {character_name}, 表情: {1 + (self.value_1 // 16)}"
+    def send_pages(self, pages: list[bytes]) -> None:
+        """按顺序发送各页图片"""
+        for i, png_bytes in enumerate(pages):
+            if i:
+                time.sleep(self.KEY_DELAY)
+            with span("paste_send", bytes=len(png_bytes), page=i + 1):
+                self.send_png(png_bytes)
+
+    @traced("start")
+    def start(self) -> str:
+        """生成并发送图片，返回状态消息"""
+        started = time.perf_counter()
+        with span("whitelist"):
+            allowed = self._active_process_allowed()
+        if not allowed:
+            return "前台应用不在白名单内"
+        character_name = self.get_character()
+
+        with span("clipboard_cut"):
+            text = self.cut_all_and_get_text()
+        with span("clipboard_image"):
+            image = self.try_get_image()
+
+        if text == "" and image is None:
+            return "错误: 没有文本或图像"
+
+        try:
+            if image is None and self.PAGE_MIN_FONT_SIZE:
+                results = self.engine.generate_pages(self.session, character_name, text, self.PAGE_MIN_FONT_SIZE)
+            else:
+                result = self.engine.generate(self.session, character_name, text, image)
+                results = [result] if result is not None else None
+        except Exception as e:
+            return f"生成图像失败: {e}"
+
+        if not results:
+            return "生成图像失败！"
+        self.last_tiles = [result.tile for result in results]
+        self.send_pages([result.data for result in results])
+        self.engine.stats.end_to_end.add(time.perf_counter() - started)
+
+        pages = f", 共 {len(results)} 页" if len(results) > 1 else ""
+        return f"成功生成图片！角色: {character_name}, 表情: {split_value(self.session.last_value)[0]}{pages}"
+
+    @traced("reroll")
+    def reroll(self) -> str:
+        """换一张底图重绘上一条消息：复用已排版的内容图块，只重新合成与编码"""
+        if not self.last_tiles:
+            return "错误: 没有可重绘的消息"
+        if not self._active_process_allowed():
+            return "前台应用不在白名单内"
+        started = time.perf_counter()
+        character_name = self.get_character()
+
+        try:
+            results = self.engine.reroll_pages(self.session, character_name, self.last_tiles)
+        except Exception as e:
+            return f"生成图像失败: {e}"
+
+        self.send_pages([result.data for result in results])
+        self.engine.stats.end_to_end.add(time.perf_counter() - started)
+
+        return f"已换底图重绘！角色: {character_name}, 表情: {split_value(self.session.last_value)[0]}"
 
 
 class ManosabaTUI(App):
     """魔裁文本框生成器 TUI"""
 
-    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "textual.tcss"),
-              'r', encoding="utf-8") as f:
-        CSS = f.read()
-
-    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "keymap.yml"),
-              'r', encoding="utf-8") as f:
-        keymap = yaml.safe_load(f).get(PLATFORM, {})
+    # 样式表由 textual 在启动时读取；快捷键配置在类定义时就要用到，走解析缓存
+    CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "textual.tcss")
+    keymap = load_yaml(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "keymap.yml")
+                       ).get(PLATFORM, {})
 
     TITLE = "魔裁 文本框生成器"
     theme = "tokyo-night"
@@ -435,32 +382,62 @@ class ManosabaTUI(App):
     status_msg = reactive("就绪")
 
     BINDINGS = [
-        Binding(keymap['start_generate'], "generate", "生成图片", priority=True),
-        Binding(keymap['delete_cache'], "delete_cache", "清除缓存", priority=True),
-        Binding(keymap['quit'], "quit", "退出", priority=True),
-        Binding(keymap['pause'], "pause", "暂停", priority=True),
+        Binding(keymap['start_generate'], "generate", "生成图片", priority=True, id="start_generate"),
+        Binding(keymap['reroll'], "reroll", "换底图重绘", priority=True, id="reroll"),
+        Binding(keymap['delete_cache'], "delete_cache", "清除缓存", priority=True, id="delete_cache"),
+        Binding(keymap['quit'], "quit", "退出", priority=True, id="quit"),
+        Binding(keymap['pause'], "pause", "暂停", priority=True, id="pause"),
+        Binding(keymap['toggle_stats'], "toggle_stats", "统计", priority=True, id="toggle_stats"),
     ]
 
+    WATCHED_CONFIGS = ["chara_meta.yml", "text_configs.yml", "keymap.yml", "process_whitelist.yml", "cache.yml"]
+    CHANGE_NAMES = {
+        "added": "新增角色",
+        "removed": "删除角色",
+        "emotion_count": "表情数量",
+        "font": "字体",
+        "full_name": "角色全名",
+        "label": "角色名图层",
+    }
+
+    STATS_INTERVAL = 1.0  # 统计面板刷新间隔（秒）
+
     def __init__(self):
         super().__init__()
         self.active = True
         self.textbox = ManosabaTextBox()
         self.current_character = self.textbox.get_character()
         self.hotkey_listener = None
-        self.setup_global_hotkeys()
+        self.windows_hotkeys = []  # keyboard.add_hotkey 返回的句柄
+        self.config_watcher = None
 
     def setup_global_hotkeys(self) -> None:
         """设置全局热键监听器"""
         keymap = self.keymap
         if PLATFORM == "darwin":
+            from pynput.keyboard import GlobalHotKeys
+
             hotkeys = {
-                keymap['start_generate']: self.trigger_generate
+                keymap['start_generate']: self.trigger_generate,
+                keymap['reroll']: self.trigger_reroll,
             }
 
             self.hotkey_listener = GlobalHotKeys(hotkeys)
             self.hotkey_listener.start()
         elif PLATFORM.startswith('win'):
-            keyboard.add_hotkey(keymap['start_generate'], self.trigger_generate)
+            self.windows_hotkeys = [
+                keyboard.add_hotkey(keymap['start_generate'], self.trigger_generate),
+                keyboard.add_hotkey(keymap['reroll'], self.trigger_reroll),
+            ]
+
+    def stop_global_hotkeys(self) -> None:
+        """注销全局热键"""
+        if self.hotkey_listener:
+            self.hotkey_listener.stop()
+            self.hotkey_listener = None
+        for handle in self.windows_hotkeys:
+            keyboard.remove_hotkey(handle)
+        self.windows_hotkeys = []
 
     def trigger_generate(self) -> None:
         """全局热键触发生成图片（在后台线程中调用）"""
@@ -468,6 +445,11 @@ class ManosabaTUI(App):
         if self.active:
             self.call_from_thread(self.action_generate)
 
+    def trigger_reroll(self) -> None:
+        """全局热键触发换底图重绘（在后台线程中调用）"""
+        if self.active:
+            self.call_from_thread(self.action_reroll)
+
     def compose(self) -> ComposeResult:
         """创建UI布局"""
         yield Header()
@@ -507,15 +489,55 @@ class ManosabaTUI(App):
                 yield Label(self.status_msg, id="status_label")
                 yield ProgressBar(id="progress_bar")
 
+            yield Static(id="stats_panel")
+
         yield Footer()
 
     def on_mount(self) -> None:
         """应用启动时执行"""
+        # 界面显示后再注册全局热键（导入 pynput 较慢）
+        self.setup_global_hotkeys()
         self.update_status(f"当前角色: {self.textbox.get_character(self.current_character, full_name=True)} ")
 
         # 预加载当前角色（在后台线程中执行）
         char_name = self.textbox.get_character(self.current_character)
         self.load_character_images(char_name)
+        self.textbox.prefetch_next_base()
+        self.set_interval(self.STATS_INTERVAL, self.refresh_stats)
+
+        # 监视配置文件，修改后无需重启
+        self.config_watcher = ConfigWatcher(
+            self.textbox.CONFIG_PATH, self.WATCHED_CONFIGS,
+            lambda filename: self.call_from_thread(self.reload_config, filename),
+        )
+        self.config_watcher.start()
+
+    async def reload_config(self, filename: str) -> None:
+        """配置文件变化后重新加载，只刷新受影响的界面与缓存"""
+        try:
+            changes = self.textbox.reload_config(filename)
+        except Exception as e:
+            self.notify(str(e), title=f"重新加载 {filename} 失败，继续使用旧配置", severity="error")
+            return
+
+        if filename == "keymap.yml":
+            self.keymap = self.textbox.keymap
+            self.set_keymap({binding.id: self.keymap[binding.id]
+                             for binding in self.BINDINGS if binding.id in self.keymap})
+            self.stop_global_hotkeys()
+            self.setup_global_hotkeys()
+
+        previous = self.current_character
+        if changes.keys() & {"added", "removed", "full_name"}:
+            self.current_character = self.textbox.get_character()
+            await self.refresh_character_panel()
+        if previous in changes.get("emotion_count", set()) | changes.get("removed", set()):
+            self.refresh_emotion_panel()
+            self.load_character_images(self.current_character)
+
+        detail = "；".join(f"{self.CHANGE_NAMES[kind]}: {', '.join(sorted(characters))}"
+                          for kind, characters in changes.items())
+        self.update_status(f"已重新加载 {filename}" + (f"（{detail}）" if detail else ""))
 
     def load_character_images(self, char_name: str) -> None:
         """在后台线程中加载角色图片"""
@@ -605,7 +627,7 @@ class ManosabaTUI(App):
             self.current_character = selected_char
 
             # 更新角色索引
-            char_idx = self.textbox.character_list.index(selected_char) + 1
+            char_idx = self.textbox.mahoshojo.position(selected_char) + 1
             self.textbox.switch_character(char_idx)
 
             # 预加载新角色（使用带进度条的加载方法）
@@ -620,12 +642,25 @@ class ManosabaTUI(App):
                 label = event.pressed.label.plain
                 emotion_num = int(label.split()[-1])
                 self.current_emotion = emotion_num
-                self.textbox.emote = emotion_num
+                self.textbox.set_emotion(emotion_num)
                 self.update_status(f"已选择表情 {emotion_num} 喵")
             except (ValueError, AttributeError, IndexError) as e:
                 self.update_status(e)
                 pass
 
+    async def refresh_character_panel(self) -> None:
+        """角色增删或改名后重建角色列表"""
+        char_radio = self.query_one("#character_radio", RadioSet)
+        await char_radio.remove_children()
+        await char_radio.mount(*(
+            RadioButton(
+                f"{self.textbox.get_character(char_id, full_name=True)} ({char_id})",
+                value=char_id == self.current_character,
+                id=f"char_{char_id}"
+            )
+            for char_id in self.textbox.character_list
+        ))
+
     def refresh_emotion_panel(self) -> None:
         """刷新表情面板"""
         emotion_radio = self.query_one("#emotion_radio", RadioSet)
@@ -640,7 +675,7 @@ class ManosabaTUI(App):
 
         # 重置表情为 1
         self.current_emotion = 1
-        self.textbox.emote = 1
+        self.textbox.set_emotion(1)
 
         # 添加新的按钮
         emotion_cnt = self.textbox.get_current_emotion_count()
@@ -648,11 +683,58 @@ class ManosabaTUI(App):
             unique_id = f"emotion_{self.current_character}_{i}"
             btn = RadioButton(
                 f"表情 {i}",
-                value=(self.textbox.emote == i),
+                value=(self.textbox.session.emote == i),
                 id=unique_id
             )
             emotion_radio.mount(btn)
 
+    def refresh_stats(self) -> None:
+        """刷新统计面板（仅在面板可见时读取统计，不影响生成流程）"""
+        panel = self.query_one("#stats_panel", Static)
+        if not panel.has_class("visible"):
+            return
+        engine = self.textbox.engine
+        stats = engine.stats
+        report = engine.cache_report()
+
+        def latency(window) -> str:
+            p50, p95 = window.percentiles(0.50, 0.95)
+            return f"p50 {p50:.0f} ms · p95 {p95:.0f} ms（{len(window)} 次）"
+
+        def rate(value: float | None) -> str:
+            return "-" if value is None else f"{value:.0%}"
+
+        names = {"base_prefetch": "预取", "base_decode": "底图", "font": "字体",
+                 "layout": "排版", "text_tile": "文字图层", "shared": "共享"}
+        stages = " · ".join(f"{k} {v * 1000:.0f}" for k, v in stats.last_stages.items()) or "-"
+        memory = report["memory"]
+        disk = report["disk"]
+        if stats.warm_up_character:
+            warm_up = (f"{stats.warm_up_character} {stats.warm_up_images} 张 / {stats.warm_up_seconds:.1f} s"
+                       f"（{stats.warm_up_throughput:.1f} 张/秒）")
+        else:
+            warm_up = "-"
+
+        panel.update("\n".join([
+            f"端到端   {latency(stats.end_to_end)}",
+            f"渲染     {latency(stats.render)}",
+            f"上次阶段 {stages} ms",
+            "命中率   " + " · ".join(f"{names[k]} {rate(v)}" for k, v in report["hit_rates"].items()),
+            f"内存     图层 {format_bytes(memory['layers'])} · 底图 {format_bytes(memory['bases'])}"
+            f" · 图块 {format_bytes(memory['tiles'])}"
+            + (f" · 共享 {format_bytes(memory['shared'])}" if engine.shared_cache else ""),
+            f"磁盘     底图 {format_bytes(disk['bases'])}"
+            + (f" / {format_bytes(disk['bases_budget'])}" if disk['bases_budget'] else "")
+            + f" · 排版 {format_bytes(disk['layout'])}",
+            f"预热     {warm_up}",
+        ]))
+
+    def action_toggle_stats(self) -> None:
+        """显示/隐藏统计面板"""
+        panel = self.query_one("#stats_panel", Static)
+        panel.toggle_class("visible")
+        self.refresh_stats()
+
     def update_status(self, msg: str) -> None:
         """更新状态栏"""
         self.status_msg = msg
@@ -673,20 +755,37 @@ class ManosabaTUI(App):
         result = self.textbox.start()
         self.update_status(result)
 
+    def action_reroll(self) -> None:
+        """换底图重绘上一条消息"""
+        self.update_status("正在换底图重绘...")
+        result = self.textbox.reroll()
+        self.update_status(result)
+
     def action_delete_cache(self) -> None:
         """清除缓存"""
         self.update_status("正在清除缓存...")
-        self.textbox.delete(self.textbox.CACHE_PATH)
-        self.update_status("缓存已清除，需要重新加载角色")
+        self.textbox.delete()
+        # 立即重新生成当前角色的底图，其他角色在切换到时生成
+        self.load_character_images(self.current_character)
 
     def action_quit(self) -> None:
         """退出应用"""
-        # 停止全局热键监听器
-        if self.hotkey_listener:
-            self.hotkey_listener.stop()
+        # 停止全局热键监听器与配置监视
+        self.stop_global_hotkeys()
+        if self.config_watcher:
+            self.config_watcher.stop()
         self.exit()
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="魔裁文本框生成器 TUI")
+    parser.add_argument("--trace", metavar="FILE",
+                        help=f"记录各阶段耗时并在退出时写入 Chrome trace JSON（也可设置 {render_trace.ENV_VAR}）")
+    args = parser.parse_args()
+    if args.trace:
+        render_trace.enable(args.trace)
+
     app = ManosabaTUI()
     app.run()
@@ -0,0 +1,172 @@
+""" 底图磁盘缓存管理（assets/cache 下预先合成的底图）
+
+子命令：
+    report                    按角色统计底图数量与占用，以及排版缓存的占用
+    prune [--budget MB]       按最近使用时间淘汰底图，直到不超过预算（默认 config/cache.yml 中的值）
+    verify [--fix]            检查底图是否完整、是否与当前素材和角色配置一致；--fix 删除有问题的底图
+    warm 角色... | --all      预先合成指定角色缺少的底图
+
+用法：
+    python manage_cache.py report
+    python manage_cache.py prune --budget 128 --dry-run
+    python manage_cache.py verify --fix
+    python manage_cache.py warm sherri ema
+"""
+import argparse
+import os
+import sys
+
+from PIL import Image
+
+from base_cache_index import BASE_SUFFIX, source_signature
+from headless_render import BACKGROUND_COUNT
+from render_core import split_value
+from render_engine import RenderEngine
+from render_stats import format_bytes
+
+
+def cmd_report(engine: RenderEngine, args) -> int:
+    engine.base_index.sync()
+    usage = engine.base_index.usage_by_character()
+    print(f"{'角色':<10} {'底图':>10} {'占用':>12}")
+    for character in list(engine.character_list) + sorted(set(usage) - set(engine.character_list)):
+        count, size = usage.get(character, (0, 0))
+        expected = engine.emotion_count(character) * BACKGROUND_COUNT if character in engine.mahoshojo else 0
+        note = "" if character in engine.mahoshojo else "  (配置中已没有该角色)"
+        print(f"{character:<10} {f'{count}/{expected}':>10} {format_bytes(size):>12}{note}")
+    report = engine.cache_report()["disk"]
+    budget = engine.disk_budget
+    print(f"\n底图合计 {format_bytes(engine.base_index.total_bytes())}"
+          f"（预算 {format_bytes(budget) if budget else '不限制'}）")
+    print(f"排版缓存 {format_bytes(report['layout'])}")
+    return 0
+
+
+def cmd_prune(engine: RenderEngine, args) -> int:
+    budget = int(args.budget * 2**20) if args.budget is not None else engine.disk_budget
+    if not budget:
+        print("没有设置磁盘预算（config/cache.yml 的 disk_budget_mb 或 --budget）")
+        return 0
+    engine.base_index.sync()
+    before = engine.base_index.total_bytes()
+    if args.dry_run:
+        total, victims = before, []
+        for name, _, _, size, _, _ in engine.base_index.entries():
+            if total <= budget:
+                break
+            victims.append(name)
+            total -= size
+        print(f"将删除 {len(victims)} 张底图，{format_bytes(before)} -> {format_bytes(total)}")
+        for name in victims[:args.show]:
+            print(f"  {name}")
+        return 0
+    removed = engine.prune_disk_cache(budget)
+    print(f"删除 {len(removed)} 张底图，{format_bytes(before)} -> {format_bytes(engine.base_index.total_bytes())}")
+    return 0
+
+
+def check_entry(engine: RenderEngine, name: str, character: str, value: int, source: str,
+                expected_size: tuple[int, int]) -> str | None:
+    """返回底图的问题描述，没有问题时返回 None"""
+    path = engine.base_file(name)
+    if character not in engine.mahoshojo:
+        return "配置中已没有该角色"
+    if not 1 <= value <= engine.emotion_count(character) * BACKGROUND_COUNT:
+        return "编号超出当前表情数量"
+    emotion, background = split_value(value)
+    sources = engine.layer_paths(character, emotion, background)
+    if source:
+        if source != source_signature(sources):
+            return "素材已修改"
+    elif any(os.path.exists(p) and os.path.getmtime(p) > os.path.getmtime(path) for p in sources):
+        return "素材比底图新"
+    try:
+        with open(path, "rb") as fp:
+            fp.seek(-2, os.SEEK_END)
+            if fp.read(2) != b"\xff\xd9":
+                return "文件不完整"
+        with Image.open(path) as img:
+            if img.size != expected_size:
+                return f"尺寸 {img.size} 与素材不符"
+    except OSError as e:
+        return f"无法读取: {e}"
+    return None
+
+
+def cmd_verify(engine: RenderEngine, args) -> int:
+    added, removed = engine.base_index.sync()
+    if added or removed:
+        print(f"索引: 登记 {added} 个未记录的文件，移除 {removed} 个已不存在的条目")
+    with Image.open(engine.layer_paths(engine.character_list[0], 1, 1)[0]) as background:
+        expected_size = background.size  # 底图与背景同尺寸
+    problems = []
+    for name, character, value, _, source, _ in engine.base_index.entries():
+        problem = check_entry(engine, name, character, value, source, expected_size)
+        if problem:
+            problems.append((name, problem))
+            print(f"  {name}{BASE_SUFFIX}: {problem}")
+    if not problems:
+        print("全部底图正常")
+        return 0
+    if args.fix:
+        for name, _ in problems:
+            try:
+                os.remove(engine.base_file(name))
+            except FileNotFoundError:
+                pass
+        engine.base_index.forget([name for name, _ in problems])
+        print(f"已删除 {len(problems)} 张有问题的底图，用到时会重新合成")
+        return 0
+    print(f"{len(problems)} 张底图有问题，使用 --fix 删除")
+    return 1
+
+
+def cmd_warm(engine: RenderEngine, args) -> int:
+    characters = engine.character_list if args.all else args.characters
+    unknown = [c for c in characters if c not in engine.mahoshojo]
+    if unknown:
+        print(f"未知角色: {', '.join(unknown)}")
+        return 2
+    for character in characters:
+        missing = len(engine.missing_bases(character))
+
+        def progress(current: int, total: int) -> None:
+            print(f"\r{character}: {current}/{total}", end="", flush=True)
+
+        engine.generate_and_save_images(character, progress)
+        print(f"\r{character}: 补齐 {missing} 张" if missing else f"{character}: 已完整")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框底图缓存管理")
+    parser.add_argument("--base-path", default=None, help="项目根目录（含 config/ 与 assets/）")
+    parser.add_argument("--cache-path", default=None, help="缓存目录，默认 assets/cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("report", help="按角色统计缓存占用").set_defaults(func=cmd_report)
+
+    p_prune = sub.add_parser("prune", help="按最近使用时间淘汰到预算以内")
+    p_prune.add_argument("--budget", type=float, default=None, help="预算（MB），默认读取 config/cache.yml")
+    p_prune.add_argument("--dry-run", action="store_true", help="只列出将被删除的底图")
+    p_prune.add_argument("--show", type=int, default=20, help="--dry-run 时列出的数量")
+    p_prune.set_defaults(func=cmd_prune)
+
+    p_verify = sub.add_parser("verify", help="检查底图与素材、配置是否一致")
+    p_verify.add_argument("--fix", action="store_true", help="删除有问题的底图")
+    p_verify.set_defaults(func=cmd_verify)
+
+    p_warm = sub.add_parser("warm", help="预先合成角色底图")
+    p_warm.add_argument("characters", nargs="*", help="角色名（如 sherri）")
+    p_warm.add_argument("--all", action="store_true", help="全部角色")
+    p_warm.set_defaults(func=cmd_warm)
+
+    args = parser.parse_args(argv)
+    if args.command == "warm" and not (args.all or args.characters):
+        parser.error("warm 需要角色名或 --all")
+    engine = RenderEngine(args.base_path, cache_path=args.cache_path)
+    return args.func(engine, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
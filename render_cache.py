@@ -0,0 +1,31 @@
+# filename: render_cache.py
+import hashlib
+
+
+def make_render_key(*parts) -> str:
+    """
+    根据全部渲染输入计算缓存键。
+    bytes 直接参与哈希，其余对象使用 repr()。
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            h.update(part)
+        else:
+            h.update(repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def hash_files(paths: list[str]) -> str:
+    """计算若干文件内容的联合哈希，用作配置版本号"""
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, "rb") as fp:
+                h.update(fp.read())
+        except OSError:
+            h.update(b"<missing>")
+        h.update(b"\x00")
+    return h.hexdigest()
+
@@ -0,0 +1,133 @@
+# filename: render_core.py
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from PIL import Image
+
+from headless_render import BACKGROUND_COUNT, HeadlessRenderer
+from render_pipeline import RenderResult
+
+
+@dataclass(frozen=True, eq=False)
+class RenderRequest:
+    """一次渲染的全部输入：角色、表情、背景与内容（文本或图片）"""
+    character: str
+    emotion: int
+    background: int
+    text: str | None = None
+    image: Image.Image | None = None
+    fmt: str = "png"
+    max_bytes: int | None = None  # 输出字节预算，指定时 fmt 由预算决定
+
+    @property
+    def base_name(self) -> str:
+        """对应的底图名称，与缓存目录中的 "{角色} (编号)" 一致"""
+        return f"{self.character} ({make_value(self.emotion, self.background)})"
+
+
+def make_value(emotion: int, background: int) -> int:
+    """(表情, 背景) -> 底图编号（从 1 开始）"""
+    return (emotion - 1) * BACKGROUND_COUNT + background
+
+
+def split_value(value: int) -> tuple[int, int]:
+    """底图编号 -> (表情, 背景)"""
+    return (value - 1) // BACKGROUND_COUNT + 1, (value - 1) % BACKGROUND_COUNT + 1
+
+
+def pick_value(emotion_cnt: int, emote: int | None, last_value: int, rng=random) -> int:
+    """按规则抽取底图编号（不修改任何状态）：指定表情时只在该表情内抽取，否则不与上一张表情重复"""
+    total_images = BACKGROUND_COUNT * emotion_cnt
+
+    if emote:
+        return rng.randint((emote - 1) * BACKGROUND_COUNT + 1, emote * BACKGROUND_COUNT)
+
+    max_attempts = 100
+    attempts = 0
+    i = rng.randint(1, total_images)
+
+    while attempts < max_attempts:
+        i = rng.randint(1, total_images)
+        current_emotion = (i - 1) // BACKGROUND_COUNT
+
+        if last_value == -1:
+            return i
+
+        if current_emotion != (last_value - 1) // BACKGROUND_COUNT:
+            return i
+
+        attempts += 1
+
+    return i
+
+
+class SelectionSession:
+    """
+    一个用户（窗口、连接）的底图选择状态：上一张编号、一次性的表情指定与预先抽好的下一张。
+    渲染本身不读写这些状态；各方法在会话锁内完成“读取-抽取-更新”，可被多个线程共享。
+    """
+
+    def __init__(self, rng: random.Random | None = None, history_size: int = 64):
+        self.rng = rng or random.Random()
+        self.emote: int | None = None  # 下一张指定的表情（仅生效一次）
+        self.last_value = -1  # 上一张底图编号，-1 表示还没有
+        self.history: deque[tuple[str, int]] = deque(maxlen=history_size)  # 最近选过的 (角色, 编号)
+        self._next = None  # 预先抽好的下一张 ((角色, 表情, 上一张编号), 编号)
+        self._lock = threading.Lock()
+
+    def set_emotion(self, emotion: int | None) -> None:
+        """指定下一张使用的表情，None 表示随机"""
+        with self._lock:
+            self.emote = emotion
+
+    def peek_value(self, character: str, emotion_cnt: int) -> int:
+        """预先抽取下一张的编号但不提交；状态不变时 next_value 会采用这个结果"""
+        with self._lock:
+            state = (character, self.emote, self.last_value)
+            i = pick_value(emotion_cnt, self.emote, self.last_value, self.rng)
+            self._next = (state, i)
+            return i
+
+    def next_value(self, character: str, emotion_cnt: int) -> int:
+        """抽取并提交下一张的编号，同时清除一次性的表情指定"""
+        with self._lock:
+            state = (character, self.emote, self.last_value)
+            if self._next is not None and self._next[0] == state:
+                i = self._next[1]
+            else:
+                i = pick_value(emotion_cnt, self.emote, self.last_value, self.rng)
+            self._next = None
+            self.last_value = i
+            self.emote = None
+            self.history.append((character, i))
+            return i
+
+    def next_request(self, character: str, emotion_cnt: int, text: str | None = None,
+                     image: Image.Image | None = None, fmt: str = "png") -> RenderRequest:
+        """抽取下一张底图并生成渲染请求"""
+        emotion, background = split_value(self.next_value(character, emotion_cnt))
+        return RenderRequest(character, emotion, background, text=text, image=image, fmt=fmt)
+
+
+_default_renderer: HeadlessRenderer | None = None
+_default_lock = threading.Lock()
+
+
+def get_default_renderer() -> HeadlessRenderer:
+    """render() 默认使用的共享渲染器（缓存各自加锁，可跨线程共用）"""
+    global _default_renderer
+    with _default_lock:
+        if _default_renderer is None:
+            _default_renderer = HeadlessRenderer()
+        return _default_renderer
+
+
+def render(request: RenderRequest, renderer: HeadlessRenderer | None = None) -> RenderResult:
+    """
+    无状态渲染入口：输出只由 request 决定，不读取也不修改任何选择状态，可在多个线程中同时调用。
+    """
+    renderer = renderer or get_default_renderer()
+    return renderer.render(request.character, request.emotion, request.background,
+                           text=request.text, image=request.image, fmt=request.fmt, max_bytes=request.max_bytes)
@@ -0,0 +1,299 @@
+# filename: render_engine.py
+import os
+import time
+from dataclasses import dataclass
+
+from PIL import Image
+
+from base_cache_index import BaseCacheIndex, source_signature
+from base_prefetch import BasePrefetcher
+from headless_render import BACKGROUND_COUNT, BOX_RECT, HeadlessRenderer
+from layout_cache import LayoutCache
+from render_core import SelectionSession, split_value
+from render_stats import DiskUsage, RenderStats, estimate_bytes, hit_rate
+from render_trace import span
+from text_fit_draw import ContentTile, _load_font
+
+
+@dataclass
+class Generated:
+    """一次生成的结果：编码后的图片、内容图块（供换底图重绘）与底图名"""
+    data: bytes
+    tile: ContentTile
+    base_name: str
+
+
+class RenderEngine(HeadlessRenderer):
+    """
+    各前端（main.py / main_macOS.py / main_tui.py）共用的渲染引擎。
+    在 HeadlessRenderer（配置、图层缓存、字体与角色名图层、流水线）之上增加：
+    - 底图磁盘缓存: assets/cache 下预先合成的 "{角色} (编号).jpg"，按 config/cache.yml 的预算逐张淘汰
+    - 底图预取: 按会话预先抽取并在后台解码下一张底图
+    - 排版缓存（SQLite）
+    不缓存成品图片：每次生成都会抽取新的底图，相同内容几乎不会落在同一张底图上，
+    重复的内容由排版缓存与文字图层缓存复用，只需重新合成与编码。
+    前端只负责热键、剪贴板与界面，选择状态保存在各自的 SelectionSession 中。
+    """
+
+    def __init__(self, base_path: str | None = None, cache_path: str | None = None, layout_cache_size: int = 5000,
+                 disk_budget: int | None = None):
+        base_path = base_path or os.path.dirname(os.path.abspath(__file__))
+        self.CACHE_PATH = cache_path or os.path.join(base_path, "assets", "cache")
+        os.makedirs(self.CACHE_PATH, exist_ok=True)
+
+        # 排版缓存：跨重启复用字号搜索与换行结果
+        layout_cache = LayoutCache(os.path.join(self.CACHE_PATH, "layout.sqlite3"), max_entries=layout_cache_size)
+        super().__init__(base_path, layout_cache=layout_cache)
+
+        self.base_prefetcher = BasePrefetcher()  # 后台预解码下一张底图
+        # 底图磁盘缓存的索引与预算（字节，0 表示不限制；未指定时读取 config/cache.yml）
+        self.base_index = BaseCacheIndex(self.CACHE_PATH)
+        self.disk_budget = disk_budget if disk_budget is not None else self.configured_disk_budget()
+        self.stats = RenderStats()
+        self._disk_usage = DiskUsage()
+
+    @property
+    def layout_cache(self) -> LayoutCache:
+        return self.pipeline.layout_cache
+
+    def configured_disk_budget(self) -> int:
+        """config/cache.yml 中的底图磁盘预算（字节），文件不存在时不限制"""
+        return int(self.cache_settings().get("disk_budget_mb", 0) * 2**20)
+
+    def reload_config(self, filename: str) -> dict[str, set[str]]:
+        """
+        在 HeadlessRenderer.reload_config 的基础上，删除 emotion_count 变化（或被删除）的角色
+        预先合成的底图文件与解码结果，并丢弃预取的底图。
+        cache.yml 变化时只更新磁盘预算并按新预算淘汰。
+        """
+        if filename == "cache.yml":
+            self.disk_budget = self.configured_disk_budget()
+            self.prune_disk_cache()
+            return {}
+        changes = super().reload_config(filename)
+        stale = changes.get("emotion_count", set()) | changes.get("removed", set())
+        for character in stale:
+            self.delete_cache(character)
+        if stale:
+            prefixes = tuple(f"{character} (" for character in stale)
+            self.pipeline.base_cache.discard(
+                lambda key: isinstance(key[0], str) and os.path.basename(key[0]).startswith(prefixes))
+            self.base_prefetcher.cancel()
+        return changes
+
+    # --- 角色信息 ---
+    def full_name(self, character: str) -> str:
+        return self.mahoshojo[character]["full_name"]
+
+    def emotion_count(self, character: str) -> int:
+        return self.mahoshojo[character]["emotion_count"]
+
+    # --- 底图磁盘缓存 ---
+    def base_file(self, base_name: str) -> str:
+        return os.path.join(self.CACHE_PATH, base_name + ".jpg")
+
+    def missing_bases(self, character: str) -> list[int]:
+        """尚未预先合成（或已被淘汰）的底图编号"""
+        existing = set(os.listdir(self.CACHE_PATH))
+        return [value for value in range(1, self.emotion_count(character) * BACKGROUND_COUNT + 1)
+                if f"{character} ({value}).jpg" not in existing]
+
+    def generate_and_save_images(self, character: str, progress_callback=None) -> None:
+        """
+        预先合成并保存指定角色缺少的底图，已有的只刷新最近使用时间；
+        之后按磁盘预算淘汰其他角色最久未用的底图。
+        """
+        missing = self.missing_bases(character)
+        present = set(range(1, self.emotion_count(character) * BACKGROUND_COUNT + 1)) - set(missing)
+        self.base_index.touch([f"{character} ({value})" for value in present])
+
+        if missing:
+            started = time.perf_counter()
+            with span("warm_up", character=character, images=len(missing)):
+                for i, value in enumerate(missing, 1):
+                    emotion, background = split_value(value)
+                    base_name = f"{character} ({value})"
+                    with span("warm_up_compose", value=value):
+                        result = self.compose_base(character, emotion, background)
+                    with span("warm_up_save", value=value):
+                        result.convert("RGB").save(self.base_file(base_name))
+                    sources = self.layer_paths(character, emotion, background)
+                    self.base_index.record(base_name, source_signature(sources))
+                    if progress_callback:
+                        progress_callback(i, len(missing))
+            self.stats.record_warm_up(character, len(missing), time.perf_counter() - started)
+        self.prune_disk_cache(protect={character})
+
+    def prune_disk_cache(self, budget: int | None = None, protect: set[str] | frozenset = frozenset()) -> list[str]:
+        """按最近使用时间淘汰底图文件，直到不超过磁盘预算（0 表示不限制），返回被删除的底图名"""
+        budget = self.disk_budget if budget is None else budget
+        if not budget:
+            return []
+        removed = set(self.base_index.prune(budget, protect))
+        if removed:
+            self.pipeline.base_cache.discard(
+                lambda key: isinstance(key[0], str) and os.path.basename(key[0])[:-len(".jpg")] in removed)
+        return sorted(removed)
+
+    def delete_cache(self, character: str | None = None) -> None:
+        """删除预先合成的底图（指定 character 时只删除该角色的）"""
+        prefix = f"{character} (" if character else ""
+        removed = []
+        for filename in os.listdir(self.CACHE_PATH):
+            if filename.startswith(prefix) and filename.lower().endswith('.jpg'):
+                os.remove(os.path.join(self.CACHE_PATH, filename))
+                removed.append(filename[:-len(".jpg")])
+        self.base_index.forget(removed)
+
+    def load_base_image(self, character: str, value: int) -> Image.Image:
+        """读取缓存的底图；尚未预热（或文件未写完）时现场合成"""
+        with span("base_load", character=character, value=value):
+            base_name = f"{character} ({value})"
+            cache_file = self.base_file(base_name)
+            if os.path.exists(cache_file):
+                try:
+                    def decode():
+                        with Image.open(cache_file) as src:
+                            return src.convert("RGBA")
+                    st = os.stat(cache_file)
+                    image = self.shared(("file", cache_file, st.st_mtime_ns, st.st_size), decode)
+                    self.base_index.touch([base_name])
+                    return image
+                except OSError:
+                    pass
+            return self.compose_base(character, *split_value(value))
+
+    # --- 底图选择与预取 ---
+    def prefetch_next_base(self, session: SelectionSession, character: str) -> None:
+        """为会话预先抽取下一张底图，并在后台解码"""
+        value = session.peek_value(character, self.emotion_count(character))
+        self.base_prefetcher.submit(
+            f"{character} ({value})",
+            lambda: self.load_base_image(character, value),
+        )
+
+    def next_base(self, session: SelectionSession, character: str) -> tuple[str, Image.Image | str]:
+        """为会话抽取下一张底图，返回 (底图名, 预取好的图像或缓存文件路径)"""
+        value = session.next_value(character, self.emotion_count(character))
+        base_name = f"{character} ({value})"
+        with span("base_prefetch_take", base=base_name) as sp:
+            image = self.base_prefetcher.take(base_name)
+            sp.set(hit=image is not None)
+        if image is not None:
+            return base_name, image
+        cache_file = self.base_file(base_name)
+        if os.path.exists(cache_file):
+            self.base_index.touch([base_name])
+            return base_name, cache_file
+        return base_name, self.compose_base(character, *split_value(value))
+
+    # --- 渲染 ---
+    def text_pages(self, character: str, text: str, min_font_size: int) -> list[ContentTile]:
+        """排版文字，字号需要小于 min_font_size 才能放下时分成多页图块"""
+        return self.pipeline.text_pages(
+            text, BOX_RECT[0], BOX_RECT[1], min_font_size,
+            align="left",
+            valign="top",
+            color=(255, 255, 255),
+            max_font_height=145,
+            font_path=self.font_path(character),
+            bracket_color=self.bracket_color(character),
+        )
+
+    def compose_tile(self, base: str | Image.Image, tile: ContentTile, character: str) -> bytes:
+        """把内容图块合成到底图上（文字输出会压缩，图片输出保持原尺寸）"""
+        result = self.pipeline.compose(
+            image_source=base,
+            tile=tile,
+            image_overlay=None,
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            compress=tile.kind == "text",
+        )
+        self.stats.last_stages = result.timings
+        return result.data
+
+    def generate(self, session: SelectionSession, character: str, text: str | None,
+                 image: Image.Image | None) -> Generated | None:
+        """
+        抽取底图并生成图片（文字的排版与图层有缓存，只需合成到新底图上并编码）。
+        没有文本或图像时返回 None；生成后为会话预取下一张底图。
+        """
+        if not text and image is None:
+            return None
+        started = time.perf_counter()
+        base_name, base = self.next_base(session, character)
+
+        tile = self.content_tile(character, text, image)
+        data = self.compose_tile(base, tile, character)
+        self.stats.render.add(time.perf_counter() - started)
+        self.prefetch_next_base(session, character)
+        return Generated(data, tile, base_name)
+
+    def generate_pages(self, session: SelectionSession, character: str, text: str,
+                       min_font_size: int) -> list[Generated] | None:
+        """
+        文字过长时按 min_font_size 分页：只抽取一张底图，各页都绘制在它上面，按页序返回。
+        能放下时只有一页，与 generate 相同。没有文本时返回 None。
+        """
+        if not text:
+            return None
+        tiles = self.text_pages(character, text, min_font_size)
+        if len(tiles) == 1:
+            return [self.generate(session, character, text, None)]
+        return self.reroll_pages(session, character, tiles)
+
+    def reroll_pages(self, session: SelectionSession, character: str, tiles: list[ContentTile]) -> list[Generated]:
+        """抽取一张底图，把各页图块（并行）合成到上面"""
+        started = time.perf_counter()
+        base_name, base = self.next_base(session, character)
+        results = self.pipeline.compose_pages(
+            base, tiles,
+            role_name=character,
+            text_configs_dict=self.text_configs_dict,
+            compress=tiles[0].kind == "text",
+        )
+        self.stats.last_stages = results[-1].timings
+        self.stats.render.add(time.perf_counter() - started)
+        self.prefetch_next_base(session, character)
+        return [Generated(result.data, tile, base_name) for result, tile in zip(results, tiles)]
+
+    def reroll(self, session: SelectionSession, character: str, tile: ContentTile) -> Generated:
+        """换一张底图重绘：复用已排版的内容图块，只重新合成与编码"""
+        started = time.perf_counter()
+        base_name, base = self.next_base(session, character)
+        data = self.compose_tile(base, tile, character)
+        self.stats.render.add(time.perf_counter() - started)
+        self.prefetch_next_base(session, character)
+        return Generated(data, tile, base_name)
+
+    # --- 统计 ---
+    def cache_report(self) -> dict:
+        """各缓存的命中率（None 表示尚无访问）、内存与磁盘占用（字节）"""
+        pipeline = self.pipeline
+        font_info = _load_font.cache_info()
+        rates = {
+            "base_prefetch": hit_rate(self.base_prefetcher.hits, self.base_prefetcher.misses),
+            "base_decode": hit_rate(pipeline.base_cache.hits + self.base_cache.hits,
+                                    pipeline.base_cache.misses + self.base_cache.misses),
+            "font": hit_rate(font_info.hits, font_info.misses),
+            "layout": hit_rate(self.layout_cache.hits, self.layout_cache.misses),
+            "text_tile": hit_rate(pipeline.tile_cache.hits, pipeline.tile_cache.misses),
+        }
+        if self.shared_cache is not None:
+            rates["shared"] = hit_rate(self.shared_cache.hits, self.shared_cache.misses)
+        memory = {
+            "layers": sum(estimate_bytes(v) for v in self.layer_cache.values()),
+            "bases": sum(estimate_bytes(v) for v in self.base_cache.values())
+                     + sum(estimate_bytes(v) for v in pipeline.base_cache.values()),
+            "tiles": sum(estimate_bytes(v) for v in pipeline.tile_cache.values())
+                     + sum(estimate_bytes(v) for v in pipeline.label_cache.values()),
+            "shared": self.shared_cache.used_bytes() if self.shared_cache else 0,
+        }
+        layout_db = self.layout_cache.db_path
+        disk = {
+            "bases": self._disk_usage.size(self.CACHE_PATH, (".jpg",)),
+            "bases_budget": self.disk_budget,
+            "layout": sum(self._disk_usage.size(p) for p in (layout_db, layout_db + "-wal")),
+        }
+        return {"hit_rates": rates, "memory": memory, "disk": disk}
@@ -0,0 +1,847 @@
+# filename: render_pipeline.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Tuple, Union
+
+from PIL import Image
+
+from animation import (
+    ANIMATION_FORMATS, MAX_SOURCE_FRAMES, SHADOW_OFFSET, TYPEWRITER_FPS, TYPEWRITER_HOLD, TYPEWRITER_MAX_DURATION,
+    encode_animation, patched_frames, source_frames, split_glyphs, typewriter_frames,
+)
+from text_fit_draw import (
+    Align, VAlign, IMAGE_SETTINGS, ContentTile, bracket_state, cached_layout, compress_image, draw_lines_tile,
+    paginate_text, paste_tile, render_label_tile, render_text_tile, segment_ops,
+)
+from image_fit_paste import fit_image_tile
+from render_cache import make_render_key
+from render_trace import span
+from size_budget import ByteBudgetEncoder
+
+
+@dataclass
+class RenderResult:
+    """一次渲染的输出：编码后的字节、内容图块、输出尺寸、各阶段耗时（秒）与格式"""
+    data: bytes
+    tile: ContentTile
+    size: Tuple[int, int]
+    timings: dict[str, float] = field(default_factory=dict)
+    fmt: str = "png"  # 实际的输出格式（指定字节预算时可能是 webp 或 jpeg）
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    一种输出尺寸：先按 scale 缩放，再限制在 max_width × max_height 以内（规则与 compress_image 相同）。
+    fmt / max_bytes 与 RenderPipeline.compose 的同名参数相同。
+    """
+    name: str
+    scale: float = 1.0
+    max_width: int | None = None
+    max_height: int | None = None
+    fmt: str = "png"
+    max_bytes: int | None = None
+
+    def target_size(self, size: Tuple[int, int]) -> Tuple[int, int]:
+        """原尺寸为 size 时的输出尺寸（不会超过原尺寸）"""
+        width, height = size
+        new_width, new_height = int(width * self.scale), int(height * self.scale)
+        if self.max_width and new_width > self.max_width:
+            ratio = self.max_width / new_width
+            new_width, new_height = self.max_width, int(new_height * ratio)
+        if self.max_height and new_height > self.max_height:
+            ratio = self.max_height / new_height
+            new_height, new_width = self.max_height, int(new_width * ratio)
+        return max(1, min(width, new_width)), max(1, min(height, new_height))
+
+
+PROFILES = {
+    "original": OutputProfile("original"),  # 合成结果原尺寸（图片模式的默认输出）
+    "full": OutputProfile("full", IMAGE_SETTINGS["resize_ratio"],  # 与 compress_image 相同（文字模式的默认输出）
+                          IMAGE_SETTINGS["max_width"], IMAGE_SETTINGS["max_height"]),
+    "2x": OutputProfile("2x", IMAGE_SETTINGS["resize_ratio"] * 2,
+                        IMAGE_SETTINGS["max_width"] * 2, IMAGE_SETTINGS["max_height"] * 2),
+    "thumb": OutputProfile("thumb", IMAGE_SETTINGS["resize_ratio"], 360, 240, fmt="webp"),  # 预览与历史列表
+}
+
+
+class LRUCache:
+    """
+    线程安全的小型 LRU 字典（每个缓存一把锁）。
+    get_or_create 对同一个键只会执行一次 factory，并发请求同一键时其余线程等待结果。
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """命中则返回缓存值，否则调用 factory() 生成并写入（factory 返回 None 时不缓存）"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = threading.Event()
+
+        if not owner:
+            pending.wait()
+            with self._lock:
+                value = self._items.get(key)
+            # 生成方失败或结果已被淘汰时自行生成
+            return value if value is not None else factory()
+
+        try:
+            value = factory()
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set()
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def discard(self, predicate) -> int:
+        """删除 predicate(key) 为真的全部条目（配置变化时定向失效），返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+        return len(keys)
+
+    def values(self) -> list:
+        """当前缓存值的快照（用于统计）"""
+        with self._lock:
+            return list(self._items.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class RenderPipeline:
+    """
+    文本框合成流水线，文字模式与图片模式共用：
+        base -> content -> overlay -> labels -> resize -> encode
+    - base: 解码底图（按路径和修改时间缓存，指定 shared_cache 时解码结果在进程间共享）
+    - content: 文字排版图层或缩放后的图片（文字图层按参数缓存）
+    - overlay: 置顶图层（按路径缓存）
+    - labels: 角色名文字图层（按角色与配置缓存）
+    - resize / encode: 压缩尺寸并编码为 PNG（或 WebP）；指定 max_bytes 时在字节预算内选择格式、质量与缩放
+    每次渲染都会记录各阶段耗时，见 RenderResult.timings 与 last_timings。
+    文字放不下时可按最小字号分页（render_text_pages），各页的绘制与合成在线程池中并行执行。
+    render_typewriter 输出文字逐字出现的动画，render_animated_image 把动图逐帧放入文本框，静态部分都只合成一次。
+    compose_strip 把多条消息纵向拼成一张长图（对话截图），只编码一次。
+    """
+
+    STAGES = ("base", "content", "overlay", "labels", "resize", "encode")
+
+    def __init__(self, layout_cache=None, base_cache_size: int = 4, tile_cache_size: int = 32,
+                 label_cache_size: int = 32, shared_cache=None):
+        self.layout_cache = layout_cache
+        self.shared_cache = shared_cache
+        self.base_cache = LRUCache(base_cache_size)
+        self.tile_cache = LRUCache(tile_cache_size)
+        self.label_cache = LRUCache(label_cache_size)
+        self.last_timings: dict[str, float] = {}
+        self.budget_encoder = ByteBudgetEncoder()
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """分页并行绘制与合成用的线程池（第一次分页时创建）"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                thread_name_prefix="render-page")
+            return self._pool
+
+    # --- base ---
+    def load_base(self, image_source: Union[str, Image.Image]) -> Image.Image:
+        """返回底图的可写副本；路径来源的解码结果会被缓存"""
+        if isinstance(image_source, Image.Image):
+            return image_source.copy()
+        def decode():
+            with Image.open(image_source) as src:
+                return src.convert("RGBA")
+        key = (image_source, os.path.getmtime(image_source))
+        if self.shared_cache is not None:
+            st = os.stat(image_source)
+            shared_key = ("file", image_source, st.st_mtime_ns, st.st_size)
+            return self.base_cache.get_or_create(
+                key, lambda: self.shared_cache.get_or_create(shared_key, decode)).copy()
+        return self.base_cache.get_or_create(key, decode).copy()
+
+    def load_overlay(self, image_overlay: Union[str, Image.Image, None]) -> Image.Image | None:
+        """置顶图层；文件不存在时返回 None"""
+        if image_overlay is None or isinstance(image_overlay, Image.Image):
+            return image_overlay
+        if not os.path.isfile(image_overlay):
+            return None
+        def decode():
+            with Image.open(image_overlay) as src:
+                return src.convert("RGBA")
+        key = ("overlay", image_overlay, os.path.getmtime(image_overlay))
+        return self.base_cache.get_or_create(key, decode)
+
+    # --- content ---
+    def text_tile(
+        self,
+        text: str,
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        color: Tuple[int, int, int] = (0, 0, 0),
+        max_font_height: int | None = None,
+        font_path: str | None = None,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        line_spacing: float = 0.15,
+        bracket_color: Tuple[int, int, int] | None = None,
+        layout_cache=None,
+    ) -> ContentTile:
+        """排版并绘制文字图层，相同参数直接复用已绘制的图层"""
+        font_mtime = os.path.getmtime(font_path) if font_path and os.path.exists(font_path) else None
+        key = make_render_key(text, top_left, bottom_right, color, max_font_height, font_path, font_mtime,
+                              align, valign, line_spacing, bracket_color)
+        with span("text_tile", chars=len(text)):
+            return self.tile_cache.get_or_create(key, lambda: render_text_tile(
+                text, top_left, bottom_right,
+                color=color,
+                max_font_height=max_font_height,
+                font_path=font_path,
+                align=align,
+                valign=valign,
+                line_spacing=line_spacing,
+                bracket_color=bracket_color,
+                layout_cache=layout_cache if layout_cache is not None else self.layout_cache,
+            ))
+
+    def text_pages(
+        self,
+        text: str,
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        min_font_size: int,
+        color: Tuple[int, int, int] = (0, 0, 0),
+        max_font_height: int | None = None,
+        font_path: str | None = None,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        line_spacing: float = 0.15,
+        bracket_color: Tuple[int, int, int] | None = None,
+        layout_cache=None,
+    ) -> list[ContentTile]:
+        """
+        各页的文字图层。整段文字按 min_font_size 只换行一次，放不下时按行切分成多页并行绘制；
+        能放下时只有一页（即 text_tile 的结果，字号照常搜索）。结果按参数缓存。
+        """
+        layout_args = dict(color=color, max_font_height=max_font_height, font_path=font_path, align=align,
+                           valign=valign, line_spacing=line_spacing, bracket_color=bracket_color)
+        font_mtime = os.path.getmtime(font_path) if font_path and os.path.exists(font_path) else None
+        key = make_render_key("pages", min_font_size, text, top_left, bottom_right, font_mtime, *layout_args.values())
+
+        font_size = min(min_font_size, max_font_height) if max_font_height else min_font_size
+
+        def build() -> list[ContentTile]:
+            region_w, region_h = bottom_right[0] - top_left[0], bottom_right[1] - top_left[1]
+            with span("paginate", chars=len(text)) as sp:
+                paged = paginate_text(text, font_path, region_w, region_h, font_size, line_spacing)
+                sp.set(pages=len(paged[1]) if paged else 1)
+            if paged is None:
+                return [self.text_tile(text, top_left, bottom_right, layout_cache=layout_cache, **layout_args)]
+            line_h, pages = paged
+            states = [False]
+            for page in pages[:-1]:
+                states.append(bracket_state(page, states[-1]))
+            return list(self.pool.map(
+                lambda page, in_bracket: draw_lines_tile(
+                    page, font_size, line_h, line_h * len(page), top_left, bottom_right,
+                    color=color, font_path=font_path, align=align, valign=valign,
+                    bracket_color=bracket_color, in_bracket=in_bracket,
+                ),
+                pages, states,
+            ))
+
+        with span("text_pages", chars=len(text)):
+            return self.tile_cache.get_or_create(key, build)
+
+    # --- labels ---
+    def label_tile(self, role_name: str, text_configs_dict: dict | None) -> ContentTile | None:
+        """角色名文字图层，配置不变时只绘制一次"""
+        if not (text_configs_dict and role_name in text_configs_dict):
+            return None
+        key = (role_name, repr(text_configs_dict[role_name]))
+        return self.label_cache.get_or_create(key, lambda: render_label_tile(role_name, text_configs_dict))
+
+    # --- resize / encode ---
+    @staticmethod
+    def encode(img: Image.Image, fmt: str = "png") -> bytes:
+        """编码输出图片，fmt 为 png 或 webp"""
+        buf = BytesIO()
+        if fmt.lower() == "webp":
+            img.save(buf, format="WEBP", quality=IMAGE_SETTINGS["quality"], method=4)
+        else:
+            img.save(buf, format=fmt)
+        return buf.getvalue()
+
+    def composite(
+        self,
+        image_source: Union[str, Image.Image],
+        tile: ContentTile | None,
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        timings: dict[str, float] | None = None,
+    ) -> Image.Image:
+        """
+        base / content / overlay / labels 阶段：返回原尺寸的合成结果，各阶段耗时写入 timings。
+        tile 为 None 时只合成静态部分（动画的各帧再补画内容）
+        """
+        timings = timings if timings is not None else {}
+
+        t = time.perf_counter()
+        with span("base_decode", source=image_source if isinstance(image_source, str) else "image"):
+            img = self.load_base(image_source)
+        timings["base"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if tile is not None:
+            with span("paste_content", kind=tile.kind):
+                paste_tile(img, tile)
+        timings["content"] = timings.get("content", 0.0) + time.perf_counter() - t
+
+        # 覆盖置顶图层（如果有）
+        t = time.perf_counter()
+        if image_overlay is not None:
+            with span("overlay"):
+                img_overlay = self.load_overlay(image_overlay)
+                if img_overlay is not None:
+                    img.paste(img_overlay, (0, 0), img_overlay)
+                else:
+                    print("Warning: overlay image is not exist.")
+        timings["overlay"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with span("labels", role=role_name):
+            labels = self.label_tile(role_name, text_configs_dict)
+            if labels is not None:
+                paste_tile(img, labels)
+        timings["labels"] = time.perf_counter() - t
+        return img
+
+    def encode_output(self, img: Image.Image, fmt: str = "png", max_bytes: int | None = None,
+                      budget_key=None) -> tuple[bytes, str]:
+        """encode 阶段：指定 max_bytes 时在字节预算内选择编码设置，返回 (字节, 格式)"""
+        with span("encode", fmt=fmt, size=img.size, max_bytes=max_bytes) as sp:
+            if max_bytes:
+                data, fmt = self.budget_encoder.encode(img, max_bytes, key=(budget_key, img.size, max_bytes))
+                sp.set(chosen=fmt, bytes=len(data))
+            else:
+                data = self.encode(img, fmt)
+        return data, fmt.lower()
+
+    def compose(
+        self,
+        image_source: Union[str, Image.Image],
+        tile: ContentTile,
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        compress: bool = True,
+        timings: dict[str, float] | None = None,
+        fmt: str = "png",
+        max_bytes: int | None = None,
+        budget_key=None,
+    ) -> RenderResult:
+        """
+        执行 base 之后的全部阶段：把内容图块合成到底图上，
+        再叠加置顶图层与角色名文字，压缩并编码。
+        同一图块可对不同底图重复调用（换底图重绘时只需合成与编码）。
+        指定 max_bytes 时忽略 fmt，在预算内选择画质损失最小的编码设置，
+        选中的设置按 budget_key（例如角色与背景）缓存，下次直接使用。
+        """
+        result = self._compose(image_source, tile, image_overlay, role_name, text_configs_dict,
+                               compress, timings, fmt, max_bytes, budget_key)
+        self.last_timings = result.timings
+        return result
+
+    def _compose(self, image_source, tile, image_overlay, role_name, text_configs_dict,
+                 compress, timings, fmt, max_bytes, budget_key) -> RenderResult:
+        """compose 的各阶段，不写 last_timings（分页时在线程池中并行调用）"""
+        timings = dict(timings or {})
+        img = self.composite(image_source, tile, image_overlay, role_name, text_configs_dict, timings)
+
+        t = time.perf_counter()
+        if compress:
+            with span("resize"):
+                img = compress_image(img)
+        timings["resize"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        data, fmt = self.encode_output(img, fmt, max_bytes, budget_key)
+        timings["encode"] = time.perf_counter() - t
+        return RenderResult(data, tile, img.size, timings, fmt)
+
+    def compose_profiles(
+        self,
+        image_source: Union[str, Image.Image],
+        tile: ContentTile,
+        profiles: list["OutputProfile | str"],
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        timings: dict[str, float] | None = None,
+        budget_key=None,
+    ) -> dict[str, RenderResult]:
+        """
+        同一图块只合成一次，输出多种尺寸（profiles 为 OutputProfile 或 PROFILES 中的名称），返回 {名称: 结果}。
+        按目标尺寸从大到小处理，每种尺寸从已经缩好的图中选最小的、至少为目标三倍大的一张来缩小
+        （没有时用原尺寸的合成结果），缩略图不必从原图缩起，而 full 等接近原尺寸的输出与 compose 的结果一致。
+        """
+        profiles = [PROFILES[p] if isinstance(p, str) else p for p in profiles]
+        timings = dict(timings or {})
+        full = self.composite(image_source, tile, image_overlay, role_name, text_configs_dict, timings)
+        targets = sorted(((p.target_size(full.size), p) for p in profiles),
+                         key=lambda item: item[0][0] * item[0][1], reverse=True)
+        scaled: list[Image.Image] = []
+        results = {}
+        for size, profile in targets:
+            profile_timings = dict(timings)
+            t = time.perf_counter()
+            if size == full.size:
+                img = full
+            else:
+                sources = [im for im in scaled if im.width >= 3 * size[0] and im.height >= 3 * size[1]]
+                source = min(sources, key=lambda im: im.width) if sources else full
+                with span("resize", profile=profile.name, source=source.size):
+                    img = source.resize(size, Image.Resampling.LANCZOS)
+                scaled.append(img)
+            profile_timings["resize"] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            data, fmt = self.encode_output(img, profile.fmt, profile.max_bytes, budget_key)
+            profile_timings["encode"] = time.perf_counter() - t
+            results[profile.name] = RenderResult(data, tile, img.size, profile_timings, fmt)
+        return {p.name: results[p.name] for p in profiles}
+
+    def compose_strip(
+        self,
+        panels: list[tuple[Union[str, Image.Image], ContentTile, str]],
+        profile: "OutputProfile | str" = "full",
+        image_overlay: Union[str, Image.Image, None] = None,
+        text_configs_dict: dict = None,
+        budget_key=None,
+    ) -> RenderResult:
+        """
+        多条消息纵向拼成一张图。panels 为 [(底图, 内容图块, 角色名)]，按顺序从上到下排列。
+        各条消息并行合成并直接缩放到 profile 的尺寸（profile 作用于每一条，例如 thumb 得到缩小的长图），
+        贴到同一张画布上后只按 profile 的 fmt / max_bytes 编码一次。
+        RenderResult.tile 为第一条消息的内容图块。
+        """
+        if not panels:
+            raise ValueError("没有消息")
+        profile = PROFILES[profile] if isinstance(profile, str) else profile
+        timings: dict[str, float] = {}
+
+        def panel(item) -> tuple[Image.Image, dict[str, float]]:
+            image_source, tile, role_name = item
+            panel_timings: dict[str, float] = {}
+            img = self.composite(image_source, tile, image_overlay, role_name, text_configs_dict, panel_timings)
+            t = time.perf_counter()
+            size = profile.target_size(img.size)
+            if size != img.size:
+                img = img.resize(size, Image.Resampling.LANCZOS)
+            panel_timings["resize"] = time.perf_counter() - t
+            return img, panel_timings
+
+        with span("strip", panels=len(panels), profile=profile.name):
+            rendered = list(self.pool.map(panel, panels))
+            for _, panel_timings in rendered:
+                for stage, seconds in panel_timings.items():
+                    timings[stage] = timings.get(stage, 0.0) + seconds
+            t = time.perf_counter()
+            width = max(img.width for img, _ in rendered)
+            strip = Image.new("RGBA", (width, sum(img.height for img, _ in rendered)), (0, 0, 0, 255))
+            y = 0
+            for img, _ in rendered:
+                strip.paste(img, ((width - img.width) // 2, y))
+                y += img.height
+            timings["stack"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        data, fmt = self.encode_output(strip, profile.fmt, profile.max_bytes, budget_key)
+        timings["encode"] = time.perf_counter() - t
+        self.last_timings = timings
+        return RenderResult(data, panels[0][1], strip.size, timings, fmt)
+
+    def compose_pages(
+        self,
+        image_source: Union[str, Image.Image],
+        tiles: list[ContentTile],
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        compress: bool = True,
+        fmt: str = "png",
+    ) -> list[RenderResult]:
+        """
+        把各页图块分别合成到同一张底图上（并行），按页序返回。
+        各页的耗时记录在各自的 RenderResult.timings 中，last_timings 为各页之和（线程池结束后写入）。
+        """
+        if len(tiles) == 1:
+            return [self.compose(image_source, tiles[0], image_overlay, role_name, text_configs_dict,
+                                 compress=compress, fmt=fmt)]
+        if isinstance(image_source, str):
+            image_source = self.load_base(image_source)  # 只解码一次，各页各自复制
+        results = list(self.pool.map(
+            lambda tile: self._compose(image_source, tile, image_overlay, role_name, text_configs_dict,
+                                       compress, None, fmt, None, None),
+            tiles,
+        ))
+        timings: dict[str, float] = {}
+        for result in results:
+            for stage, seconds in result.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        self.last_timings = timings
+        return results
+
+    # --- 入口 ---
+    def render_text(
+        self,
+        image_source: Union[str, Image.Image],
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        text: str,
+        color: Tuple[int, int, int] = (0, 0, 0),
+        max_font_height: int | None = None,
+        font_path: str | None = None,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        line_spacing: float = 0.15,
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        layout_cache=None,
+        fmt: str = "png",
+        max_bytes: int | None = None,
+        budget_key=None,
+    ) -> RenderResult:
+        """文字模式：中括号及括号内文字使用角色名首字的颜色，输出会压缩尺寸"""
+        bracket_color = None
+        if text_configs_dict and role_name in text_configs_dict:
+            bracket_color = tuple(text_configs_dict[role_name][0]["font_color"])
+
+        t = time.perf_counter()
+        tile = self.text_tile(
+            text, top_left, bottom_right,
+            color=color,
+            max_font_height=max_font_height,
+            font_path=font_path,
+            align=align,
+            valign=valign,
+            line_spacing=line_spacing,
+            bracket_color=bracket_color,
+            layout_cache=layout_cache,
+        )
+        timings = {"content": time.perf_counter() - t}
+        return self.compose(image_source, tile, image_overlay, role_name, text_configs_dict,
+                            compress=True, timings=timings, fmt=fmt, max_bytes=max_bytes, budget_key=budget_key)
+
+    def render_text_pages(
+        self,
+        image_source: Union[str, Image.Image],
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        text: str,
+        min_font_size: int,
+        color: Tuple[int, int, int] = (0, 0, 0),
+        max_font_height: int | None = None,
+        font_path: str | None = None,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        line_spacing: float = 0.15,
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        layout_cache=None,
+        fmt: str = "png",
+    ) -> list[RenderResult]:
+        """分页的文字模式：字号小于 min_font_size 才能放下时分成多页，各页使用同一张底图"""
+        bracket_color = None
+        if text_configs_dict and role_name in text_configs_dict:
+            bracket_color = tuple(text_configs_dict[role_name][0]["font_color"])
+        tiles = self.text_pages(
+            text, top_left, bottom_right, min_font_size,
+            color=color,
+            max_font_height=max_font_height,
+            font_path=font_path,
+            align=align,
+            valign=valign,
+            line_spacing=line_spacing,
+            bracket_color=bracket_color,
+            layout_cache=layout_cache,
+        )
+        return self.compose_pages(image_source, tiles, image_overlay, role_name, text_configs_dict,
+                                  compress=True, fmt=fmt)
+
+    def render_typewriter(
+        self,
+        image_source: Union[str, Image.Image],
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        text: str,
+        color: Tuple[int, int, int] = (0, 0, 0),
+        max_font_height: int | None = None,
+        font_path: str | None = None,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        line_spacing: float = 0.15,
+        image_overlay: Union[str, Image.Image, None] = None,
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        layout_cache=None,
+        profile: "OutputProfile | str" = "full",
+        fmt: str = "gif",
+        fps: float = TYPEWRITER_FPS,
+        max_duration: float = TYPEWRITER_MAX_DURATION,
+        hold: float = TYPEWRITER_HOLD,
+    ) -> RenderResult:
+        """
+        打字机动画：排版与 render_text 相同，文字逐字出现，fmt 为 gif / apng / webp。
+        静态部分（底图、置顶图层、角色名）只合成一次并直接缩放到 profile 的尺寸，
+        各帧在上一帧上补画新出现的字（字号与坐标按输出尺寸换算），不再逐帧合成与缩放整张图。
+        RenderResult.tile 为整段文字的图块（与 render_text 相同），可用于输出静态图。
+        """
+        check_animation_format(fmt)
+        profile = PROFILES[profile] if isinstance(profile, str) else profile
+        bracket_color = None
+        if text_configs_dict and role_name in text_configs_dict:
+            bracket_color = tuple(text_configs_dict[role_name][0]["font_color"])
+        layout_cache = layout_cache if layout_cache is not None else self.layout_cache
+
+        t = time.perf_counter()
+        font_size, lines, line_h, block_h = cached_layout(
+            text, font_path, bottom_right[0] - top_left[0], bottom_right[1] - top_left[1],
+            max_font_height, line_spacing, layout_cache)
+        ops = segment_ops(lines, font_size, line_h, block_h, top_left, bottom_right, color=color,
+                          font_path=font_path, align=align, valign=valign, bracket_color=bracket_color)
+        tile = self.text_tile(text, top_left, bottom_right, color=color, max_font_height=max_font_height,
+                              font_path=font_path, align=align, valign=valign, line_spacing=line_spacing,
+                              bracket_color=bracket_color, layout_cache=layout_cache)
+        timings = {"content": time.perf_counter() - t}
+        static = self.composite(image_source, None, image_overlay, role_name, text_configs_dict, timings)
+
+        t = time.perf_counter()
+        full_size = static.size
+        size = profile.target_size(full_size)
+        if size != full_size:
+            with span("resize", profile=profile.name):
+                static = static.resize(size, Image.Resampling.LANCZOS)
+        timings["resize"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        scale = (size[0] / full_size[0], size[1] / full_size[1])
+        with span("typewriter", chars=len(text), fps=fps) as sp:
+            glyphs, font = split_glyphs(ops, font_path, font_size, scale)
+            frames, durations = typewriter_frames(
+                static, glyphs, font, shadow_offset=max(1, round(SHADOW_OFFSET * min(scale))),
+                fps=fps, max_duration=max_duration, hold=hold, palette=fmt.lower() == "gif")
+            sp.set(glyphs=len(glyphs), frames=len(frames))
+        timings["frames"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with span("encode", fmt=fmt, frames=len(frames)):
+            data, out_fmt = encode_animation(frames, durations, fmt)
+        timings["encode"] = time.perf_counter() - t
+        self.last_timings = timings
+        return RenderResult(data, tile, size, timings, out_fmt)
+
+    def render_image(
+        self,
+        image_source: Union[str, Image.Image],
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        content_image: Image.Image,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        padding: int = 0,
+        allow_upscale: bool = False,
+        keep_alpha: bool = True,
+        image_overlay: Union[str, Image.Image, None] = None,
+        max_image_size: Tuple[int, int] = (None, None),
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        fmt: str = "png",
+        max_bytes: int | None = None,
+        budget_key=None,
+    ) -> RenderResult:
+        """图片模式：输出保持底图原尺寸"""
+        t = time.perf_counter()
+        tile = fit_image_tile(
+            top_left, bottom_right, content_image,
+            align=align,
+            valign=valign,
+            padding=padding,
+            allow_upscale=allow_upscale,
+            keep_alpha=keep_alpha,
+            max_image_size=max_image_size,
+        )
+        timings = {"content": time.perf_counter() - t}
+        return self.compose(image_source, tile, image_overlay, role_name, text_configs_dict,
+                            compress=False, timings=timings, fmt=fmt, max_bytes=max_bytes, budget_key=budget_key)
+
+    def render_animated_image(
+        self,
+        image_source: Union[str, Image.Image],
+        top_left: Tuple[int, int],
+        bottom_right: Tuple[int, int],
+        content_image: Image.Image,
+        align: Align = "center",
+        valign: VAlign = "middle",
+        padding: int = 0,
+        allow_upscale: bool = False,
+        keep_alpha: bool = True,
+        image_overlay: Union[str, Image.Image, None] = None,
+        max_image_size: Tuple[int, int] = (None, None),
+        role_name: str = "unknown",
+        text_configs_dict: dict = None,
+        profile: "OutputProfile | str" = "full",
+        fmt: str = "gif",
+        max_frames: int = MAX_SOURCE_FRAMES,
+    ) -> RenderResult:
+        """
+        动图模式：content_image 的各帧逐帧放入文本框，输出 gif / apng / webp（参数与 render_image 相同）。
+        底图、置顶图层与角色名按 profile 的尺寸只合成一次；每帧只重新合成图片所在的矩形，
+        相同内容的帧共用同一块。相邻的相同帧合并，帧数不超过 max_frames。
+        动画默认按 full 尺寸输出（逐帧输出底图原尺寸代价过高）。
+        RenderResult.tile 为第一帧在原尺寸下的图块（与 render_image 相同）。
+        """
+        check_animation_format(fmt)
+        profile = PROFILES[profile] if isinstance(profile, str) else profile
+        fit_args = dict(align=align, valign=valign, allow_upscale=allow_upscale, keep_alpha=keep_alpha)
+        timings = {}
+
+        t = time.perf_counter()
+        with span("source_frames") as sp:
+            frames = source_frames(content_image, max_frames)
+            sp.set(frames=len(frames), unique=len({digest for _, _, digest in frames}))
+        timings["decode"] = time.perf_counter() - t
+
+        # --- 静态部分：底图与其上方的置顶图层、角色名分开保存，按输出尺寸缩放一次 ---
+        t = time.perf_counter()
+        with span("base_decode", source=image_source if isinstance(image_source, str) else "image"):
+            base = self.load_base(image_source)
+        above = Image.new("RGBA", base.size, (0, 0, 0, 0))
+        img_overlay = self.load_overlay(image_overlay)
+        if img_overlay is not None:
+            above.alpha_composite(img_overlay)
+        labels = self.label_tile(role_name, text_configs_dict)
+        if labels is not None:
+            paste_tile(above, labels)
+        size = profile.target_size(base.size)
+        sx, sy = size[0] / base.width, size[1] / base.height
+        if size != base.size:
+            with span("resize", profile=profile.name):
+                base = base.resize(size, Image.Resampling.LANCZOS)
+                above = above.resize(size, Image.Resampling.LANCZOS)
+        if above.getbbox() is None:
+            above = None
+        static = base.copy()
+        if above is not None:
+            static.alpha_composite(above)
+        timings["base"] = time.perf_counter() - t
+
+        # --- 各帧：只合成图片所在的矩形 ---
+        t = time.perf_counter()
+        region = ((round(top_left[0] * sx), round(top_left[1] * sy)),
+                  (round(bottom_right[0] * sx), round(bottom_right[1] * sy)))
+        limit = tuple(None if v is None else v * s for v, s in zip(max_image_size, (sx, sy)))
+        patches: dict[bytes, Image.Image] = {}
+        box = None
+        with span("frames", frames=len(frames)):
+            for frame, _, digest in frames:
+                if digest in patches:
+                    continue
+                tile = fit_image_tile(region[0], region[1], frame, padding=round(padding * min(sx, sy)),
+                                      max_image_size=limit, **fit_args)
+                if box is None:
+                    px, py = tile.position
+                    box = (max(0, px), max(0, py), min(size[0], px + tile.image.width),
+                           min(size[1], py + tile.image.height))
+                patch = base.crop(box)
+                shifted = ContentTile(tile.image, (tile.position[0] - box[0], tile.position[1] - box[1]),
+                                      tile.kind, tile.use_mask)
+                paste_tile(patch, shifted)
+                if above is not None:
+                    patch.alpha_composite(above.crop(box))
+                patches[digest] = patch.convert("RGB")
+            out_frames = patched_frames(static, box, [patches[digest] for _, _, digest in frames],
+                                        palette=fmt.lower() == "gif")
+        timings["content"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with span("encode", fmt=fmt, frames=len(out_frames)):
+            data, out_fmt = encode_animation(out_frames, [duration or 100 for _, duration, _ in frames], fmt)
+        timings["encode"] = time.perf_counter() - t
+        self.last_timings = timings
+        first = fit_image_tile(top_left, bottom_right, frames[0][0], padding=padding,
+                               max_image_size=max_image_size, **fit_args)
+        return RenderResult(data, first, size, timings, out_fmt)
+
+
+def check_animation_format(fmt: str) -> None:
+    """动画格式须为 gif / apng / webp（在绘制各帧之前检查）"""
+    if fmt.lower() not in ANIMATION_FORMATS:
+        raise ValueError(f"不支持的动画格式: {fmt}（可选 {', '.join(ANIMATION_FORMATS)}）")
+
+
+_default_pipeline: RenderPipeline | None = None
+_default_lock = threading.Lock()
+
+
+def get_default_pipeline() -> RenderPipeline:
+    """draw_text_auto / paste_image_auto 共用的默认流水线"""
+    global _default_pipeline
+    with _default_lock:
+        if _default_pipeline is None:
+            _default_pipeline = RenderPipeline()
+        return _default_pipeline
@@ -0,0 +1,327 @@
+""" 本地渲染服务（asyncio HTTP + 预热的工作进程池）
+
+接口：
+    POST /render   请求体为 JSON：
+                   {"character": "sherri", "emotion": 2, "background": 5,
+                    "text": "你好" 或 "image": "<base64>", "format": "png" | "webp",
+                    "max_bytes": 1048576}
+                   emotion / background 省略时随机选取，返回图片字节；
+                   指定 max_bytes 时在该字节数内选择格式（png / webp / jpeg）、质量与缩放，忽略 format
+    GET  /metrics  队列深度、处理量与延迟分位数（JSON）
+    GET  /health   存活检查
+
+默认只监听 127.0.0.1。请求先进入有界队列，队列满时立即返回 503；
+分发协程把排队的请求按批次交给工作进程，每个进程只加载一次配置、字体与图层。
+
+用法：
+    python render_server.py --port 8765 -j 4
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from headless_render import HeadlessRenderer, release_shared_memory
+
+CONTENT_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+REQUEST_FORMATS = ("png", "webp")
+MAX_BODY = 32 * 1024 * 1024  # 请求体上限（字节）
+# 请求字段 -> 允许的 JSON 类型（null 表示未指定）
+JOB_FIELDS = {
+    "character": str,
+    "text": str,
+    "image": str,
+    "format": str,
+    "emotion": int,
+    "background": int,
+    "max_bytes": (int, str),
+}
+
+_renderer: HeadlessRenderer | None = None  # 每个工作进程各自持有一份
+
+
+def _init_worker(base_path: str | None) -> None:
+    """工作进程初始化：只加载一次配置、字体与角色名图层"""
+    global _renderer
+    _renderer = HeadlessRenderer(base_path)
+    _renderer.warm_up()
+
+
+def _warm_worker(delay: float) -> int:
+    """占住一个工作进程片刻，确保启动时所有进程都已创建并完成初始化"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _render_batch(jobs: list[dict]) -> list[tuple[tuple[bytes, str] | None, str | None]]:
+    """在工作进程中依次渲染一批请求，返回 [((图片字节, 格式), 错误信息)]"""
+    results = []
+    for job in jobs:
+        try:
+            character, emotion, background = _renderer.resolve(
+                job["character"], job.get("emotion"), job.get("background"))
+            image = None
+            if job.get("image"):
+                with Image.open(io.BytesIO(base64.b64decode(job["image"]))) as image:
+                    image.load()
+            result = _renderer.render(character, emotion, background, text=job.get("text"), image=image,
+                                      fmt=job["format"], max_bytes=job.get("max_bytes"))
+            results.append(((result.data, result.fmt), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class RenderServer:
+    """有界队列 + 批处理分发 + 进程池"""
+
+    def __init__(self, workers: int = 2, queue_size: int = 64, batch_size: int = 8,
+                 batch_window: float = 0.005, timeout: float = 30.0, base_path: str | None = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.base_path = base_path
+        self.queue: asyncio.Queue | None = None
+        self.queue_size = queue_size
+        self.pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._dispatcher: asyncio.Task | None = None
+
+        # 统计
+        self.started_at = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self.latencies: deque[float] = deque(maxlen=2000)  # 端到端延迟（秒）
+        self.render_latencies: deque[float] = deque(maxlen=2000)  # 进程内批处理耗时（秒）
+
+    async def start(self) -> None:
+        """创建队列与进程池，并预热所有工作进程"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._slots = asyncio.Semaphore(self.workers)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.base_path,))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_worker, 0.2)
+                               for _ in range(self.workers)))
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        if self.pool:
+            # 等工作进程退出后再清理共享内存（被强制结束的进程不会自行注销）
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.pool.shutdown, wait=True, cancel_futures=True))
+            self.pool = None
+        release_shared_memory(self.base_path)
+
+    async def submit(self, job: dict) -> tuple[bytes, str]:
+        """排队等待渲染；队列已满时抛出 asyncio.QueueFull"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((job, future, time.perf_counter()))
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def _dispatch_loop(self) -> None:
+        """攒批：拿到第一个请求后最多再等 batch_window 秒，凑满 batch_size 即发出"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # 先等到空闲的工作进程再取请求，未处理的请求始终计入有界队列
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        self.in_flight += len(batch)
+        self.batches += 1
+        self.batched_jobs += len(batch)
+        started = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self.pool, _render_batch, [job for job, _, _ in batch])
+        except Exception as e:
+            results = [(None, f"{type(e).__name__}: {e}")] * len(batch)
+        finally:
+            self._slots.release()
+            self.in_flight -= len(batch)
+        self.render_latencies.append(time.perf_counter() - started)
+
+        now = time.perf_counter()
+        for (_, future, enqueued), (data, error) in zip(batch, results):
+            self.latencies.append(now - enqueued)
+            if future.done():  # 已超时
+                continue
+            if error is None:
+                self.completed += 1
+                future.set_result(data)
+            else:
+                self.failed += 1
+                future.set_exception(ValueError(error))
+
+    @staticmethod
+    def _percentiles(values) -> dict[str, float]:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        ordered = sorted(values)
+
+        def pick(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+    def metrics(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_capacity": self.queue_size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_jobs / self.batches, 2) if self.batches else 0.0,
+            "latency_ms": self._percentiles(self.latencies),
+            "batch_render_ms": self._percentiles(self.render_latencies),
+        }
+
+    # --- HTTP ---
+    async def handle(self, method: str, path: str, body: bytes) -> tuple[int, str, bytes, dict]:
+        """路由请求，返回 (状态码, Content-Type, 响应体, 额外响应头)"""
+        if method == "GET" and path == "/health":
+            return 200, "text/plain; charset=utf-8", b"ok", {}
+        if method == "GET" and path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics()).encode("utf-8"), {}
+        if path != "/render":
+            return 404, "text/plain; charset=utf-8", b"not found", {}
+        if method != "POST":
+            return 405, "text/plain; charset=utf-8", b"method not allowed", {"Allow": "POST"}
+
+        try:
+            job = json.loads(body)
+            if not isinstance(job, dict) or "character" not in job:
+                raise ValueError("缺少 character")
+            if not job.get("text") and not job.get("image"):
+                raise ValueError("需要 text 或 image")
+            for key, types in JOB_FIELDS.items():
+                value = job.get(key)
+                if value is not None and (isinstance(value, bool) or not isinstance(value, types)):
+                    raise ValueError(f"{key} 的类型不正确")
+            job["format"] = (job.get("format") or "png").lower()
+            if job["format"] not in REQUEST_FORMATS:
+                raise ValueError(f"不支持的格式: {job['format']}")
+            if job.get("max_bytes") is not None:
+                job["max_bytes"] = int(job["max_bytes"])
+                if job["max_bytes"] <= 0:
+                    raise ValueError("max_bytes 必须为正数")
+        except (TypeError, ValueError) as e:
+            return 400, "text/plain; charset=utf-8", str(e).encode("utf-8"), {}
+
+        try:
+            data, fmt = await self.submit(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503, "text/plain; charset=utf-8", "队列已满".encode("utf-8"), {"Retry-After": "1"}
+        except asyncio.TimeoutError:
+            return 504, "text/plain; charset=utf-8", "渲染超时".encode("utf-8"), {}
+        except ValueError as e:
+            return 422, "text/plain; charset=utf-8", str(e).encode("utf-8"), {}
+        return 200, CONTENT_TYPES[fmt], data, {}
+
+    async def on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理单个连接（HTTP/1.1，每个请求后关闭连接）"""
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            try:
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                status, ctype, payload, extra = 400, "text/plain; charset=utf-8", b"bad request", {}
+            else:
+                if length > MAX_BODY:
+                    status, ctype, payload, extra = 413, "text/plain; charset=utf-8", b"payload too large", {}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    path = target.split("?", 1)[0]
+                    status, ctype, payload, extra = await self.handle(method.upper(), path, body)
+
+            head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                    f"Content-Type: {ctype}",
+                    f"Content-Length: {len(payload)}",
+                    "Connection: close"]
+            head += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 422: "Unprocessable Entity", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+
+
+async def serve(args) -> None:
+    server = RenderServer(workers=args.jobs, queue_size=args.queue_size, batch_size=args.batch_size,
+                          batch_window=args.batch_window_ms / 1000, timeout=args.timeout,
+                          base_path=args.base_path)
+    await server.start()
+    listener = await asyncio.start_server(server.on_connection, args.host, args.port)
+    print(f"渲染服务已启动: http://{args.host}:{args.port} （{args.jobs} 个工作进程）")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="魔裁文本框本地渲染服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="工作进程数")
+    parser.add_argument("--queue-size", type=int, default=64, help="排队上限，超出返回 503")
+    parser.add_argument("--batch-size", type=int, default=8, help="每批最多请求数")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0, help="攒批等待时间（毫秒）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument("--base-path", default=None, help="项目根目录（含 config/ 与 assets/）")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
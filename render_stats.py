@@ -0,0 +1,107 @@
+# filename: render_stats.py
+"""
+运行统计：最近若干次的端到端与渲染耗时（滚动窗口，按需计算分位数）、预热吞吐、
+缓存的内存占用估算与命中率、缓存目录的磁盘占用（结果缓存若干秒，不必每次刷新都遍历目录）。
+记录只是追加与赋值，不会拖慢渲染；RenderEngine.cache_report 与 TUI 的统计面板读取这些数据。
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from PIL import Image
+
+
+class LatencyWindow:
+    """最近 max_items 次耗时（秒）的滚动窗口，add 只是一次 deque 追加"""
+
+    def __init__(self, max_items: int = 200):
+        self._values: deque[float] = deque(maxlen=max_items)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, seconds: float) -> None:
+        self._values.append(seconds)
+
+    def percentiles(self, *qs: float) -> list[float]:
+        """返回各分位数（毫秒），窗口为空时为 0"""
+        ordered = sorted(self._values)
+        if not ordered:
+            return [0.0 for _ in qs]
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 for q in qs]
+
+
+class RenderStats:
+    """引擎运行统计：端到端与渲染耗时、上一次各阶段耗时、预热吞吐"""
+
+    def __init__(self, window: int = 200):
+        self.end_to_end = LatencyWindow(window)  # 从按下热键到发送完成
+        self.render = LatencyWindow(window)  # 引擎内生成（选底图 -> 编码）
+        self.last_stages: dict[str, float] = {}
+        self.warm_up_images = 0
+        self.warm_up_seconds = 0.0
+        self.warm_up_character: str | None = None
+
+    def record_warm_up(self, character: str, images: int, seconds: float) -> None:
+        self.warm_up_character = character
+        self.warm_up_images = images
+        self.warm_up_seconds = seconds
+
+    @property
+    def warm_up_throughput(self) -> float:
+        """上一次预热的速度（张/秒）"""
+        return self.warm_up_images / self.warm_up_seconds if self.warm_up_seconds else 0.0
+
+
+def estimate_bytes(value) -> int:
+    """估算缓存值占用的内存：图像按像素数 × 通道数，字节串按长度，列表按各元素之和"""
+    image = getattr(value, "image", value)  # ContentTile
+    if isinstance(image, Image.Image):
+        return image.width * image.height * len(image.getbands())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, list):  # 分页的图块
+        return sum(estimate_bytes(v) for v in value)
+    return 0
+
+
+def hit_rate(hits: int, misses: int) -> float | None:
+    total = hits + misses
+    return hits / total if total else None
+
+
+class DiskUsage:
+    """目录占用（字节），结果缓存 max_age 秒，避免每次刷新都遍历磁盘"""
+
+    def __init__(self, max_age: float = 10.0):
+        self.max_age = max_age
+        self._cache: dict[tuple, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def size(self, path: str, suffixes: tuple[str, ...] = ()) -> int:
+        key = (path, suffixes)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and now - cached[0] < self.max_age:
+                return cached[1]
+        total = 0
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file() and (not suffixes or entry.name.lower().endswith(suffixes)):
+                        total += entry.stat().st_size
+        elif os.path.isfile(path):
+            total = os.path.getsize(path)
+        with self._lock:
+            self._cache[key] = (now, total)
+        return total
+
+
+def format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
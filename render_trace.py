@@ -0,0 +1,155 @@
+# filename: render_trace.py
+"""
+轻量的分阶段计时（span），导出为 Chrome trace JSON（chrome://tracing 或 ui.perfetto.dev 打开）。
+
+    from render_trace import span
+    with span("encode", fmt="png"):
+        ...
+
+默认关闭，此时 span() 只做一次全局判断并返回共享的空对象。
+设置环境变量 MANOSABA_TRACE=<输出文件> 或调用 enable(path) 开启，进程退出时自动写出。
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+ENV_VAR = "MANOSABA_TRACE"
+MAX_EVENTS = 500_000  # 超出后不再记录，避免长时间运行占满内存
+
+_enabled = False
+_path: str | None = None
+_events: list[dict] = []
+_threads: dict[int, str] = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _record({
+            "name": self.name,
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": _pid,
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+        return False
+
+    def set(self, **args) -> None:
+        """补充参数（例如缓存是否命中）"""
+        self.args.update(args)
+
+
+def _record(event: dict) -> None:
+    tid = event["tid"]
+    with _lock:
+        if len(_events) >= MAX_EVENTS:
+            return
+        if tid not in _threads:
+            _threads[tid] = threading.current_thread().name
+        _events.append(event)
+
+
+def span(name: str, **args):
+    """计时一个阶段；未开启时几乎没有开销"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name: str):
+    """装饰器：把整个函数调用记为一个 span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instant(name: str, **args) -> None:
+    """记录一个瞬时事件"""
+    if not _enabled:
+        return
+    _record({"name": name, "ph": "i", "s": "t", "ts": time.perf_counter_ns() / 1000,
+             "pid": _pid, "tid": threading.get_ident(), "args": args})
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(path: str) -> None:
+    """开启记录，进程退出时写入 path"""
+    global _enabled, _path
+    _path = path
+    if not _enabled:
+        _enabled = True
+        atexit.register(save)
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def save(path: str | None = None) -> str | None:
+    """把已记录的 span 写成 Chrome trace JSON，返回文件路径"""
+    path = path or _path
+    if not path:
+        return None
+    with _lock:
+        events = list(_events)
+        threads = dict(_threads)
+    meta = [{"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()]
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, fp, ensure_ascii=False)
+    return path
+
+
+def clear() -> None:
+    with _lock:
+        _events.clear()
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
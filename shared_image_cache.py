@@ -0,0 +1,232 @@
+# filename: shared_image_cache.py
+"""
+多个前端进程（TUI、批量渲染、渲染服务等）同时运行时共享解码好的底图。
+每张图像解码一次后写成内存映射文件（Linux 上放在 /dev/shm，其他平台放在临时目录），
+其他进程只读映射同一个文件，像素内存由操作系统在进程间共享，不再各自持有一份副本。
+
+目录结构（每个项目目录一个根目录）：
+    <根目录>/<键的 sha1>.img    16 字节头（魔数、宽、高、模式）+ 原始像素
+    <根目录>/procs/<pid>        正在使用该目录的进程
+进程退出时删除自己的登记并清理已不存在的进程，最后一个进程退出时删除整个目录。
+退出清理通过 multiprocessing 的终结器执行：进程池的工作进程以 os._exit 退出、不执行 atexit，
+但终结器在主进程与子进程中都会执行。进程被强制结束时由启动进程池的父进程调用 release() 补做清理。
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from multiprocessing import util as mp_util
+
+from PIL import Image
+
+MAGIC = b"MSI1"
+_HEADER = struct.Struct("<4sII4s")  # 魔数, 宽, 高, 模式
+_MODES = ("RGBA", "RGB", "L")
+
+
+def default_root(base_path: str) -> str:
+    """项目目录对应的共享目录：有 /dev/shm 时放在其中，否则放在系统临时目录"""
+    parent = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    digest = hashlib.sha1(os.path.abspath(base_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(parent, f"manosaba-{digest}")
+
+
+def file_signature(path: str) -> tuple[int, int] | None:
+    """源文件的 (mtime_ns, 大小)，写入键中，文件变化后旧的共享图像不再命中"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _pid_alive(pid: int) -> bool:
+    if sys.platform.startswith("win"):
+        try:
+            import psutil
+        except ImportError:
+            return True  # 无法判断时当作仍在运行，只是不清理
+        return psutil.pid_exists(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def live_processes(procs: str) -> list[int]:
+    """登记目录中仍在运行的进程（顺便删除已退出进程的登记）"""
+    alive = []
+    try:
+        names = os.listdir(procs)
+    except OSError:
+        return alive
+    for name in names:
+        if not name.isdigit():
+            continue
+        if _pid_alive(int(name)):
+            alive.append(int(name))
+        else:
+            try:
+                os.remove(os.path.join(procs, name))
+            except OSError:
+                pass
+    return alive
+
+
+def release(root: str) -> bool:
+    """
+    清理已退出进程的登记；没有进程在使用时删除整个共享目录，返回是否已删除。
+    先删除空的登记目录再删除图像：删除成功说明此刻没有进程登记，之后登记的进程会重新创建登记目录，
+    共享目录因此不为空、不会被删掉；删除失败说明有进程刚刚登记，保留全部内容。
+    """
+    procs = os.path.join(root, "procs")
+    if live_processes(procs):
+        return False
+    try:
+        os.rmdir(procs)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return False
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        os.rmdir(root)
+    except OSError:
+        return False
+    return True
+
+
+class SharedImageCache:
+    """
+    跨进程共享的只读图像缓存。get 返回的图像直接引用映射的内存，调用方不得修改（需要修改时先 copy()）。
+    总大小超过 max_bytes 后不再写入新图像，调用方退回各自进程内的缓存。
+    写入先写临时文件再改名，其他进程要么看不到、要么看到完整的文件。
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._procs = os.path.join(root, "procs")
+        self._register()
+        mp_util.Finalize(None, self.close, exitpriority=10)
+
+    def _register(self) -> None:
+        """登记当前进程；另一个进程正好在删除共享目录时重新创建"""
+        pidfile = os.path.join(self._procs, str(os.getpid()))
+        for attempt in range(5):
+            os.makedirs(self._procs, exist_ok=True)
+            try:
+                with open(pidfile, "w"):
+                    pass
+                return
+            except FileNotFoundError:
+                if attempt == 4:
+                    raise
+
+    def _file(self, key) -> str:
+        return os.path.join(self.root, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".img")
+
+    def get(self, key) -> Image.Image | None:
+        """映射已共享的图像，不存在时返回 None"""
+        try:
+            with open(self._file(key), "rb") as fp:
+                mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        magic, width, height, mode = _HEADER.unpack_from(mm) if len(mm) >= _HEADER.size else (b"", 0, 0, b"")
+        mode = mode.rstrip(b"\0").decode("ascii", "replace")
+        if magic != MAGIC or mode not in _MODES:
+            mm.close()
+            with self._lock:
+                self.misses += 1
+            return None
+        # 图像持有映射的 memoryview，图像被回收后映射随之释放
+        image = Image.frombuffer(mode, (width, height), memoryview(mm)[_HEADER.size:], "raw", mode, 0, 1)
+        with self._lock:
+            self.hits += 1
+        return image
+
+    def put(self, key, image: Image.Image) -> bool:
+        """写入共享目录，超出容量或写入失败时返回 False"""
+        if image.mode not in _MODES:
+            return False
+        data = image.tobytes()
+        if self.used_bytes() + len(data) > self.max_bytes:
+            return False
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as fp:
+                fp.write(_HEADER.pack(MAGIC, image.width, image.height, image.mode.encode("ascii")))
+                fp.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            # 例如 Windows 上目标文件正被其他进程映射，此时该图像已由别的进程共享
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            self.published += 1
+        return True
+
+    def get_or_create(self, key, factory) -> Image.Image | None:
+        """共享目录中有则映射；否则调用 factory() 生成并共享，返回映射后的图像（共享失败时返回私有图像）"""
+        image = self.get(key)
+        if image is not None:
+            return image
+        image = factory()
+        if image is not None and self.put(key, image):
+            shared = self.get(key)
+            if shared is not None:
+                return shared
+        return image
+
+    def used_bytes(self) -> int:
+        total = 0
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.endswith(".img"):
+                        try:
+                            total += entry.stat().st_size
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return total
+
+    def live_processes(self) -> list[int]:
+        """仍在使用共享目录的进程（顺便删除已退出进程的登记）"""
+        return live_processes(self._procs)
+
+    def close(self) -> None:
+        """注销当前进程；没有其他进程在使用时删除共享目录（已映射的图像在本进程内仍然有效）"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            os.remove(os.path.join(self._procs, str(os.getpid())))
+        except OSError:
+            pass
+        release(self.root)
@@ -0,0 +1,140 @@
+# filename: size_budget.py
+"""
+输出字节预算：聊天软件对图片大小有限制（超出会被拒绝或二次压缩），
+在预算内选择画质损失最小的格式、质量与缩放。
+
+候选设置按画质从高到低排列（LADDER）。先用缩小的样图编码估计各设置的大小，
+选第一个估计不超过预算的设置做一次完整编码；估计与实际的偏差按格式持续校正。
+选中的设置按调用方给的键（例如角色与背景）缓存，之后的渲染直接使用，通常一次编码就能满足预算。
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+# (格式, 质量, 缩放)，按画质从高到低
+LADDER: tuple[tuple[str, int | None, float], ...] = (
+    ("png", None, 1.0),
+    ("webp", 92, 1.0),
+    ("jpeg", 90, 1.0),
+    ("webp", 80, 1.0),
+    ("jpeg", 80, 1.0),
+    ("webp", 70, 1.0),
+    ("jpeg", 70, 1.0),
+    ("webp", 70, 0.8),
+    ("jpeg", 70, 0.8),
+    ("webp", 60, 0.65),
+    ("jpeg", 65, 0.65),
+    ("webp", 50, 0.5),
+    ("jpeg", 60, 0.5),
+)
+FORMATS = ("png", "webp", "jpeg")
+SAFETY = 0.95  # 估计值需低于预算的比例，留出估计误差
+
+
+def encode_step(img: Image.Image, step: tuple[str, int | None, float]) -> bytes:
+    """按 (格式, 质量, 缩放) 编码"""
+    fmt, quality, scale = step
+    if scale != 1.0:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                         Image.Resampling.LANCZOS)
+    buf = BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG")
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+class ByteBudgetEncoder:
+    """
+    在 max_bytes 内编码图像，返回 (字节, 格式)。所有设置都超出预算时返回最小的一个。
+    线程安全；统计 requests（调用次数）、first_try（只编码一次即满足的次数）与 encodes（完整编码次数）。
+    """
+
+    def __init__(self, max_entries: int = 256, sample_scale: float = 0.5):
+        self.max_entries = max_entries
+        self.sample_scale = sample_scale
+        self.requests = 0
+        self.first_try = 0
+        self.encodes = 0
+        self._choices: OrderedDict = OrderedDict()  # 键 -> LADDER 下标
+        self._correction: dict[str, float] = {}  # 格式 -> 实际大小 / 样图估计
+        self._lock = threading.Lock()
+
+    def estimate(self, img: Image.Image, step: tuple[str, int | None, float]) -> int:
+        """用缩小的样图编码，按面积放大并乘以该格式的校正系数"""
+        fmt, quality, scale = step
+        sample = (fmt, quality, scale * self.sample_scale)
+        raw = len(encode_step(img, sample)) / (self.sample_scale ** 2)
+        return int(raw * self._correction.get(fmt, 1.0))
+
+    def _learn(self, step: tuple[str, int | None, float], estimated: int, actual: int) -> None:
+        if estimated <= 0:
+            return
+        fmt = step[0]
+        ratio = actual / (estimated / self._correction.get(fmt, 1.0))
+        with self._lock:
+            old = self._correction.get(fmt)
+            self._correction[fmt] = ratio if old is None else old * 0.7 + ratio * 0.3
+
+    def _remember(self, key, index: int) -> None:
+        if key is None:
+            return
+        with self._lock:
+            self._choices[key] = index
+            self._choices.move_to_end(key)
+            while len(self._choices) > self.max_entries:
+                self._choices.popitem(last=False)
+
+    def _full(self, img: Image.Image, index: int) -> bytes:
+        data = encode_step(img, LADDER[index])
+        with self._lock:
+            self.encodes += 1
+        return data
+
+    def encode(self, img: Image.Image, max_bytes: int, key=None,
+               formats: tuple[str, ...] = FORMATS) -> tuple[bytes, str]:
+        with self._lock:
+            self.requests += 1
+            cached = self._choices.get(key) if key is not None else None
+        steps = [i for i, step in enumerate(LADDER) if step[0] in formats]
+        if not steps:
+            raise ValueError(f"没有可用的格式: {formats}")
+        attempts = 0
+        smallest: tuple[bytes, str] | None = None
+
+        # 1. 同一键上次选中的设置
+        if cached in steps:
+            data = self._full(img, cached)
+            attempts += 1
+            smallest = (data, LADDER[cached][0])
+            if len(data) <= max_bytes:
+                with self._lock:
+                    self.first_try += 1
+                return smallest
+            steps = [i for i in steps if i > cached]
+
+        # 2. 按估计值从高画质到低画质选择，只对估计满足预算的设置（或最后一个）做完整编码
+        for n, i in enumerate(steps):
+            step = LADDER[i]
+            estimated = self.estimate(img, step)
+            if estimated > max_bytes * SAFETY and n < len(steps) - 1:
+                continue
+            data = self._full(img, i)
+            attempts += 1
+            self._learn(step, estimated, len(data))
+            if smallest is None or len(data) < len(smallest[0]):
+                smallest = (data, step[0])
+            if len(data) <= max_bytes:
+                if attempts == 1:
+                    with self._lock:
+                        self.first_try += 1
+                self._remember(key, i)
+                return data, step[0]
+        if steps:
+            self._remember(key, steps[-1])
+        return smallest
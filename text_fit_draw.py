@@ -1,9 +1,12 @@
 # filename: text_fit_draw.py
-from io import BytesIO
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Tuple, Union, Literal
 from PIL import Image, ImageDraw, ImageFont
 import os
 
+from render_trace import span
+
 Align = Literal["left", "center", "right"]
 VAlign = Literal["top", "middle", "bottom"]
 
@@ -31,118 +34,94 @@ def compress_image(image: Image.Image) -> Image.Image:
     
     return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
 
-def draw_text_auto(
-    image_source: Union[str, Image.Image],
-    top_left: Tuple[int, int],
-    bottom_right: Tuple[int, int],
-    text: str,
-    color: Tuple[int, int, int] = (0, 0, 0),
-    max_font_height: int | None = None,
-    font_path: str | None = None,
-    align: Align = "center",
-    valign: VAlign = "middle",
-    line_spacing: float = 0.15,
-    image_overlay: Union[str, Image.Image,None]=None,
-    role_name: str = "unknown",  # 添加角色名称参数
-    text_configs_dict: dict = None,  # 添加文字配置字典参数
-) -> bytes:
-    """
-    在指定矩形内自适应字号绘制文本；
-    中括号及括号内文字使用 bracket_color。
-    """
+# 仅用于测量文字宽度的画布（与 RGBA 底图的测量结果一致）
+_MEASURE_DRAW = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
 
-    # --- 1. 打开图像 ---
-    if isinstance(image_source, Image.Image):
-        img = image_source.copy()
-    else:
-        img = Image.open(image_source).convert("RGBA")
-    
-    # 压缩底图
-    draw = ImageDraw.Draw(img)
+# --- 字体加载 ---
+@lru_cache(maxsize=256)
+def _load_font(font_path: str | None, size: int) -> ImageFont.FreeTypeFont:
+    if font_path and os.path.exists(font_path):
+        return ImageFont.truetype(font_path, size=size)
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size=size)
+    except Exception:
+        return ImageFont.load_default()
 
-    if image_overlay is not None:
-        if isinstance(image_overlay, Image.Image):
-            img_overlay = image_overlay.copy()
-        else:
-            img_overlay = Image.open(image_overlay).convert("RGBA") if os.path.isfile(image_overlay) else None
+# --- 文本包行 ---
+def wrap_lines(txt: str, font: ImageFont.FreeTypeFont, max_w: int) -> list[str]:
+    draw = _MEASURE_DRAW
+    lines: list[str] = []
+    for para in txt.splitlines() or [""]:
+        has_space = (" " in para)
+        units = para.split(" ") if has_space else list(para)
+        buf = ""
 
-    x1, y1 = top_left
-    x2, y2 = bottom_right
-    if not (x2 > x1 and y2 > y1):
-        raise ValueError("无效的文字区域。")
-    region_w, region_h = x2 - x1, y2 - y1
+        def unit_join(a: str, b: str) -> str:
+            if not a:
+                return b
+            return (a + " " + b) if has_space else (a + b)
 
-    # --- 2. 字体加载 ---
-    def _load_font(size: int) -> ImageFont.FreeTypeFont:
-        if font_path and os.path.exists(font_path):
-            return ImageFont.truetype(font_path, size=size)
-        try:
-            return ImageFont.truetype("DejaVuSans.ttf", size=size)
-        except Exception:
-            return ImageFont.load_default()
-
-    # --- 3. 文本包行 ---
-    def wrap_lines(txt: str, font: ImageFont.FreeTypeFont, max_w: int) -> list[str]:
-        lines: list[str] = []
-        for para in txt.splitlines() or [""]:
-            has_space = (" " in para)
-            units = para.split(" ") if has_space else list(para)
-            buf = ""
-
-            def unit_join(a: str, b: str) -> str:
-                if not a:
-                    return b
-                return (a + " " + b) if has_space else (a + b)
-
-            for u in units:
-                trial = unit_join(buf, u)
-                w = draw.textlength(trial, font=font)
-                if w <= max_w:
-                    buf = trial
+        for u in units:
+            trial = unit_join(buf, u)
+            w = draw.textlength(trial, font=font)
+            if w <= max_w:
+                buf = trial
+            else:
+                if buf:
+                    lines.append(buf)
+                if has_space and len(u) > 1:
+                    tmp = ""
+                    for ch in u:
+                        if draw.textlength(tmp + ch, font=font) <= max_w:
+                            tmp += ch
+                        else:
+                            if tmp:
+                                lines.append(tmp)
+                            tmp = ch
+                    buf = tmp
                 else:
-                    if buf:
-                        lines.append(buf)
-                    if has_space and len(u) > 1:
-                        tmp = ""
-                        for ch in u:
-                            if draw.textlength(tmp + ch, font=font) <= max_w:
-                                tmp += ch
-                            else:
-                                if tmp:
-                                    lines.append(tmp)
-                                tmp = ch
-                        buf = tmp
+                    if draw.textlength(u, font=font) <= max_w:
+                        buf = u
                     else:
-                        if draw.textlength(u, font=font) <= max_w:
-                            buf = u
-                        else:
-                            lines.append(u)
-                            buf = ""
-            if buf != "":
-                lines.append(buf)
-            if para == "" and (not lines or lines[-1] != ""):
-                lines.append("")
-        return lines
-
-    # --- 4. 测量 ---
-    def measure_block(lines: list[str], font: ImageFont.FreeTypeFont) -> tuple[int, int, int]:
-        ascent, descent = font.getmetrics()
-        line_h = int((ascent + descent) * (1 + line_spacing))
-        max_w = 0
-        for ln in lines:
-            max_w = max(max_w, int(draw.textlength(ln, font=font)))
-        total_h = max(line_h * max(1, len(lines)), 1)
-        return max_w, total_h, line_h
-
-    # --- 5. 搜索最大字号 ---
+                        lines.append(u)
+                        buf = ""
+        if buf != "":
+            lines.append(buf)
+        if para == "" and (not lines or lines[-1] != ""):
+            lines.append("")
+    return lines
+
+# --- 测量 ---
+def measure_block(lines: list[str], font: ImageFont.FreeTypeFont, line_spacing: float) -> tuple[int, int, int]:
+    ascent, descent = font.getmetrics()
+    line_h = int((ascent + descent) * (1 + line_spacing))
+    max_w = 0
+    for ln in lines:
+        max_w = max(max_w, int(_MEASURE_DRAW.textlength(ln, font=font)))
+    total_h = max(line_h * max(1, len(lines)), 1)
+    return max_w, total_h, line_h
+
+# --- 搜索最大字号 ---
+def layout_text(
+    text: str,
+    font_path: str | None,
+    region_w: int,
+    region_h: int,
+    max_font_height: int | None = None,
+    line_spacing: float = 0.15,
+) -> Tuple[int, list[str], int, int]:
+    """
+    在 region_w × region_h 内二分搜索能放下文本的最大字号。
+    返回 (字号, 各行文本, 行高, 文本块总高)，结果只取决于输入参数，可缓存。
+    """
     hi = min(region_h, max_font_height) if max_font_height else region_h
     lo, best_size, best_lines, best_line_h, best_block_h = 1, 0, [], 0, 0
 
     while lo <= hi:
         mid = (lo + hi) // 2
-        font = _load_font(mid)
+        font = _load_font(font_path, mid)
         lines = wrap_lines(text, font, region_w)
-        w, h, lh = measure_block(lines, font)
+        w, h, lh = measure_block(lines, font, line_spacing)
         if w <= region_w and h <= region_h:
             best_size, best_lines, best_line_h, best_block_h = mid, lines, lh, h
             lo = mid + 1
@@ -150,49 +129,200 @@ def draw_text_auto(
             hi = mid - 1
 
     if best_size == 0:
-        font = _load_font(1)
+        font = _load_font(font_path, 1)
         best_lines = wrap_lines(text, font, region_w)
-        _, best_block_h, best_line_h = 0, 1, 1
+        best_block_h, best_line_h = 1, 1
         best_size = 1
-    else:
-        font = _load_font(best_size)
+    return best_size, best_lines, best_line_h, best_block_h
 
-    # --- 6. 解析着色片段 ---
-    def parse_color_segments(s: str,in_bracket: bool) -> Tuple[list[tuple[str, Tuple[int, int, int]]],bool]:
-        segs: list[tuple[str, Tuple[int, int, int]]] = []
-        buf = ""
-        bracket_color = tuple(text_configs_dict[role_name][0]["font_color"])
-        for ch in s:
+# --- 分页 ---
+def paginate_text(
+    text: str,
+    font_path: str | None,
+    region_w: int,
+    region_h: int,
+    min_font_size: int,
+    line_spacing: float = 0.15,
+) -> Tuple[int, list[list[str]]] | None:
+    """
+    按 min_font_size 对全文换行一次：能放进一页时返回 None（交给 layout_text 搜索更大的字号）；
+    否则按每页能容纳的行数在行边界切分（页首的空行略去），返回 (行高, 各页的行)。
+    长文本不再需要字号搜索（小字号下的换行很慢）。
+    """
+    font = _load_font(font_path, min_font_size)
+    lines = wrap_lines(text, font, region_w)
+    w, h, line_h = measure_block(lines, font, line_spacing)
+    if w <= region_w and h <= region_h:
+        return None
+    per_page = max(1, region_h // line_h)
+    pages: list[list[str]] = []
+    page: list[str] = []
+    for ln in lines:
+        if not page and ln == "":
+            continue
+        page.append(ln)
+        if len(page) == per_page:
+            pages.append(page)
+            page = []
+    if page:
+        pages.append(page)
+    return line_h, pages or [[""]]
+
+# --- 解析着色片段 ---
+def parse_color_segments(
+    s: str,
+    in_bracket: bool,
+    color: Tuple[int, int, int],
+    bracket_color: Tuple[int, int, int],
+) -> Tuple[list[tuple[str, Tuple[int, int, int]]], bool]:
+    """中括号及括号内文字使用 bracket_color，in_bracket 跨行传递"""
+    segs: list[tuple[str, Tuple[int, int, int]]] = []
+    buf = ""
+    for ch in s:
+        if ch == "[" or ch == "【":
+            if buf:
+                segs.append((buf, bracket_color if in_bracket else color))
+                buf = ""
+            segs.append((ch, bracket_color))
+            in_bracket = True
+        elif ch == "]" or ch == "】":
+            if buf:
+                segs.append((buf, bracket_color))
+                buf = ""
+            segs.append((ch, bracket_color))
+            in_bracket = False
+        else:
+            buf += ch
+    if buf:
+        segs.append((buf, bracket_color if in_bracket else color))
+    return segs, in_bracket
+
+def bracket_state(lines: list[str], in_bracket: bool = False) -> bool:
+    """绘制完 lines 之后是否仍在中括号内（分页时传给下一页）"""
+    for ln in lines:
+        for ch in ln:
             if ch == "[" or ch == "【":
-                if buf:
-                    segs.append((buf, bracket_color if in_bracket else color))
-                    buf = ""
-                segs.append((ch, bracket_color))
                 in_bracket = True
             elif ch == "]" or ch == "】":
-                if buf:
-                    segs.append((buf, bracket_color))
-                    buf = ""
-                segs.append((ch, bracket_color))
                 in_bracket = False
-            else:
-                buf += ch
-        if buf:
-            segs.append((buf, bracket_color if in_bracket else color))
-        return segs,in_bracket
+    return in_bracket
 
-    # --- 7. 垂直对齐 ---
+@dataclass
+class ContentTile:
+    """
+    排版完成的内容图块，与底图无关，可反复合成到不同底图上。
+    - kind="text": 透明文字层，按 alpha 合成
+    - kind="image": 缩放后的图片，按 paste 粘贴（use_mask 时以自身 alpha 为蒙版）
+    """
+    image: Image.Image
+    position: Tuple[int, int]
+    kind: Literal["text", "image"] = "text"
+    use_mask: bool = True
+
+def rasterize_text_ops(
+    ops: list[tuple[Tuple[int, int], str, ImageFont.FreeTypeFont, Tuple[int, int, int]]],
+) -> ContentTile | None:
+    """
+    把一组 (坐标, 文本, 字体, 颜色) 绘制指令按顺序画到一张透明图层上。
+    每段文字单独生成覆盖率蒙版再 alpha 合成，贴回底图后与直接在底图上
+    绘制的结果一致（误差不超过舍入）。没有可见内容时返回 None。
+    """
+    draw = _MEASURE_DRAW
+    boxes = [draw.textbbox(xy, text, font=font) for xy, text, font, _ in ops]
+    visible = [box for box in boxes if box[2] > box[0] and box[3] > box[1]]
+    if not visible:
+        return None
+    left = min(box[0] for box in visible)
+    top = min(box[1] for box in visible)
+    right = max(box[2] for box in visible)
+    bottom = max(box[3] for box in visible)
+    tile = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    for ((x, y), text, font, color), (l, t, r, b) in zip(ops, boxes):
+        if r <= l or b <= t:
+            continue
+        mask = Image.new("L", (r - l, b - t), 0)
+        ImageDraw.Draw(mask).text((x - l, y - t), text, font=font, fill=255)
+        layer = Image.new("RGBA", mask.size, tuple(color) + (255,))
+        layer.putalpha(mask)
+        tile.alpha_composite(layer, dest=(l - left, t - top))
+    return ContentTile(tile, (left, top), "text")
+
+def paste_tile(img: Image.Image, tile: ContentTile) -> None:
+    """把内容图块合成到 img 上（原地修改）"""
+    px, py = tile.position
+    if tile.kind == "text":
+        # alpha_composite 要求目标坐标非负，超出画布的部分先裁掉
+        sx, sy = max(0, -px), max(0, -py)
+        w = min(tile.image.width, img.width - px) - sx
+        h = min(tile.image.height, img.height - py) - sy
+        if w > 0 and h > 0:
+            img.alpha_composite(tile.image, dest=(px + sx, py + sy), source=(sx, sy, sx + w, sy + h))
+    elif tile.use_mask:
+        img.paste(tile.image, (px, py), tile.image)
+    else:
+        img.paste(tile.image, (px, py))
+
+def cached_layout(
+    text: str,
+    font_path: str | None,
+    region_w: int,
+    region_h: int,
+    max_font_height: int | None = None,
+    line_spacing: float = 0.15,
+    layout_cache=None,  # 排版缓存（提供 make_key/get/put），为 None 时每次重新排版
+) -> Tuple[int, list[str], int, int]:
+    """layout_text 的结果（字号搜索 + 换行），可由 layout_cache 跨次复用"""
+    with span("font_search", chars=len(text)) as sp:
+        layout_key = None
+        layout = None
+        if layout_cache is not None:
+            layout_key = layout_cache.make_key(text, font_path, (region_w, region_h), max_font_height, line_spacing)
+            layout = layout_cache.get(layout_key)
+        sp.set(cached=layout is not None)
+        if layout is None:
+            layout = layout_text(text, font_path, region_w, region_h, max_font_height, line_spacing)
+            if layout_cache is not None:
+                layout_cache.put(layout_key, layout)
+    return layout
+
+def segment_ops(
+    lines: list[str],
+    font_size: int,
+    line_h: int,
+    block_h: int,
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    color: Tuple[int, int, int] = (0, 0, 0),
+    font_path: str | None = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    bracket_color: Tuple[int, int, int] | None = None,
+    in_bracket: bool = False,
+) -> list[tuple[Tuple[int, int], str, Tuple[int, int, int]]]:
+    """
+    排版好的各行中每个同色文字段的 (坐标, 文本, 颜色)，按阅读顺序排列（不含阴影）。
+    in_bracket 为第一行开始时是否处于中括号内（分页时由上一页传入）。
+    """
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    region_w, region_h = x2 - x1, y2 - y1
+    if bracket_color is None:
+        bracket_color = color
+    font = _load_font(font_path, font_size)
+    draw = _MEASURE_DRAW
+
+    # --- 1. 垂直对齐 ---
     if valign == "top":
         y_start = y1
     elif valign == "middle":
-        y_start = y1 + (region_h - best_block_h) // 2
+        y_start = y1 + (region_h - block_h) // 2
     else:
-        y_start = y2 - best_block_h
+        y_start = y2 - block_h
 
-    # --- 8. 绘制 ---
+    # --- 2. 逐行水平对齐并按颜色切分 ---
+    ops: list[tuple[Tuple[int, int], str, Tuple[int, int, int]]] = []
     y = y_start
-    in_bracket = False
-    for ln in best_lines:
+    for ln in lines:
         line_w = int(draw.textlength(ln, font=font))
         if align == "left":
             x = x1
@@ -200,52 +330,167 @@ def draw_text_auto(
             x = x1 + (region_w - line_w) // 2
         else:
             x = x2 - line_w
-        segments,in_bracket = parse_color_segments(ln,in_bracket)
+        segments, in_bracket = parse_color_segments(ln, in_bracket, color, bracket_color)
         for seg_text, seg_color in segments:
             if seg_text:
-                draw.text((x+4, y+4), seg_text, font=font, fill=(0,0,0))# 文字阴影
-                draw.text((x, y), seg_text, font=font, fill=seg_color)
+                ops.append(((x, y), seg_text, seg_color))
                 x += int(draw.textlength(seg_text, font=font))
-        y += best_line_h
+        y += line_h
         if y - y_start > region_h:
             break
+    return ops
+
+def draw_lines_tile(
+    lines: list[str],
+    font_size: int,
+    line_h: int,
+    block_h: int,
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    color: Tuple[int, int, int] = (0, 0, 0),
+    font_path: str | None = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    bracket_color: Tuple[int, int, int] | None = None,
+    in_bracket: bool = False,
+) -> ContentTile:
+    """
+    把排版好的各行绘制到透明文字层上（含阴影）。
+    in_bracket 为第一行开始时是否处于中括号内（分页时由上一页传入）。
+    """
+    font = _load_font(font_path, font_size)
+    ops = []
+    for (x, y), seg_text, seg_color in segment_ops(
+            lines, font_size, line_h, block_h, top_left, bottom_right, color=color, font_path=font_path,
+            align=align, valign=valign, bracket_color=bracket_color, in_bracket=in_bracket):
+        ops.append(((x + 4, y + 4), seg_text, font, (0, 0, 0)))  # 文字阴影（阴影在前，正文在后）
+        ops.append(((x, y), seg_text, font, seg_color))
+
+    # --- 绘制到透明图层 ---
+    with span("draw", ops=len(ops)):
+        tile = rasterize_text_ops(ops)
+    if tile is None:
+        return ContentTile(Image.new("RGBA", (1, 1), (0, 0, 0, 0)), top_left, "text")
+    return tile
+
+def render_text_tile(
+    text: str,
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    color: Tuple[int, int, int] = (0, 0, 0),
+    max_font_height: int | None = None,
+    font_path: str | None = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: Tuple[int, int, int] | None = None,
+    layout_cache=None,  # 排版缓存（提供 make_key/get/put），为 None 时每次重新排版
+) -> ContentTile:
+    """
+    在指定矩形内自适应字号排版文本，绘制到透明文字层上（含阴影）。
+    """
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    if not (x2 > x1 and y2 > y1):
+        raise ValueError("无效的文字区域。")
+    best_size, best_lines, best_line_h, best_block_h = cached_layout(
+        text, font_path, x2 - x1, y2 - y1, max_font_height, line_spacing, layout_cache)
+    return draw_lines_tile(best_lines, best_size, best_line_h, best_block_h, top_left, bottom_right,
+                           color=color, font_path=font_path, align=align, valign=valign,
+                           bracket_color=bracket_color)
+
+def render_label_tile(role_name: str, text_configs_dict: dict | None) -> ContentTile | None:
+    """
+    角色专属文字（带阴影）图层，与底图无关，可缓存复用
+    如果提供了文字配置字典且角色名称存在，则使用对应的文字配置
+    """
+    if not (text_configs_dict and role_name in text_configs_dict):
+        return None
+    shadow_offset = (2, 2)  # 阴影偏移量
+    shadow_color = (0, 0, 0)  # 黑色阴影
+    # 使用绝对路径加载字体文件
+    font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'fonts', "font3.ttf")
+
+    ops = []
+    for config in text_configs_dict[role_name]:
+        position = tuple(config["position"])
+        font = _load_font(font_path, config["font_size"])
+        # 先绘制阴影文字，再绘制主文字（覆盖在阴影上方）
+        ops.append(((position[0] + shadow_offset[0], position[1] + shadow_offset[1]), config["text"], font, shadow_color))
+        ops.append((position, config["text"], font, tuple(config["font_color"])))
+    return rasterize_text_ops(ops)
+
+def draw_text_auto(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: Tuple[int, int, int] = (0, 0, 0),
+    max_font_height: int | None = None,
+    font_path: str | None = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    image_overlay: Union[str, Image.Image,None]=None,
+    role_name: str = "unknown",  # 添加角色名称参数
+    text_configs_dict: dict = None,  # 添加文字配置字典参数
+    layout_cache=None,  # 排版缓存（提供 make_key/get/put），为 None 时每次重新排版
+) -> bytes:
+    """
+    在指定矩形内自适应字号绘制文本；
+    中括号及括号内文字使用 bracket_color。
+    （RenderPipeline 的薄封装，底图、排版、角色名图层等缓存与图片模式共享）
+    """
+    from render_pipeline import get_default_pipeline
+
+    return get_default_pipeline().render_text(
+        image_source, top_left, bottom_right, text,
+        color=color,
+        max_font_height=max_font_height,
+        font_path=font_path,
+        align=align,
+        valign=valign,
+        line_spacing=line_spacing,
+        image_overlay=image_overlay,
+        role_name=role_name,
+        text_configs_dict=text_configs_dict,
+        layout_cache=layout_cache,
+    ).data
+
+
+def draw_text_pages(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    min_font_size: int,
+    color: Tuple[int, int, int] = (0, 0, 0),
+    max_font_height: int | None = None,
+    font_path: str | None = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    image_overlay: Union[str, Image.Image, None] = None,
+    role_name: str = "unknown",
+    text_configs_dict: dict = None,
+    layout_cache=None,
+) -> list[bytes]:
+    """
+    与 draw_text_auto 相同，但字号需要小于 min_font_size 才能放下时，
+    按 min_font_size 在行边界分页，每页绘制在同一张底图上，按顺序返回各页图片。
+    """
+    from render_pipeline import get_default_pipeline
 
-    # 覆盖置顶图层（如果有）
-    if image_overlay is not None and img_overlay is not None:
-        img.paste(img_overlay, (0, 0), img_overlay)
-    elif image_overlay is not None and img_overlay is None:
-        print("Warning: overlay image is not exist.")
-
-    # 自动在图片上写角色专属文字
-    # 如果提供了文字配置字典且角色名称存在，则使用对应的文字配置
-    if text_configs_dict and role_name in text_configs_dict:
-        shadow_offset = (2, 2)  # 阴影偏移量
-        shadow_color = (0, 0, 0)  # 黑色阴影
-        
-        for config in text_configs_dict[role_name]:
-            text = config["text"]
-            position = tuple(config["position"])
-            font_color = tuple(config["font_color"])
-            font_size = config["font_size"]
-        
-            # 使用绝对路径加载字体文件
-            font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'fonts', "font3.ttf")
-            font = ImageFont.truetype(font_path, font_size)
-            
-            # 计算阴影位置
-            shadow_position = (position[0] + shadow_offset[0], position[1] + shadow_offset[1])
-            
-            # 先绘制阴影文字
-            draw.text(shadow_position, text, fill=shadow_color, font=font)
-            
-            # 再绘制主文字（覆盖在阴影上方）
-            draw.text(position, text, fill=font_color, font=font)
-    img = compress_image(img)
-    # --- 9. 输出 PNG ---
-    # img = img.convert('RGB')
-    # buf = BytesIO()
-    # img.save(buf, format="JPEG", quality=20)
-    # return buf.getvalue()
-    buf = BytesIO()
-    img.save(buf, format="png")
-    return buf.getvalue()
+    return [result.data for result in get_default_pipeline().render_text_pages(
+        image_source, top_left, bottom_right, text, min_font_size,
+        color=color,
+        max_font_height=max_font_height,
+        font_path=font_path,
+        align=align,
+        valign=valign,
+        line_spacing=line_spacing,
+        image_overlay=image_overlay,
+        role_name=role_name,
+        text_configs_dict=text_configs_dict,
+        layout_cache=layout_cache,
+    )]
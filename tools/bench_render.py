@@ -0,0 +1,258 @@
+""" 渲染基准测试（无界面，可在 Linux 上运行）
+
+测试项：
+    draw_text/<cjk|latin>/<short|medium|long|brackets>   draw_text_auto（每次清空文字图层缓存，包含排版）
+    paste_image/<small|4k>                                paste_image_auto
+    warm_up/<cold|warm>                                   预先合成一个角色全部底图（冷: 新引擎；热: 图层已解码）
+    startup/<import|engine>                               新进程中导入渲染模块 / 创建引擎并绘制角色名图层
+
+输出 JSON，包含每项的中位数与分位数（毫秒）。compare 子命令对比两个结果文件，
+中位数变慢超过阈值的项视为回归，存在回归时以非零状态码退出。
+
+用法：
+    python tools/bench_render.py run -o bench.json
+    python tools/bench_render.py run --filter draw_text -n 20
+    python tools/bench_render.py compare old.json new.json --threshold 0.1
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import PIL
+from PIL import Image
+
+from headless_render import BOX_RECT
+from image_fit_paste import paste_image_auto
+from render_engine import RenderEngine
+from render_pipeline import get_default_pipeline
+from text_fit_draw import draw_text_auto
+
+CHARACTER = "sherri"
+WARM_UP_CHARACTER = "miria"  # 表情最少的角色，缩短预热测试时间
+
+TEXTS = {
+    "cjk": {
+        "short": "你好",
+        "medium": "今天的审判就到这里吧，大家辛苦了。明天记得早点集合，不要迟到哦。",
+        "long": "魔女审判开始之前，请各位仔细回想昨晚发生的事情。" * 8,
+        "brackets": "【证据】在【图书室】发现了【沾血的书签】，【凶器】仍然下落不明【待查】。" * 3,
+    },
+    "latin": {
+        "short": "Hello",
+        "medium": "The trial is over for today. Please gather early tomorrow and do not be late.",
+        "long": "Before the witch trial begins, everyone please recall what happened last night. " * 8,
+        "brackets": "[Evidence] found in the [library]: a [bloodstained bookmark], the [weapon] is [missing]. " * 3,
+    },
+}
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """样本（秒）-> 统计量（毫秒）"""
+    ordered = sorted(samples)
+
+    def pct(q: float) -> float:
+        # 线性插值分位数
+        pos = q * (len(ordered) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(ordered) - 1)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+    return {
+        "n": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p90_ms": round(pct(0.90) * 1000, 3),
+        "p95_ms": round(pct(0.95) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "stdev_ms": round(statistics.stdev(ordered) * 1000, 3) if len(ordered) > 1 else 0.0,
+    }
+
+
+def measure(fn, iterations: int, warmup: int = 1, setup=None) -> list[float]:
+    """先空跑 warmup 次，再计时 iterations 次；setup 在每次计时之前调用，不计入耗时"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        gc.collect()
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+class Bench:
+    def __init__(self, iterations: int, tmp_dir: str):
+        self.iterations = iterations
+        self.tmp_dir = tmp_dir
+        self.engine = RenderEngine(cache_path=os.path.join(tmp_dir, "engine"))
+        self.base = self.engine.compose_base(CHARACTER, 1, 1).copy()
+        self.pipeline = get_default_pipeline()
+
+    def cases(self):
+        """(名称, 计时函数)；计时函数返回样本列表"""
+        for script, texts in TEXTS.items():
+            for size, text in texts.items():
+                yield f"draw_text/{script}/{size}", lambda text=text: self.draw_text(text)
+        yield "paste_image/small", lambda: self.paste_image((320, 240))
+        yield "paste_image/4k", lambda: self.paste_image((3840, 2160))
+        yield "warm_up/cold", lambda: self.warm_up(cold=True)
+        yield "warm_up/warm", lambda: self.warm_up(cold=False)
+        yield "startup/import", lambda: self.startup(
+            "import text_fit_draw, image_fit_paste, render_engine")
+        yield "startup/engine", lambda: self.startup(
+            "import render_engine, tempfile; e = render_engine.RenderEngine(cache_path=tempfile.mkdtemp()); e.warm_up()")
+
+    def draw_text(self, text: str) -> list[float]:
+        return measure(lambda: draw_text_auto(
+            self.base, BOX_RECT[0], BOX_RECT[1], text,
+            align="left",
+            valign="top",
+            color=(255, 255, 255),
+            max_font_height=145,
+            font_path=self.engine.font_path(CHARACTER),
+            role_name=CHARACTER,
+            text_configs_dict=self.engine.text_configs_dict,
+        ), self.iterations, setup=self.pipeline.tile_cache.clear)
+
+    def paste_image(self, size: tuple[int, int]) -> list[float]:
+        # 固定的渐变图，避免纯色图被编码器过度压缩
+        content = Image.linear_gradient("L").resize(size).convert("RGBA")
+        return measure(lambda: paste_image_auto(
+            self.base, BOX_RECT[0], BOX_RECT[1], content,
+            align="center",
+            valign="middle",
+            padding=12,
+            allow_upscale=True,
+            keep_alpha=True,
+            role_name=CHARACTER,
+            text_configs_dict=self.engine.text_configs_dict,
+        ), self.iterations)
+
+    def warm_up(self, cold: bool) -> list[float]:
+        cache_path = os.path.join(self.tmp_dir, "warm_up")
+        engine = RenderEngine(cache_path=cache_path)
+        state = {"engine": engine}
+
+        def setup():
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.makedirs(cache_path)
+            if cold:
+                state["engine"] = RenderEngine(cache_path=cache_path)
+
+        return measure(lambda: state["engine"].generate_and_save_images(WARM_UP_CHARACTER),
+                       max(1, self.iterations // 5), setup=setup)
+
+    def startup(self, code: str) -> list[float]:
+        cmd = [sys.executable, "-c", code]
+        return measure(lambda: subprocess.run(cmd, cwd=ROOT, check=True), max(3, self.iterations // 2))
+
+
+def run(args) -> int:
+    tmp_dir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        bench = Bench(args.iterations, tmp_dir)
+        results = {}
+        for name, fn in bench.cases():
+            if args.filter and not any(f in name for f in args.filter):
+                continue
+            results[name] = summarize(fn())
+            print(f"{name:<28} median {results[name]['median_ms']:>9.2f} ms   "
+                  f"p95 {results[name]['p95_ms']:>9.2f} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "commit": _git_commit(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(args) -> int:
+    with open(args.old, "r", encoding="utf-8") as fp:
+        old = json.load(fp)["results"]
+    with open(args.new, "r", encoding="utf-8") as fp:
+        new = json.load(fp)["results"]
+
+    regressions = 0
+    print(f"{'case':<28} {'old':>10} {'new':>10} {'change':>8}")
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            print(f"{name:<28} {'只在一侧':>30}")
+            continue
+        a, b = old[name]["median_ms"], new[name]["median_ms"]
+        change = (b - a) / a if a else 0.0
+        # 变慢超过比例阈值且超过绝对噪声下限才算回归
+        flag = ""
+        if change > args.threshold and b - a > args.min_ms:
+            flag = "  回归"
+            regressions += 1
+        elif change < -args.threshold and a - b > args.min_ms:
+            flag = "  提升"
+        print(f"{name:<28} {a:>10.2f} {b:>10.2f} {change:>+7.1%}{flag}")
+    print(f"回归 {regressions} 项")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框渲染基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="运行基准测试")
+    p_run.add_argument("-o", "--output", help="结果 JSON 文件，默认输出到标准输出")
+    p_run.add_argument("-n", "--iterations", type=int, default=10, help="每项计时次数")
+    p_run.add_argument("--filter", action="append", help="只运行名称包含该字符串的项（可重复）")
+    p_run.set_defaults(func=run)
+
+    p_cmp = sub.add_parser("compare", help="对比两个结果文件")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="中位数变慢比例阈值（默认 10%%）")
+    p_cmp.add_argument("--min-ms", type=float, default=1.0, help="绝对差值噪声下限（毫秒）")
+    p_cmp.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
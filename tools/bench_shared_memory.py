@@ -0,0 +1,103 @@
+""" 多进程内存对比：依次启动 N 个渲染进程，各自合成同一组底图，分别在不共享与共享内存映射时
+统计全部进程的 USS（进程独占内存）与 RSS 合计。
+
+启用共享时像素数据只在第一个进程中解码，之后的进程只读映射，USS 合计应基本不随进程数增长。
+共享目录使用临时目录，不影响正在运行的前端；结束后检查共享目录已随最后一个进程退出而删除。
+
+用法：
+    python tools/bench_shared_memory.py -p 4
+    python tools/bench_shared_memory.py -p 6 --character sherri --bases 16 --shared-mb 512
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psutil
+
+from render_stats import format_bytes
+
+
+def worker(args) -> int:
+    """子进程：合成底图后报告就绪，等待父进程关闭 stdin 后退出"""
+    from headless_render import HeadlessRenderer
+    from render_core import split_value
+    from shared_image_cache import SharedImageCache
+
+    renderer = HeadlessRenderer(ROOT, base_cache_size=args.bases, shared_memory_mb=0)
+    if args.shared_mb:
+        renderer.shared_cache = SharedImageCache(args.shared_root, int(args.shared_mb * 2**20))
+    character = args.character or renderer.character_list[0]
+    emotions = renderer.mahoshojo[character]["emotion_count"]
+    for value in range(1, args.bases + 1):
+        emotion, background = split_value(value)
+        renderer.compose_base(character, (emotion - 1) % emotions + 1, background)
+    print("ready", flush=True)
+    sys.stdin.read()
+    return 0
+
+
+def measure(args, shared_mb: float, shared_root: str) -> tuple[list[int], list[int]]:
+    """依次启动进程（等上一个就绪再启动下一个），全部就绪后采样，返回各进程的 (USS, RSS)"""
+    procs = []
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--bases", str(args.bases),
+           "--shared-mb", str(shared_mb), "--shared-root", shared_root]
+    if args.character:
+        cmd += ["--character", args.character]
+    try:
+        for _ in range(args.processes):
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            if not proc.stdout.readline():
+                raise RuntimeError("渲染进程启动失败")
+            procs.append(proc)
+        uss, rss = [], []
+        for proc in procs:
+            info = psutil.Process(proc.pid).memory_full_info()
+            uss.append(info.uss)
+            rss.append(info.rss)
+        return uss, rss
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+        for proc in procs:
+            proc.wait()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="共享内存映射的多进程内存对比")
+    parser.add_argument("-p", "--processes", type=int, default=4, help="进程数")
+    parser.add_argument("--character", default=None, help="角色（默认第一个）")
+    parser.add_argument("--bases", type=int, default=8, help="每个进程合成的底图数量")
+    parser.add_argument("--shared-mb", type=float, default=256, help="共享时的容量（MB）")
+    parser.add_argument("--shared-root", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        return worker(args)
+
+    with tempfile.TemporaryDirectory(prefix="manosaba-shm-bench-") as tmp:
+        shared_root = os.path.join(tmp, "shared")
+        rows = {}
+        for label, shared_mb in (("不共享", 0), ("共享", args.shared_mb)):
+            rows[label] = measure(args, shared_mb, shared_root)
+        leftover = os.path.exists(shared_root)
+
+    print(f"{args.processes} 个进程，每个合成 {args.bases} 张底图")
+    print(f"{'':<8} {'USS 合计':>12} {'RSS 合计':>12}   各进程 USS")
+    for label, (uss, rss) in rows.items():
+        each = " ".join(format_bytes(u) for u in uss)
+        print(f"{label:<8} {format_bytes(sum(uss)):>12} {format_bytes(sum(rss)):>12}   {each}")
+    if leftover:
+        print("共享目录在全部进程退出后仍然存在")
+        return 1
+    base_uss, shared_uss = sum(rows["不共享"][0]), sum(rows["共享"][0])
+    print(f"USS 合计减少 {format_bytes(base_uss - shared_uss)}（{1 - shared_uss / base_uss:.0%}）")
+    return 0 if shared_uss < base_uss else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+""" 启动耗时基准（基于 python -X importtime）
+
+每次在新进程中测量：
+    startup/import/<模块>    -X importtime 统计的导入总耗时
+    startup/ready/<模块>     进程启动到可以渲染第一张图（导入模块 + 创建 RenderEngine + 绘制当前角色名图层）的墙钟时间
+并汇总导入耗时最多的模块（自身耗时与累计耗时的中位数）。
+
+--cold 在每次运行前删除 config/__pycache__ 中的配置解析缓存，用于对比缓存的效果。
+--platform 在导入前改写 sys.platform，用于在 Linux 上估算 main_tui 在 darwin/win32 下的导入开销。
+输出格式与 bench_render.py 相同，可以用 bench_render.py compare 对比。
+
+用法：
+    python tools/bench_startup.py --platform darwin
+    python tools/bench_startup.py -m main_tui -m headless_render --platform darwin -n 20 -o startup.json
+    python tools/bench_startup.py --platform darwin --cold --top 30
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_render import _git_commit, summarize
+
+READY_CODE = """
+{prelude}
+import {module}
+from render_engine import RenderEngine
+engine = RenderEngine(cache_path={cache_path!r})
+engine.warm_up([engine.character_list[0]])
+"""
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int, int]]:
+    """解析 -X importtime 输出 -> {模块: (自身微秒, 累计微秒, 嵌套深度)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = int(head.rsplit(":", 1)[1])
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2  # 顶层模块前有 1 个空格，每深一层多 2 个
+        modules[name.strip()] = (self_us, int(cumulative_us), depth)
+    return modules
+
+
+def clear_config_cache() -> None:
+    for path in glob.glob(os.path.join(ROOT, "config", "__pycache__", "*.marshal")):
+        os.remove(path)
+
+
+def run_once(module: str, prelude: str, cold: bool) -> dict[str, tuple[int, int, int]]:
+    if cold:
+        clear_config_cache()
+    code = f"{prelude}\nimport {module}"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{out.stderr[-2000:]}")
+    return parse_importtime(out.stderr)
+
+
+def ready_once(module: str, prelude: str, cold: bool, cache_path: str) -> float:
+    if cold:
+        clear_config_cache()
+    code = READY_CODE.format(prelude=prelude, module=module, cache_path=cache_path)
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - t
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框启动耗时基准")
+    parser.add_argument("-m", "--module", action="append", help="要测量的模块（可重复），默认 main_tui")
+    parser.add_argument("-n", "--iterations", type=int, default=10, help="每项运行次数")
+    parser.add_argument("--platform", help="导入前改写 sys.platform（darwin / win32）")
+    parser.add_argument("--cold", action="store_true", help="每次运行前删除配置解析缓存")
+    parser.add_argument("--top", type=int, default=15, help="列出导入耗时最多的模块数")
+    parser.add_argument("-o", "--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    modules = args.module or ["main_tui"]
+    prelude = f"import sys; sys.platform = {args.platform!r}" if args.platform else ""
+    cache_path = tempfile.mkdtemp(prefix="bench_startup_")
+    results = {}
+    try:
+        for module in modules:
+            runs = [run_once(module, prelude, args.cold) for _ in range(args.iterations)]
+            totals = [run[module][1] / 1e6 for run in runs]
+            results[f"startup/import/{module}"] = summarize(totals)
+            ready = [ready_once(module, prelude, args.cold, cache_path) for _ in range(args.iterations)]
+            results[f"startup/ready/{module}"] = summarize(ready)
+
+            print(f"\n{module}: 导入 median {results[f'startup/import/{module}']['median_ms']:.1f} ms，"
+                  f"可渲染 median {results[f'startup/ready/{module}']['median_ms']:.1f} ms", file=sys.stderr)
+            names = set().union(*runs)
+            table = []
+            for name in names:
+                values = [run[name] for run in runs if name in run]
+                table.append((name, statistics.median(v[0] for v in values) / 1000,
+                              statistics.median(v[1] for v in values) / 1000, values[0][2]))
+            print(f"  {'直接导入':<32} {'累计 ms':>10}", file=sys.stderr)
+            for name, _, cumulative, _ in sorted((t for t in table if t[3] == 1), key=lambda t: -t[2])[:args.top]:
+                print(f"  {name:<32} {cumulative:>10.2f}", file=sys.stderr)
+            print(f"  {'自身耗时最多':<32} {'自身 ms':>10}", file=sys.stderr)
+            for name, self_ms, _, _ in sorted(table, key=lambda t: -t[1])[:args.top]:
+                print(f"  {name:<32} {self_ms:>10.2f}", file=sys.stderr)
+    finally:
+        shutil.rmtree(cache_path, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "emulated_platform": args.platform,
+            "cold_config": args.cold,
+            "iterations": args.iterations,
+            "commit": _git_commit(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
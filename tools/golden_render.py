@@ -0,0 +1,220 @@
+""" 基准图回归检查：固定语料 + 固定随机种子选底图，对比基准图并检查每项耗时预算
+
+每个用例通过 draw_text_auto / paste_image_auto 渲染，与 tools/golden/<用例>.png 逐像素比较：
+单个通道差值超过 --tolerance 的像素占比超过 --max-diff-ratio 即判为不一致，差异图写入 --diff-dir。
+耗时取多次渲染的中位数（文字用例每次清空文字图层缓存），超过用例预算 × --budget-scale 即判为超时。
+
+基准图依赖本机字体，需在装好 assets/fonts 的环境中先用 --update 生成并提交（缺少字体时拒绝生成）；
+manifest.json 记录生成时的字体哈希，字体不同时会提示先更新基准图。
+
+用法：
+    python tools/golden_render.py --update
+    python tools/golden_render.py
+    python tools/golden_render.py -k brackets --budget-scale 2
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from io import BytesIO
+
+from PIL import Image, ImageChops
+
+from headless_render import BOX_RECT, HeadlessRenderer
+from image_fit_paste import paste_image_auto
+from render_cache import hash_files
+from render_core import SelectionSession, split_value
+from render_pipeline import get_default_pipeline
+from text_fit_draw import draw_text_auto
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+SEED = 20240601
+
+
+def _checker(size: tuple[int, int]) -> Image.Image:
+    """半透明棋盘格（检查 alpha 蒙版与缩放）"""
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    cell = max(8, size[0] // 16)
+    for y in range(0, size[1], cell):
+        for x in range(0, size[0], cell):
+            if (x // cell + y // cell) % 2 == 0:
+                img.paste((240, 80, 80, 200), (x, y, x + cell, y + cell))
+    return img
+
+
+def _gradient(size: tuple[int, int]) -> Image.Image:
+    return Image.linear_gradient("L").resize(size).convert("RGB")
+
+
+# (名称, 角色, 文本或图片生成函数, 耗时预算毫秒)
+CORPUS = [
+    ("text_short_cjk", "sherri", "你好", 1500),
+    ("text_medium_cjk", "ema", "今天的审判就到这里吧，大家辛苦了。明天记得早点集合，不要迟到哦。", 1500),
+    ("text_long_cjk", "hiro", "魔女审判开始之前，请各位仔细回想昨晚发生的事情。" * 6, 6000),
+    ("text_brackets_cjk", "anan", "【证据】在【图书室】发现了【沾血的书签】，凶器仍然下落不明。", 1500),
+    ("text_brackets_nested", "noa", "他说：“【不对】，那天【晚上（大概十点）】我在【这里】。”", 1500),
+    ("text_latin", "reia", "The trial is over for today. Please gather early tomorrow and do not be late.", 1500),
+    ("text_latin_brackets", "coco", "[Evidence] found in the [library]: a bloodstained bookmark.", 1500),
+    ("text_mixed_newlines", "yuki", "第一行\nSecond line\n【第三行】 third", 1500),
+    ("text_single_long_word", "mago", "A" * 90, 3000),
+    ("image_small", "hanna", lambda: _checker((320, 240)), 2500),
+    ("image_wide", "meruru", lambda: _gradient((1600, 200)), 2500),
+    ("image_4k", "alisa", lambda: _gradient((3840, 2160)), 3000),
+]
+
+
+def render_case(renderer: HeadlessRenderer, base: Image.Image, character: str,
+                content: str | Image.Image) -> bytes:
+    if isinstance(content, Image.Image):
+        return paste_image_auto(
+            base, BOX_RECT[0], BOX_RECT[1], content,
+            align="center",
+            valign="middle",
+            padding=12,
+            allow_upscale=True,
+            keep_alpha=True,
+            role_name=character,
+            text_configs_dict=renderer.text_configs_dict,
+        )
+    return draw_text_auto(
+        base, BOX_RECT[0], BOX_RECT[1], content,
+        align="left",
+        valign="top",
+        color=(255, 255, 255),
+        max_font_height=145,
+        font_path=renderer.font_path(character),
+        role_name=character,
+        text_configs_dict=renderer.text_configs_dict,
+    )
+
+
+def pick_bases(renderer: HeadlessRenderer, seed: int) -> dict[str, tuple[int, int]]:
+    """按语料顺序用同一个会话抽取底图，结果只取决于种子"""
+    session = SelectionSession(rng=random.Random(seed))
+    return {name: split_value(session.next_value(character, renderer.mahoshojo[character]["emotion_count"]))
+            for name, character, _, _ in CORPUS}
+
+
+def diff_stats(expected: Image.Image, actual: Image.Image, tolerance: int) -> tuple[float, int, Image.Image]:
+    """返回 (超出容差的像素占比, 最大通道差, 差异图)"""
+    diff = ImageChops.difference(expected.convert("RGBA"), actual.convert("RGBA"))
+    per_pixel = diff.convert("RGB").point(lambda v: 255 if v > tolerance else 0).convert("L")
+    bad = per_pixel.histogram()[255]
+    max_delta = max(hi for _, hi in diff.getextrema())
+    return bad / (expected.width * expected.height), max_delta, per_pixel
+
+
+def font_files(renderer: HeadlessRenderer) -> list[str]:
+    """语料用到的字体文件（各角色字体与角色名字体）"""
+    return sorted({renderer.font_path(c) for _, c, _, _ in CORPUS} |
+                  {os.path.join(renderer.ASSETS_PATH, "fonts", "font3.ttf")})
+
+
+def font_manifest(renderer: HeadlessRenderer) -> dict[str, str]:
+    return {os.path.basename(p): hash_files([p]) for p in font_files(renderer)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框基准图回归检查")
+    parser.add_argument("--update", action="store_true", help="重新生成基准图（不做比较）")
+    parser.add_argument("-k", dest="keyword", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--golden-dir", default=GOLDEN_DIR)
+    parser.add_argument("--diff-dir", default=os.path.join(tempfile.gettempdir(), "golden_diff"),
+                        help="差异图输出目录")
+    parser.add_argument("--tolerance", type=int, default=2, help="单个通道允许的差值")
+    parser.add_argument("--max-diff-ratio", type=float, default=0.0005, help="允许超出容差的像素占比")
+    parser.add_argument("--runs", type=int, default=3, help="计时次数（取中位数）")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="耗时预算倍率（较慢的机器上调大）")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--base-path", default=None, help="项目根目录（含 config/ 与 assets/）")
+    args = parser.parse_args(argv)
+
+    renderer = HeadlessRenderer(args.base_path)
+    pipeline = get_default_pipeline()
+    bases = pick_bases(renderer, args.seed)
+    manifest_path = os.path.join(args.golden_dir, "manifest.json")
+    fonts = font_manifest(renderer)
+
+    if args.update:
+        missing = [os.path.basename(p) for p in font_files(renderer) if not os.path.isfile(p)]
+        if missing:
+            # 缺字体时会退回系统字体，生成的基准图没有意义
+            print(f"缺少字体 {', '.join(missing)}，请先放入 assets/fonts 再生成基准图", file=sys.stderr)
+            return 2
+    else:
+        if not os.path.isfile(manifest_path):
+            print(f"没有基准图，请先运行: python {os.path.relpath(__file__, ROOT)} --update", file=sys.stderr)
+            return 2
+        with open(manifest_path, "r", encoding="utf-8") as fp:
+            manifest = json.load(fp)
+        if manifest.get("fonts") != fonts or manifest.get("seed") != args.seed:
+            print("警告: 字体文件或种子与生成基准图时不同，像素比较可能失败", file=sys.stderr)
+    os.makedirs(args.golden_dir, exist_ok=True)
+
+    failures = 0
+    for name, character, content, budget_ms in CORPUS:
+        if args.keyword and args.keyword not in name:
+            continue
+        emotion, background = bases[name]
+        base = renderer.compose_base(character, emotion, background)
+        if callable(content):
+            content = content()
+
+        samples = []
+        data = b""
+        for _ in range(max(1, args.runs)):
+            pipeline.tile_cache.clear()
+            t = time.perf_counter()
+            data = render_case(renderer, base, character, content)
+            samples.append(time.perf_counter() - t)
+        latency_ms = statistics.median(samples) * 1000
+
+        golden_path = os.path.join(args.golden_dir, f"{name}.png")
+        if args.update:
+            with open(golden_path, "wb") as fp:
+                fp.write(data)
+            print(f"[更新] {name:<24} {character} 表情 {emotion} 背景 {background}  {latency_ms:8.1f} ms")
+            continue
+
+        problems = []
+        if not os.path.isfile(golden_path):
+            problems.append("缺少基准图")
+        else:
+            with Image.open(BytesIO(data)) as actual, Image.open(golden_path) as expected:
+                if expected.size != actual.size:
+                    problems.append(f"尺寸 {actual.size} != {expected.size}")
+                else:
+                    ratio, max_delta, diff = diff_stats(expected, actual, args.tolerance)
+                    if ratio > args.max_diff_ratio:
+                        problems.append(f"像素差异 {ratio:.4%}（最大 {max_delta}）")
+                        os.makedirs(args.diff_dir, exist_ok=True)
+                        diff.save(os.path.join(args.diff_dir, f"{name}.diff.png"))
+                        actual.save(os.path.join(args.diff_dir, f"{name}.actual.png"))
+
+        budget = budget_ms * args.budget_scale
+        if latency_ms > budget:
+            problems.append(f"超时 {latency_ms:.1f} ms > {budget:.0f} ms")
+
+        status = "失败" if problems else "通过"
+        failures += bool(problems)
+        print(f"[{status}] {name:<24} {latency_ms:8.1f} ms / {budget:.0f} ms" +
+              (f"  {'; '.join(problems)}" if problems else ""))
+
+    if args.update:
+        with open(manifest_path, "w", encoding="utf-8") as fp:
+            json.dump({"seed": args.seed, "fonts": fonts, "bases": bases}, fp, ensure_ascii=False, indent=2)
+        return 0
+    print(f"失败 {failures} 项")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
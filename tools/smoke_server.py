@@ -0,0 +1,124 @@
+""" 渲染服务冒烟检查：在 127.0.0.1 的临时端口上启动 RenderServer，通过 HTTP 逐项检查
+
+检查内容：
+    1. POST /render 正常请求返回 200 与图片
+    2. GET /metrics 返回 JSON，且计入了已完成的请求
+    3. 格式错误的请求（非 JSON、缺字段、字段类型错误）返回 400
+    4. 未知角色返回 422
+    5. 队列已满时返回 503（1 个工作进程、队列长度 1，同时发出多个请求）
+任一检查失败时以非零状态码退出。
+
+用法：
+    python tools/smoke_server.py
+    python tools/smoke_server.py --burst 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+from headless_render import HeadlessRenderer
+from render_server import RenderServer
+
+
+async def request(port: int, method: str, path: str, body: bytes = b"") -> tuple[int, bytes]:
+    """发出一个 HTTP/1.1 请求，返回 (状态码, 响应体)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    header, _, payload = response.partition(b"\r\n\r\n")
+    return int(header.split(b" ", 2)[1]), payload
+
+
+def render_body(**job) -> bytes:
+    return json.dumps(job, ensure_ascii=False).encode("utf-8")
+
+
+def server_character() -> str:
+    """工作进程使用的默认项目目录中的第一个角色"""
+    return HeadlessRenderer(shared_memory_mb=0).character_list[0]
+
+
+async def run_checks(args) -> list[str]:
+    """启动服务并依次检查，返回失败项"""
+    failures = []
+
+    def check(ok: bool, message: str) -> None:
+        print(("  ok    " if ok else "  FAIL  ") + message)
+        if not ok:
+            failures.append(message)
+
+    server = RenderServer(workers=1, queue_size=1, batch_size=1, batch_window=0.0, timeout=60.0)
+    await server.start()
+    listener = await asyncio.start_server(server.on_connection, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    print(f"渲染服务: http://127.0.0.1:{port}")
+    character = server_character()
+    try:
+        status, payload = await request(port, "POST", "/render", render_body(character=character, text="冒烟检查"))
+        check(status == 200, f"POST /render -> {status}")
+        if status == 200:
+            with Image.open(BytesIO(payload)) as image:
+                check(image.format == "PNG", f"返回 {image.format} {image.size}")
+
+        status, payload = await request(port, "GET", "/metrics")
+        try:
+            metrics = json.loads(payload)
+        except ValueError:
+            metrics = None
+        check(status == 200 and isinstance(metrics, dict), f"GET /metrics -> {status}")
+        check(bool(metrics) and metrics.get("completed") == 1, f"metrics.completed = {metrics and metrics.get('completed')}")
+
+        for label, body in (("非 JSON", b"nope"),
+                            ("缺少 character", render_body(text="x")),
+                            ("缺少 text 与 image", render_body(character=character)),
+                            ("max_bytes 为列表", render_body(character=character, text="x", max_bytes=[1])),
+                            ("emotion 为对象", render_body(character=character, text="x", emotion={})),
+                            ("不支持的格式", render_body(character=character, text="x", format="bmp"))):
+            status, _ = await request(port, "POST", "/render", body)
+            check(status == 400, f"{label} -> {status}")
+
+        status, _ = await request(port, "POST", "/render", render_body(character="__nobody__", text="x"))
+        check(status == 422, f"未知角色 -> {status}")
+
+        text = "长文本" * 200
+        statuses = await asyncio.gather(*(request(port, "POST", "/render", render_body(character=character, text=text))
+                                          for _ in range(args.burst)))
+        codes = sorted(status for status, _ in statuses)
+        check(503 in codes, f"同时 {args.burst} 个请求 -> {codes}")
+        check(set(codes) <= {200, 503}, "队列已满时其余请求正常完成")
+    finally:
+        listener.close()
+        await listener.wait_closed()
+        await server.stop()
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="渲染服务冒烟检查")
+    parser.add_argument("--burst", type=int, default=8, help="检查 503 时同时发出的请求数（至少 3）")
+    args = parser.parse_args()
+    if args.burst < 3:
+        parser.error("--burst 至少为 3")
+    failures = asyncio.run(run_checks(args))
+    if failures:
+        print(f"{len(failures)} 项检查失败", file=sys.stderr)
+        return 1
+    print("全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
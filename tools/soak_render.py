@@ -0,0 +1,165 @@
+""" 长时间运行检查：大量无界面渲染与角色切换，监控内存与文件句柄是否持续增长
+
+模拟 TUI 的使用方式（同一个 RenderEngine + SelectionSession）：
+切换角色（首次切换会预热该角色的全部底图）、指定表情、生成文字或图片、换底图重绘。
+前几次切换按顺序经过每个角色（包括只有立绘目录、没有角色名配置的角色），之后随机切换。
+前 --warmup 次不计入，且预热持续到文字图层缓存填满（有上限的缓存填满不算泄漏）；
+之后记录基线，定期采样 RSS、打开的文件句柄数与 tracemalloc 统计，
+结束时若增长超过阈值则列出增长最多的分配位置并以非零状态码退出。
+
+用法：
+    python tools/soak_render.py -n 3000
+    python tools/soak_render.py --duration 86400 --sample-every 500 -o soak.json
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psutil
+from PIL import Image
+
+from render_core import SelectionSession
+from render_engine import RenderEngine
+
+WORDS = ["审判", "魔女", "证据", "图书室", "书签", "trial", "witch", "evidence", "library", "【重点】", "[note]"]
+
+
+def random_text(rng: random.Random) -> str:
+    """长度与括号分布随机的文本，大部分不重复以覆盖缓存淘汰"""
+    n = rng.choice((2, 6, 20, 60))
+    return "".join(rng.choice(WORDS) for _ in range(n))
+
+
+def random_image(rng: random.Random) -> Image.Image:
+    size = rng.choice(((64, 64), (320, 240), (1200, 900), (2560, 1440)))
+    return Image.new(rng.choice(("RGB", "RGBA")), size, tuple(rng.randrange(256) for _ in range(3)))
+
+
+def sample(process: psutil.Process) -> dict:
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "time": time.time(),
+        "rss": process.memory_info().rss,
+        "fds": process.num_fds() if hasattr(process, "num_fds") else process.num_handles(),
+        "threads": process.num_threads(),
+        "traced": current,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="渲染引擎长时间运行检查")
+    parser.add_argument("-n", "--iterations", type=int, default=3000, help="渲染次数（与 --duration 取先到者）")
+    parser.add_argument("--duration", type=float, default=None, help="最长运行时间（秒）")
+    parser.add_argument("--warmup", type=int, default=300, help="不计入增长的预热次数")
+    parser.add_argument("--switch-every", type=int, default=25, help="每隔多少次切换一次角色")
+    parser.add_argument("--image-ratio", type=float, default=0.15, help="图片消息占比")
+    parser.add_argument("--sample-every", type=int, default=100, help="采样间隔（次）")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64.0)
+    parser.add_argument("--max-traced-growth-mb", type=float, default=16.0, help="Python 分配（tracemalloc）增长上限")
+    parser.add_argument("--max-fd-growth", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="把采样记录写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    # 从一开始就跟踪，基线中才包含预热期间填满的缓存
+    tracemalloc.start(10)
+    rng = random.Random(args.seed)
+    process = psutil.Process()
+    cache_dir = tempfile.mkdtemp(prefix="soak_render_")
+    engine = RenderEngine(cache_path=cache_dir)
+    tiles = engine.pipeline.tile_cache
+    session = SelectionSession(rng=random.Random(args.seed))
+    character = engine.character_list[0]
+    engine.generate_and_save_images(character)
+    last_tile = None
+
+    samples = []
+    baseline = None
+    baseline_snapshot = None
+    started = time.time()
+    done = 0
+    try:
+        for i in range(args.iterations):
+            if args.duration is not None and time.time() - started > args.duration:
+                break
+            if i and i % args.switch_every == 0:
+                switch = i // args.switch_every
+                characters = engine.character_list
+                character = characters[switch % len(characters)] if switch < len(characters) else rng.choice(characters)
+                engine.generate_and_save_images(character)
+                engine.prefetch_next_base(session, character)
+            if rng.random() < 0.1:
+                session.set_emotion(rng.randint(1, engine.emotion_count(character)))
+
+            if last_tile is not None and rng.random() < 0.1:
+                engine.reroll(session, character, last_tile)
+            elif rng.random() < args.image_ratio:
+                last_tile = engine.generate(session, character, None, random_image(rng)).tile
+            else:
+                last_tile = engine.generate(session, character, random_text(rng), None).tile
+            done = i + 1
+
+            if baseline is None and done >= args.warmup and len(tiles) >= tiles.max_items:
+                baseline = sample(process)
+                baseline_snapshot = tracemalloc.take_snapshot()
+                samples.append({"iteration": done, **baseline})
+                print(f"[{done}] 预热结束，基线 RSS {baseline['rss'] / 2**20:.1f} MB，"
+                      f"句柄 {baseline['fds']}", file=sys.stderr)
+            elif done % args.sample_every == 0:
+                s = sample(process)
+                samples.append({"iteration": done, **s})
+                print(f"[{done}] RSS {s['rss'] / 2**20:.1f} MB  句柄 {s['fds']}  线程 {s['threads']}  "
+                      f"Python 分配 {s['traced'] / 2**20:.1f} MB", file=sys.stderr)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if baseline is None:
+        print(f"只运行了 {done} 次，预热未完成（至少 {args.warmup} 次且文字图层缓存填满）", file=sys.stderr)
+        return 2
+
+    final = sample(process)
+    samples.append({"iteration": done, **final})
+    growth = {
+        "rss_mb": (final["rss"] - baseline["rss"]) / 2**20,
+        "traced_mb": (final["traced"] - baseline["traced"]) / 2**20,
+        "fds": final["fds"] - baseline["fds"],
+    }
+    failures = []
+    if growth["rss_mb"] > args.max_rss_growth_mb:
+        failures.append(f"RSS 增长 {growth['rss_mb']:.1f} MB > {args.max_rss_growth_mb} MB")
+    if growth["traced_mb"] > args.max_traced_growth_mb:
+        failures.append(f"Python 分配增长 {growth['traced_mb']:.1f} MB > {args.max_traced_growth_mb} MB")
+    if growth["fds"] > args.max_fd_growth:
+        failures.append(f"文件句柄增长 {growth['fds']} > {args.max_fd_growth}")
+
+    top = tracemalloc.take_snapshot().compare_to(baseline_snapshot, "lineno")[:10]
+    print(f"\n共 {done} 次，用时 {time.time() - started:.0f}s；预热后 RSS {growth['rss_mb']:+.1f} MB，"
+          f"Python 分配 {growth['traced_mb']:+.1f} MB，句柄 {growth['fds']:+d}", file=sys.stderr)
+    print("增长最多的分配位置:", file=sys.stderr)
+    for stat in top:
+        print(f"  {stat}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump({"growth": growth, "failures": failures, "samples": samples,
+                       "top_allocations": [str(stat) for stat in top]}, fp, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"失败: {failure}", file=sys.stderr)
+    print("通过" if not failures else "失败", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
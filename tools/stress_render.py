@@ -0,0 +1,108 @@
+""" 并发压力检查：多个线程同时调用 render_core.render，并共享同一个 SelectionSession
+
+检查内容：
+    1. 并发渲染的输出与单线程渲染逐字节一致（渲染结果只由请求决定）
+    2. 共享会话在并发抽取下仍满足“不与上一张表情重复”的规则
+任一检查失败时以非零状态码退出。
+
+用法：
+    python tools/stress_render.py -t 8 -n 200
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from headless_render import HeadlessRenderer
+from render_core import RenderRequest, SelectionSession, render, split_value
+
+TEXTS = [
+    "你好",
+    "这是【重点】内容，括号里的文字会换颜色",
+    "A fairly long latin sentence that needs to wrap across several lines inside the box.",
+    "短" * 120,
+]
+
+
+def make_requests(renderer: HeadlessRenderer, count: int, seed: int) -> list[RenderRequest]:
+    """生成固定的请求集合：多数为文字，少量为图片，角色与底图随机分布"""
+    rng = random.Random(seed)
+    images = [Image.new("RGBA", size, color) for size, color in
+              (((320, 240), (200, 40, 40, 255)), ((1200, 300), (40, 120, 200, 180)))]
+    requests = []
+    for i in range(count):
+        character, emotion, background = renderer.resolve(rng.choice(renderer.character_list), rng=rng)
+        if i % 5 == 4:
+            requests.append(RenderRequest(character, emotion, background, image=rng.choice(images)))
+        else:
+            requests.append(RenderRequest(character, emotion, background, text=rng.choice(TEXTS)))
+    return requests
+
+
+def check_renders(renderer: HeadlessRenderer, requests: list[RenderRequest], threads: int) -> int:
+    """先单线程得到参考输出，再用新的渲染器并发重放（含重复请求），返回不一致的数量"""
+    expected = [render(r, renderer).data for r in requests]
+
+    fresh = HeadlessRenderer(renderer.BASE_PATH)  # 冷缓存，让并发线程争抢同一批缓存项
+    order = list(range(len(requests))) * 2
+    random.Random(0).shuffle(order)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outputs = list(pool.map(lambda i: (i, render(requests[i], fresh).data), order))
+    elapsed = time.perf_counter() - started
+
+    mismatches = sum(1 for i, data in outputs if data != expected[i])
+    print(f"并发渲染 {len(outputs)} 次（{threads} 线程），用时 {elapsed:.2f}s，不一致 {mismatches} 次")
+    return mismatches
+
+
+def check_session(renderer: HeadlessRenderer, threads: int, picks: int) -> int:
+    """多个线程共享一个会话抽取底图，返回违反不重复规则的次数"""
+    character = max(renderer.character_list, key=lambda c: renderer.mahoshojo[c]["emotion_count"])
+    emotion_cnt = renderer.mahoshojo[character]["emotion_count"]
+    session = SelectionSession(history_size=threads * picks)
+    barrier = threading.Barrier(threads)
+
+    def worker(n: int) -> None:
+        barrier.wait()
+        for k in range(picks):
+            if k % 7 == 0:
+                session.peek_value(character, emotion_cnt)
+            session.next_value(character, emotion_cnt)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+
+    values = [v for _, v in session.history]
+    violations = sum(1 for a, b in zip(values, values[1:]) if split_value(a)[0] == split_value(b)[0])
+    if len(values) != threads * picks:
+        violations += 1
+    print(f"共享会话抽取 {len(values)} 次（{threads} 线程），违反规则 {violations} 次")
+    return violations
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="渲染核心并发压力检查")
+    parser.add_argument("-t", "--threads", type=int, default=8, help="线程数")
+    parser.add_argument("-n", "--requests", type=int, default=60, help="不同请求的数量")
+    parser.add_argument("--picks", type=int, default=500, help="每个线程在共享会话中的抽取次数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-path", default=None, help="项目根目录（含 config/ 与 assets/）")
+    args = parser.parse_args(argv)
+
+    renderer = HeadlessRenderer(args.base_path)
+    failures = check_session(renderer, args.threads, args.picks)
+    failures += check_renders(renderer, make_requests(renderer, args.requests, args.seed), args.threads)
+    print("通过" if failures == 0 else "失败")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())